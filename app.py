@@ -1,10 +1,27 @@
 import streamlit as st
 import os
 import datetime
+import math
+import sqlite3
 import uuid
-import pandas as pd
 from pathlib import Path
 
+from blob_store import get_blob_store
+from bulk_import import import_materials, summarize
+from download_stats import get_download_stats, material_title
+from downloads import (MAX_INLINE_BUNDLE_BYTES, MAX_INLINE_BUNDLE_FILES, BundleCache, bundle_size,
+                       lazy_bundle, lazy_file)
+from file_server import get_secret, signed_url
+from fulltext_index import describe_row, get_index
+from ingest import BULK_MAX_BYTES, ingest
+from columnar import write_csv
+from metadata_store import METADATA_COLUMNS, get_store
+from perf_metrics import get_metrics
+from result_cache import get_result_cache
+from taxonomy import TAXONOMY_LEVELS
+from subjects_store import get_subject_store
+from suggestions_db import COMPLETED, GROUP_COLUMNS, PENDING, get_suggestion_store
+
 # ----------------------------
 # BASIC SETUP
 # ----------------------------
@@ -24,28 +41,60 @@ st.markdown("""
 BASE_DIR = Path(".")
 UPLOAD_FOLDER = BASE_DIR / "uploads"
 SUGGESTIONS_FILE = BASE_DIR / "suggestions.csv"
+SUGGESTIONS_DB_FILE = BASE_DIR / "suggestions.db"
 SUBJECTS_FILE = BASE_DIR / "subjects.csv"
 METADATA_FILE = BASE_DIR / "uploads_metadata.csv"
+SEARCH_INDEX_FILE = BASE_DIR / "search_index.db"
+BLOB_REFS_FILE = BASE_DIR / "blob_refs.db"
+DOWNLOADS_FILE = BASE_DIR / "downloads.db"
+# Set to the address of `python file_server.py` to serve downloads from there.
+FILE_SERVER_URL = os.environ.get("PORTAL_FILE_SERVER_URL", "")
+# Prometheus export of the rerun timings: a file to rewrite and/or a port to serve /metrics on.
+METRICS_FILE = os.environ.get("PORTAL_METRICS_FILE", "")
+METRICS_PORT = os.environ.get("PORTAL_METRICS_PORT", "")
 
 # Ensure required directories/files exist
 UPLOAD_FOLDER.mkdir(exist_ok=True)
 
-if not SUGGESTIONS_FILE.exists():
-    pd.DataFrame(columns=["Timestamp", "Course", "Semester", "Year", "Subject", "Suggestion", "Completed"]).to_csv(SUGGESTIONS_FILE, index=False)
-
 if not METADATA_FILE.exists():
-    pd.DataFrame(columns=["Timestamp", "Course", "Semester", "Year", "Subject", "Type", "Filename", "Path", "Uploader"]).to_csv(METADATA_FILE, index=False)
+    write_csv(METADATA_FILE, METADATA_COLUMNS, [])
+
+metadata_store = get_store(METADATA_FILE)
+fulltext_index = get_index(SEARCH_INDEX_FILE)
+blob_store = get_blob_store(UPLOAD_FOLDER / "blobs", BLOB_REFS_FILE)
+bundle_cache = BundleCache(UPLOAD_FOLDER / ".bundles")
+# Key for signing file_server.py links, read once per process rather than per link.
+file_server_secret = get_secret() if FILE_SERVER_URL else None
+# Per-material download counts and trending ranks; shared with file_server.py and the Tkinter client.
+download_stats = get_download_stats(DOWNLOADS_FILE)
+# Imports suggestions.csv on first run.
+suggestion_store = get_suggestion_store(SUGGESTIONS_DB_FILE, legacy_csv=SUGGESTIONS_FILE)
 
 default_subjects = [
     "Hindi", "English", "Maths", "Physics", "Computer Science",
     "Political Science", "History", "Geography", "AEC", "DSE", "SEC", "VAC", "GE"
 ]
-if not SUBJECTS_FILE.exists():
-    pd.DataFrame({"Subject": default_subjects}).to_csv(SUBJECTS_FILE, index=False)
+subject_store = get_subject_store(SUBJECTS_FILE, default_subjects)
+
+metrics = get_metrics()
+if METRICS_FILE:
+    metrics.export_to(METRICS_FILE)
+if METRICS_PORT:
+    metrics.serve(int(METRICS_PORT))
+# Search results, facet counts and sort orders, keyed by request and metadata generation.
+search_cache = get_result_cache("search")
 
 ADMIN_USERNAME = "nish20"
 ADMIN_PASSWORD = "45009Ni"
 
+TABLE_COLUMNS = ['Filename', 'Course', 'Semester', 'Year', 'Subject', 'Type', 'Uploader']
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+MAX_PICKER_OPTIONS = 50
+MAX_SUGGESTION_GROUPS = 50
+FULLTEXT_LIMIT = 500
+SEARCH_FACET_KEYS = {"Course": "search_course", "Semester": "search_semester", "Year": "search_year",
+                     "Subject": "search_subject", "Type": "search_type"}
+
 if "admin_logged_in" not in st.session_state:
     st.session_state.admin_logged_in = False
 
@@ -53,25 +102,21 @@ if "admin_logged_in" not in st.session_state:
 # ----------------------------
 # HELPER FUNCTIONS
 # ----------------------------
+@metrics.timed()
 def save_file(uploaded_file, course, semester, year, subject, file_type, uploader):
-    """Save the uploaded file and record its metadata."""
-    safe_course = course.replace(" ", "_")
-    safe_semester = semester.replace(" ", "_")
-    safe_year = year.replace(" ", "_")
+    """Save the uploaded file and record its metadata.
+
+    Identical content is stored once; the new row just takes another
+    reference on the existing blob.
+    """
     safe_subject = subject.replace(" ", "_")
     safe_type = file_type.replace(" ", "_")
+    ext = os.path.splitext(uploaded_file.name)[1]
 
-    folder_path = UPLOAD_FOLDER / safe_course / safe_semester / safe_year
-    folder_path.mkdir(parents=True, exist_ok=True)
-
-    unique_name = f"{safe_subject}_{safe_type}_{uuid.uuid4().hex}{os.path.splitext(uploaded_file.name)[1]}"
-    file_path = folder_path / unique_name
-
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    unique_name = f"{safe_subject}_{safe_type}_{uuid.uuid4().hex}{ext}"
+    file_path, _, _, is_new = blob_store.put(uploaded_file, ext)
 
     # Save metadata
-    meta_df = pd.read_csv(METADATA_FILE)
     new_entry = {
         "Timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "Course": course,
@@ -83,58 +128,201 @@ def save_file(uploaded_file, course, semester, year, subject, file_type, uploade
         "Path": str(file_path),
         "Uploader": uploader.strip() or "Unknown"
     }
-    meta_df = pd.concat([meta_df, pd.DataFrame([new_entry])], ignore_index=True)
-    meta_df.to_csv(METADATA_FILE, index=False)
+    try:
+        metadata_store.append(new_entry)
+    except BaseException:
+        # No row refers to the blob, so give back the reference put() took.
+        blob_store.release(file_path)
+        raise
+    if is_new:
+        try:
+            fulltext_index.add(file_path, *describe_row(new_entry))
+        except sqlite3.Error:
+            pass  # the upload stands; `python fulltext_index.py rebuild` catches it up
 
     return file_path
 
 
-def delete_file(file_path):
-    """Delete the file and remove its metadata entry."""
-    file_path = Path(file_path)
-    if file_path.exists():
+@metrics.timed()
+def delete_file(filename):
+    """Remove a material's metadata entry and release its file."""
+    row = metadata_store.find(filename)
+    if row is None:
+        return False
+    metadata_store.remove(filename)
+
+    file_path = Path(row["Path"])
+    if blob_store.is_blob(file_path):
+        # Other rows may still point at the same content.
+        if blob_store.release(file_path):
+            fulltext_index.remove(file_path)
+    elif file_path.exists():
+        # Files uploaded before the blob store live in per-course folders.
         file_path.unlink()
-        # Remove metadata
-        meta_df = pd.read_csv(METADATA_FILE)
-        meta_df = meta_df[meta_df["Path"] != str(file_path)]
-        meta_df.to_csv(METADATA_FILE, index=False)
+        fulltext_index.remove(file_path)
 
         # Clean empty folders
         dir_path = file_path.parent
         while dir_path != UPLOAD_FOLDER and not any(dir_path.iterdir()):
             dir_path.rmdir()
             dir_path = dir_path.parent
-        return True
-    return False
+    return True
 
 
+@metrics.timed()
 def save_suggestion(course, semester, year, subject, suggestion):
-    df = pd.read_csv(SUGGESTIONS_FILE)
-    new_row = {
-        "Timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "Course": course,
-        "Semester": semester,
-        "Year": year,
-        "Subject": subject,
-        "Suggestion": suggestion,
-        "Completed": False
-    }
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    df.to_csv(SUGGESTIONS_FILE, index=False)
-
-
-def update_suggestion_status(idx, completed):
-    df = pd.read_csv(SUGGESTIONS_FILE)
-    if 0 <= idx < len(df):
-        df.at[idx, "Completed"] = bool(completed)
-        df.to_csv(SUGGESTIONS_FILE, index=False)
-
-
-def delete_suggestion(idx):
-    df = pd.read_csv(SUGGESTIONS_FILE)
-    if 0 <= idx < len(df):
-        df = df.drop(index=idx)
-        df.to_csv(SUGGESTIONS_FILE, index=False)
+    return suggestion_store.add(course, semester, year, subject, suggestion)
+
+
+@metrics.timed()
+def update_suggestion_status(suggestion_ids, completed):
+    """Mark every suggestion in ``suggestion_ids`` (completed or pending) in one transaction."""
+    suggestion_store.set_completed(suggestion_ids, completed)
+
+
+@metrics.timed()
+def delete_suggestion(suggestion_ids):
+    """Delete every suggestion in ``suggestion_ids`` in one transaction."""
+    suggestion_store.delete(suggestion_ids)
+
+
+def days_since(timestamp, now):
+    """Days from a stored ``%Y-%m-%d %H:%M:%S`` timestamp to ``now``, or None if there is none."""
+    try:
+        then = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+    return round((now - then).total_seconds() / 86400, 1)
+
+
+def render_suggestion_group(group, status, key):
+    """The suggestions of one (course, semester, year, subject), with bulk status and delete actions."""
+    with metrics.span("load suggestions"):
+        suggestions = suggestion_store.list(status, group=group)
+
+    # Only the admin's suggestion editor needs pandas: st.data_editor hands its edits back as a DataFrame.
+    import pandas as pd
+
+    suggestions_df = pd.DataFrame(suggestions, columns=["id", "timestamp", "course", "semester", "year",
+                                                        "subject", "suggestion", "completed"])
+    suggestions_df.insert(0, "Select", False)
+    edited = st.data_editor(
+        suggestions_df,
+        hide_index=True,
+        column_order=["Select", "timestamp", "suggestion", "completed"],
+        column_config={
+            "Select": st.column_config.CheckboxColumn("Select"),
+            "timestamp": "🕒 Submitted",
+            "suggestion": st.column_config.TextColumn("Suggestion", width="large"),
+            "completed": st.column_config.CheckboxColumn("✅ Completed"),
+        },
+        disabled=["timestamp", "suggestion", "completed"],
+        key=f"suggestions_{key}",
+    )
+    selected_ids = edited.loc[edited["Select"], "id"].tolist()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        mark_done = st.button(f"✅ Mark selected completed ({len(selected_ids)})", disabled=not selected_ids,
+                              key=f"done_{key}")
+    with col2:
+        mark_pending = st.button(f"↩️ Mark selected pending ({len(selected_ids)})", disabled=not selected_ids,
+                                 key=f"pending_{key}")
+    with col3:
+        delete_selected = st.button(f"🗑️ Delete selected ({len(selected_ids)})", disabled=not selected_ids,
+                                    key=f"delete_{key}")
+
+    if mark_done or mark_pending:
+        update_suggestion_status(selected_ids, mark_done)
+        st.success("✅ Status updated successfully!")
+        st.rerun()
+
+    if delete_selected:
+        delete_suggestion(selected_ids)
+        st.success("🗑️ Suggestions deleted successfully!")
+        st.rerun()
+
+
+@metrics.timed()
+def facet_selectbox(label, column, options, facets, pending, generation):
+    """Selectbox whose options show how many materials each would return."""
+    # The column's own selection doesn't change its counts.
+    others = {col: value for col, value in pending.items() if col != column}
+    counts, total = search_cache.get(("facets", column, tuple(others.items())), generation,
+                                     lambda: (facets.facet_counts(column, pending), facets.count(others)))
+
+    def with_count(value):
+        return f"{value} ({total if value == 'All' else counts.get(value, 0)})"
+
+    return st.selectbox(label, options, format_func=with_count, key=SEARCH_FACET_KEYS[column])
+
+
+@metrics.timed()
+def search_results(meta_df, facets, filters, search_text):
+    """Rows matching ``filters``; with ``search_text``, only full-text hits, best match first."""
+    with metrics.span("filter"):
+        df = meta_df.select(facets.query(filters))
+    if search_text:
+        with metrics.span("full-text search"):
+            # Search within the filtered rows, so the limit can't cut them off first.
+            paths = df["Path"] if len(df) < len(meta_df) else None
+            hits = fulltext_index.search(search_text, limit=FULLTEXT_LIMIT, paths=paths)
+            rank = {path: i for i, (path, _, _) in enumerate(hits)}
+            snippets = {path: snippet for path, _, snippet in hits}
+            df = df.filter("Path", rank.__contains__).sort("Path", key=rank.get)
+            df = df.assign("Match", [snippets[path] for path in df["Path"]])
+    return df
+
+
+@metrics.timed()
+def paginate(df, page, page_size, sort_by=None, ascending=True, cache_key=None, generation=None):
+    """Return only the rows of ``df`` that fall on ``page`` (1-based).
+
+    When ``cache_key`` names what ``df`` holds, its sorted order is cached
+    with it, so paging through a large result set sorts it only once.
+    """
+    if sort_by and sort_by != "Relevance":
+        unsorted = df
+        if cache_key is None:
+            df = unsorted.sort(sort_by, ascending=ascending)
+        else:
+            df = search_cache.get(("sorted", cache_key, sort_by, ascending), generation,
+                                  lambda: unsorted.sort(sort_by, ascending=ascending))
+    start = (page - 1) * page_size
+    return df.slice(start, start + page_size)
+
+
+@metrics.timed()
+def render_paginated_table(df, key, columns=TABLE_COLUMNS, ranked=False, cache_key=None, generation=None):
+    """Render one page of ``df`` with sort and page-size controls.
+
+    Only the visible slice is serialized and sent to the browser; the page
+    is returned so callers can render per-row widgets for it alone. A
+    ``ranked`` frame is already in relevance order and offers that as the
+    default sort. ``cache_key`` and ``generation`` are passed on to
+    ``paginate``.
+    """
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        sort_options = (["Relevance"] if ranked else []) + ["Timestamp"] + TABLE_COLUMNS
+        sort_by = st.selectbox("Sort by", sort_options, key=f"{key}_sort_{ranked}")
+    with col2:
+        order = st.selectbox("Order", ["Ascending", "Descending"], key=f"{key}_order")
+    with col3:
+        page_size = st.selectbox("Rows per page", PAGE_SIZE_OPTIONS, key=f"{key}_page_size")
+    total_pages = max(1, math.ceil(len(df) / page_size))
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > total_pages:
+        st.session_state[page_key] = total_pages
+    with col4:
+        page = st.number_input(f"Page (of {total_pages})", min_value=1, max_value=total_pages, step=1, key=page_key)
+
+    page_df = paginate(df, int(page), page_size, sort_by, order == "Ascending", cache_key, generation)
+    with metrics.span("st.dataframe"):
+        st.dataframe(page_df.to_dict(columns), hide_index=True)
+    start = (int(page) - 1) * page_size
+    st.caption(f"Showing {start + 1}–{start + len(page_df)} of {len(df)}")
+    return page_df
 
 
 # ----------------------------
@@ -148,6 +336,7 @@ st.markdown("---")
 # ----------------------------
 menu = ["Home", "Search Materials", "Admin Login", "Admin Dashboard"]
 choice = st.sidebar.radio("Navigation", menu)
+rerun = metrics.begin_rerun(choice, profile=st.session_state.pop("profile_next_rerun", False))
 
 # ----------------------------
 # HOME PAGE
@@ -164,14 +353,27 @@ if choice == "Home":
 elif choice == "Search Materials":
     st.subheader("🎓 Search or Browse Materials")
 
-    course_options = sorted(["BSc Physical Science", "BCom (hons.)", "Bcom (Prog.)", "BA (hons.)", "BA (Prog.)"])
-    subject_df = pd.read_csv(SUBJECTS_FILE)
-    subject_options = ["All"] + sorted(subject_df["Subject"].tolist())
-
-    course = st.selectbox("Select Course", ["All"] + course_options)
-    semester = st.selectbox("Select Semester", ["All", "1st", "2nd", "3rd", "4th", "5th", "6th"])
-    year = st.selectbox("Select Year", ["All", "2023", "2024", "2025"])
-    subject = st.selectbox("Select Subject", subject_options)
+    with metrics.span("load metadata"):
+        meta_df, facets, generation = metadata_store.load_versioned()
+        taxonomy = metadata_store.taxonomy()
+    # Each level only offers values that have material under the selection above it.
+    facet_options, above = {}, []
+    for column in TAXONOMY_LEVELS:
+        facet_options[column] = ["All"] + list(taxonomy.options(*above))
+        key = SEARCH_FACET_KEYS[column]
+        if st.session_state.get(key, "All") not in facet_options[column]:
+            # Left over from another course, or its last material was deleted.
+            st.session_state[key] = "All"
+        above.append(st.session_state.get(key, "All"))
+    # Option counts follow the current, not yet submitted, selection.
+    pending = {col: st.session_state.get(key, "All") for col, key in SEARCH_FACET_KEYS.items()}
+
+    course = facet_selectbox("Select Course", "Course", facet_options["Course"], facets, pending, generation)
+    semester = facet_selectbox("Select Semester", "Semester", facet_options["Semester"], facets, pending, generation)
+    year = facet_selectbox("Select Year", "Year", facet_options["Year"], facets, pending, generation)
+    subject = facet_selectbox("Select Subject", "Subject", facet_options["Subject"], facets, pending, generation)
+    file_type = facet_selectbox("Select Type", "Type", ["All", "Notes", "PYQ", "Books"], facets, pending, generation)
+    text_query = st.text_input("🔎 Search inside files", placeholder="e.g. laplace transform, or lapl* for a prefix")
 
     col1, col2 = st.columns(2)
     with col1:
@@ -179,32 +381,97 @@ elif choice == "Search Materials":
     with col2:
         show_all = st.button("📂 Show All Files")
 
-    meta_df = pd.read_csv(METADATA_FILE)
-
+    # Remember the submitted filters so paging and sorting reruns keep the results.
     if search_btn or show_all:
-        df = meta_df.copy()
-        if not show_all:
-            if course != "All":
-                df = df[df["Course"] == course]
-            if semester != "All":
-                df = df[df["Semester"] == semester]
-            if year != "All":
-                df = df[df["Year"] == year]
-            if subject != "All":
-                df = df[df["Subject"] == subject]
+        st.session_state.search_filters = {} if show_all else {
+            "Course": course, "Semester": semester, "Year": year, "Subject": subject, "Type": file_type}
+        st.session_state.search_text = "" if show_all else text_query.strip()
+        st.session_state.results_page = 1
+
+    filters = st.session_state.get("search_filters")
+    if filters is not None:
+        search_text = st.session_state.get("search_text", "")
+        # Reruns that don't change the request (paging, typing a suggestion) hit the cache.
+        results_key = (tuple(filters.items()), search_text)
+        df = search_cache.get(("results", results_key), generation,
+                              lambda: search_results(meta_df, facets, filters, search_text))
 
         if not df.empty:
             st.markdown("### 📘 Available Materials")
-            st.dataframe(df[['Filename', 'Course', 'Semester', 'Year', 'Subject', 'Type', 'Uploader']])
-
-            for _, row in df.iterrows():
-                st.download_button(label=f"⬇️ Download {row['Filename']}",
-                                   data=open(row["Path"], "rb"),
-                                   file_name=row["Filename"],
-                                   key=row["Path"])
+            if search_text:
+                page_df = render_paginated_table(df, "results", TABLE_COLUMNS + ["Match"], ranked=True,
+                                                 cache_key=results_key, generation=generation)
+            else:
+                page_df = render_paginated_table(df, "results", cache_key=results_key, generation=generation)
+
+            # The archive is only built when asked for, and reused while the results stay the same.
+            bundle_name = "_".join(str(v) for v in filters.values() if v != "All") or "materials"
+            bundle_file = f"{bundle_name.replace(' ', '_')}.zip"
+            bundle_label = f"📦 Download all {len(df)} as ZIP"
+
+            def bundle_for():
+                entries = list(zip(df["Filename"], df["Path"]))
+                return entries, bundle_cache.path_for(entries), bundle_size(entries)
+
+            bundle_entries, bundle_path, (bundle_files, bundle_bytes) = search_cache.get(
+                ("bundle", results_key), generation, bundle_for)
+            fits_inline = bundle_files <= MAX_INLINE_BUNDLE_FILES and bundle_bytes <= MAX_INLINE_BUNDLE_BYTES
+            if FILE_SERVER_URL and bundle_bytes <= bundle_cache.max_bytes:
+                # Built on disk and streamed by file_server.py, never held in memory here.
+                bundle_slot = st.empty()
+                if not os.path.exists(bundle_path) and bundle_slot.button(f"📦 Prepare all {len(df)} as ZIP",
+                                                                          key="build_bundle"):
+                    with st.spinner(f"Packing {bundle_files} files…"):
+                        bundle_cache.build(bundle_entries)
+                if os.path.exists(bundle_path):
+                    bundle_slot.link_button(bundle_label,
+                                            signed_url(FILE_SERVER_URL, UPLOAD_FOLDER, bundle_path,
+                                                       filename=bundle_file, secret=file_server_secret))
+            elif not FILE_SERVER_URL and fits_inline:
+                st.download_button(label=bundle_label,
+                                   data=lazy_bundle(bundle_cache, bundle_entries),
+                                   file_name=bundle_file,
+                                   mime="application/zip",
+                                   key="download_all",
+                                   on_click="ignore")
+            else:
+                st.caption(f"📦 These {bundle_files} files ({bundle_bytes / (1024 * 1024):.0f} MB) are too large "
+                           "to download as one ZIP; narrow the filters.")
+            with metrics.span("download buttons"):
+                for row in page_df.rows():
+                    if not os.path.exists(row["Path"]):
+                        # A row left behind by a manual cleanup; `python reconcile.py --repair` drops these.
+                        st.caption(f"⚠️ {row['Filename']} is missing from the server.")
+                    elif FILE_SERVER_URL:
+                        # Served zero-copy by file_server.py instead of through the websocket.
+                        st.link_button(f"⬇️ Download {row['Filename']}",
+                                       signed_url(FILE_SERVER_URL, UPLOAD_FOLDER, row["Path"], filename=row["Filename"],
+                                                  secret=file_server_secret))
+                    else:
+                        counted = (row["Filename"], row["Course"], row["Semester"],
+                                   material_title(row["Subject"], row["Type"], row["Year"]))
+                        st.download_button(label=f"⬇️ Download {row['Filename']}",
+                                           data=lazy_file(row["Path"],
+                                                          on_open=lambda counted=counted: download_stats.record(*counted)),
+                                           file_name=row["Filename"],
+                                           key=row["Filename"],
+                                           on_click="ignore")
         else:
             st.warning("No files found.")
 
+    with metrics.span("trending"):
+        trending = download_stats.trending(pending["Course"], pending["Semester"])
+    if trending:
+        scope = " · ".join(v for v in (pending["Course"], pending["Semester"]) if v != "All") or "the portal"
+        st.markdown(f"### 🔥 Trending in {scope}")
+        st.caption("Most downloaded lately; a download counts half as much every "
+                   f"{download_stats.half_life / 86400:g} days.")
+        st.dataframe({"Material": [t.title for t in trending],
+                      "Course": [t.course for t in trending],
+                      "Semester": [t.semester for t in trending],
+                      "Recent downloads": [round(t.score, 1) for t in trending],
+                      "All-time": [t.downloads for t in trending]}, hide_index=True)
+
     st.markdown("---")
     st.markdown("### 💬 Suggestion Box (For Students)")
     st.info("Submit your queries, issues, or suggestions to the admin here.")
@@ -254,8 +521,7 @@ elif choice == "Admin Dashboard":
 
         # SUBJECT MANAGEMENT
         st.markdown("### 📘 Subject Management")
-        subject_df = pd.read_csv(SUBJECTS_FILE)
-        subject_list = sorted(subject_df["Subject"].tolist())
+        subject_list = subject_store.load()
         subject = st.selectbox("Select Subject", subject_list)
 
         with st.expander("➕ Add New Subject"):
@@ -263,9 +529,7 @@ elif choice == "Admin Dashboard":
             if st.button("Add Subject"):
                 if new_subject.strip():
                     new_subject_clean = new_subject.strip().title()
-                    if new_subject_clean not in subject_list:
-                        subject_list.append(new_subject_clean)
-                        pd.DataFrame({"Subject": sorted(subject_list)}).to_csv(SUBJECTS_FILE, index=False)
+                    if subject_store.add(new_subject_clean):
                         st.success(f"✅ Added '{new_subject_clean}' to subjects list!")
                         st.rerun()
                     else:
@@ -285,18 +549,53 @@ elif choice == "Admin Dashboard":
             else:
                 st.error("Please fill all fields and select a file (including uploader name).")
 
+        with st.expander("📦 Bulk Import (ZIP)"):
+            st.caption("Lay the ZIP out as <course>/<semester>/<year>/<Subject>_<Type>_….<ext>, "
+                       "e.g. BCA/1st/2024/Computer_Science_PYQ_2023.pdf.")
+            bulk_zip = st.file_uploader("Choose a ZIP", type=["zip"], key="bulk_zip")
+            if st.button("Import ZIP") and bulk_zip is not None:
+                zip_path = UPLOAD_FOLDER / f".bulk-{uuid.uuid4().hex}.zip"
+                try:
+                    ingest(bulk_zip, zip_path, max_bytes=BULK_MAX_BYTES)
+                    with st.spinner("Importing..."):
+                        report = import_materials(zip_path, blob_store, metadata_store=metadata_store,
+                                                  index=fulltext_index, uploader=uploader_name.strip() or "Bulk import")
+                    counts = summarize(report)
+                    st.success(f"{counts['imported']} imported, {counts['duplicate']} duplicate, "
+                               f"{counts['failed']} failed.")
+                    st.dataframe([dict(zip(["Source", "Status", "Detail", "Path"], row)) for row in report])
+                except Exception as e:
+                    st.error(f"Bulk import failed: {e}")
+                finally:
+                    zip_path.unlink(missing_ok=True)
+
         # Uploaded Materials
         st.markdown("---")
         st.markdown("### 📘 Uploaded Materials")
-        meta_df = pd.read_csv(METADATA_FILE)
+        with metrics.span("load metadata"):
+            meta_df, _, generation = metadata_store.load_versioned()
         if not meta_df.empty:
-            st.dataframe(meta_df[['Filename', 'Course', 'Semester', 'Year', 'Subject', 'Type', 'Uploader']])
+            render_paginated_table(meta_df, "admin_materials", cache_key=("admin",), generation=generation)
+            stats = metadata_store.stats()
+            st.caption(f"Metadata cache: {stats['hits']} hits / {stats['misses']} misses "
+                       f"({stats['hit_rate']:.0%} hit rate), generation {stats['generation']}")
+            stats = search_cache.stats()
+            st.caption(f"Search result cache: {stats['entries']} entries, {stats['bytes'] / 1024 / 1024:.1f} MiB, "
+                       f"{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+                       f"{stats['evictions']} evictions, {stats['invalidations']} invalidations")
 
             st.markdown("### 🗑️ Delete Uploaded Material")
-            filename_to_delete = st.selectbox("Select file to delete", meta_df['Filename'].tolist())
-            if st.button("Confirm Delete"):
-                file_path = meta_df.loc[meta_df['Filename'] == filename_to_delete, 'Path'].values[0]
-                if delete_file(file_path):
+            delete_query = st.text_input("🔎 Find file to delete", placeholder="Type part of the filename")
+            matches = meta_df
+            if delete_query.strip():
+                needle = delete_query.strip().lower()
+                matches = meta_df.filter("Filename", lambda name: needle in name.lower())
+            if len(matches) > MAX_PICKER_OPTIONS:
+                st.caption(f"{len(matches)} matches — showing the first {MAX_PICKER_OPTIONS}, type more to narrow down.")
+            options = matches.slice(0, MAX_PICKER_OPTIONS)["Filename"]
+            filename_to_delete = st.selectbox("Select file to delete", options)
+            if st.button("Confirm Delete", disabled=not options):
+                if delete_file(filename_to_delete):
                     st.success(f"✅ Deleted {filename_to_delete}")
                     st.rerun()
                 else:
@@ -307,28 +606,72 @@ elif choice == "Admin Dashboard":
         # Suggestions Section
         st.markdown("---")
         st.markdown("### 📨 Student Suggestions / Queries")
-        suggestions_df = pd.read_csv(SUGGESTIONS_FILE)
-        if suggestions_df.empty:
+        if suggestion_store.count() == 0:
             st.info("No suggestions submitted yet.")
         else:
             filter_choice = st.radio("👁️ Show Suggestions:", ["All", "Pending Only", "Completed Only"], horizontal=True)
-            if filter_choice == "Pending Only":
-                suggestions_df = suggestions_df[suggestions_df["Completed"] == False]
-            elif filter_choice == "Completed Only":
-                suggestions_df = suggestions_df[suggestions_df["Completed"] == True]
-
-            for idx, row in suggestions_df.iterrows():
-                with st.expander(f"🕒 {row['Timestamp']} — {row['Course']} | {row['Semester']} | {row['Year']} | {row['Subject']}"):
-                    st.write(f"**Suggestion:** {row['Suggestion']}")
-                    completed = st.checkbox("✅ Mark as Completed", value=bool(row["Completed"]), key=f"comp_{idx}")
-                    delete_btn = st.button("🗑️ Delete", key=f"del_{idx}")
-
-                    if completed != bool(row["Completed"]):
-                        update_suggestion_status(idx, completed)
-                        st.success("✅ Status updated successfully!")
-                        st.rerun()
-
-                    if delete_btn:
-                        delete_suggestion(idx)
-                        st.success("🗑️ Suggestion deleted successfully!")
-                        st.rerun()
+            status = {"Pending Only": PENDING, "Completed Only": COMPLETED}.get(filter_choice)
+            # Read from the per-group aggregates; the suggestions themselves load when a group is expanded.
+            with metrics.span("load suggestion groups"):
+                groups = suggestion_store.groups(status)
+            now = datetime.datetime.now()
+            st.dataframe({
+                "Course": [g["course"] for g in groups],
+                "Semester": [g["semester"] for g in groups],
+                "Year": [g["year"] for g in groups],
+                "Subject": [g["subject"] for g in groups],
+                "Pending": [g["pending"] for g in groups],
+                "Completed": [g["completed"] for g in groups],
+                "Median pending age (days)": [days_since(g["median_pending_since"], now) for g in groups],
+            }, hide_index=True)
+
+            if len(groups) > MAX_SUGGESTION_GROUPS:
+                st.caption(f"{len(groups)} groups — listing the {MAX_SUGGESTION_GROUPS} with the most pending below.")
+            for group in groups[:MAX_SUGGESTION_GROUPS]:
+                values = tuple(group[col] for col in GROUP_COLUMNS)
+                key = f"{filter_choice}_{'|'.join(values)}"
+                label = (f"{' · '.join(v for v in values if v) or 'No course given'} — "
+                         f"{group['pending']} pending, {group['completed']} completed")
+                expander = st.expander(label, key=f"suggestion_group_{key}", on_change="rerun")
+                with expander:
+                    if expander.open:
+                        render_suggestion_group(values, status, key)
+
+        # Performance
+        st.markdown("---")
+        st.markdown("### ⏱️ Performance")
+        summary = metrics.summary()
+        if not summary:
+            st.info("No timings recorded yet.")
+        else:
+            st.caption(f"Per page and span, over the last {metrics.window} calls from all sessions. "
+                       "'rerun' is the whole script run.")
+            st.dataframe(summary, hide_index=True)
+            spans = [(row["Page"], row["Span"]) for row in summary]
+            page_span = st.selectbox("Histogram of", spans, format_func=lambda ps: f"{ps[0]} / {ps[1]}")
+            buckets = metrics.histogram(*page_span)
+            st.bar_chart({"Bucket": list(buckets), "Calls": list(buckets.values())},
+                         x="Bucket", y="Calls", sort=False)
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("🔬 Profile next rerun"):
+                # Picked up by begin_rerun on this session's next script run.
+                st.session_state.profile_next_rerun = True
+                st.info("The next page load or interaction in this session will be profiled.")
+        with col2:
+            st.download_button("📈 Prometheus metrics", metrics.to_prometheus(), file_name="portal_metrics.prom",
+                               mime="text/plain", on_click="ignore")
+        with col3:
+            if st.button("♻️ Reset timings"):
+                metrics.reset()
+                st.rerun()
+
+        profile = metrics.last_profile
+        if profile is not None:
+            with st.expander(f"cProfile of a {profile.page} rerun ({profile.seconds * 1000:.0f} ms, {profile.finished})"):
+                st.code(profile.text, language=None)
+                st.download_button("Download .prof", profile.data, file_name="rerun.prof",
+                                   mime="application/octet-stream", on_click="ignore")
+
+rerun.finish()
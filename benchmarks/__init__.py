@@ -0,0 +1,12 @@
+"""Benchmarks for both front ends.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --out results.json
+    python -m benchmarks.run --compare baseline.json results.json
+
+``corpus`` builds a reproducible synthetic portal (materials with a skewed
+course/semester/year/subject mix, dummy files, suggestions) in both app.py's
+CSV layout and the Tkinter client's SQLite schema. ``run`` times the hot
+paths against it and reports p50/p95/p99 latencies and peak RSS per scale;
+each scale runs in its own process so the RSS figures don't bleed into each
+other.
+"""
@@ -0,0 +1,142 @@
+"""Synthetic, seeded portal data for the benchmarks.
+
+The same seed always gives the same rows and file contents. Popularity is
+skewed the way real uploads are: a few courses, recent years, early
+semesters and core subjects account for most materials.
+"""
+import datetime
+import hashlib
+import os
+import random
+from collections import namedtuple
+
+from blob_store import BlobStore
+from columnar import write_csv
+from metadata_store import METADATA_COLUMNS
+from portal_db import Database
+from suggestions_db import SuggestionStore
+
+COURSES = ["BSc Physical Science", "BCom (hons.)", "Bcom (Prog.)", "BA (hons.)", "BA (Prog.)",
+           "BCA", "BSc Physical Science with Computer Science", "BA"]
+SEMESTERS = ["1st", "2nd", "3rd", "4th", "5th", "6th", "7th", "8th"]
+YEARS = ["2022", "2023", "2024", "2025", "2026"]
+CORE_SUBJECTS = ["Hindi", "English", "Maths", "Physics", "Computer Science",
+                 "Political Science", "History", "Geography", "AEC", "DSE", "SEC", "VAC", "GE"]
+SUBJECT_POOL = CORE_SUBJECTS + [f"Elective {i}" for i in range(400)]
+TYPES = ["PYQ", "Notes", "Books"]
+FILE_SIZE = 1024
+
+# Layout of a generated portal, relative to its root directory.
+METADATA_FILE = "uploads_metadata.csv"
+DB_FILE = "college_materials.db"
+SUGGESTIONS_DB_FILE = "suggestions.db"
+BLOB_REFS_FILE = "blob_refs.db"
+UPLOAD_FOLDER = "uploads"
+
+Material = namedtuple("Material", ["course", "semester", "year", "subject", "type"])
+Corpus = namedtuple("Corpus", ["root", "materials", "paths", "filenames", "suggestion_ids"])
+
+
+def zipf_weights(n, s=1.1):
+    return [1 / (rank + 1) ** s for rank in range(n)]
+
+
+class Skew:
+    """Draws materials with Zipf-like popularity over every dimension."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self._weights = {
+            "course": zipf_weights(len(COURSES)),
+            "semester": zipf_weights(len(SEMESTERS), 0.6),
+            "year": list(reversed(zipf_weights(len(YEARS), 0.8))),
+            "subject": zipf_weights(len(SUBJECT_POOL), 0.9),
+            "type": [0.55, 0.35, 0.10],
+        }
+
+    def _pick(self, values, key):
+        return self.rng.choices(values, self._weights[key])[0]
+
+    def material(self):
+        return Material(self._pick(COURSES, "course"), self._pick(SEMESTERS, "semester"),
+                        self._pick(YEARS, "year"), self._pick(SUBJECT_POOL, "subject"), self._pick(TYPES, "type"))
+
+    def filters(self):
+        """A search as a student would make it: most fields set, some left at "All"."""
+        m = self.material()
+        return {col: (value if self.rng.random() < 0.7 else "All")
+                for col, value in zip(["Course", "Semester", "Year", "Subject", "Type"], m)}
+
+
+def unique_materials(n, rng):
+    """``n`` distinct materials (the Tkinter schema allows one per combination)."""
+    skew = Skew(rng)
+    seen = set()
+    out = []
+    while len(out) < n:
+        m = skew.material()
+        key = (m.course, m.semester, m.year, m.subject.lower(), m.type)
+        if key not in seen:
+            seen.add(key)
+            out.append(m)
+    return out
+
+
+def dummy_pdf(rng, size=FILE_SIZE):
+    return b"%PDF-1.4\n" + rng.randbytes(max(size - 9, 0))
+
+
+def build(root, n, seed=0, suggestions=None, file_size=FILE_SIZE):
+    """Create a portal with ``n`` materials (and as many suggestions) under ``root``."""
+    rng = random.Random(seed)
+    suggestions = n if suggestions is None else suggestions
+    os.makedirs(root, exist_ok=True)
+    blob_root = os.path.join(root, UPLOAD_FOLDER, "blobs")
+    blobs = BlobStore(blob_root, os.path.join(root, BLOB_REFS_FILE))
+
+    materials = unique_materials(n, rng)
+    start = datetime.datetime(2024, 1, 1)
+    rows, refs, paths, filenames = [], [], [], []
+    for i, m in enumerate(materials):
+        data = dummy_pdf(rng, file_size)
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = blobs.blob_path(sha256, ".pdf")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        rel_path = os.path.relpath(path, root)
+        filename = f"{m.subject.replace(' ', '_')}_{m.type}_{i:08x}.pdf"
+        timestamp = (start + datetime.timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append([timestamp, m.course, m.semester, m.year, m.subject, m.type, filename, rel_path, "Benchmark"])
+        # One reference from the metadata row and one from the materials row, as bulk_import takes.
+        refs.append((sha256, ".pdf", len(data), 2))
+        paths.append(rel_path)
+        filenames.append(filename)
+
+    write_csv(os.path.join(root, METADATA_FILE), METADATA_COLUMNS, [dict(zip(METADATA_COLUMNS, r)) for r in rows])
+    with blobs._connect() as conn:
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO blobs (sha256, ext, size, refcount) VALUES (?, ?, ?, ?)", refs)
+        conn.execute("COMMIT")
+
+    db = Database(os.path.join(root, DB_FILE))
+    with db.transaction() as conn:
+        course_ids = {course: db.ensure_course(conn, course) for course in COURSES}
+        conn.executemany("""
+            INSERT INTO materials (course_id, semester, year, subject, type, file_path, uploaded_on)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(course_ids[r[1]], r[2], r[3], r[4], r[5], r[7], r[0]) for r in rows])
+    db.close()
+
+    store = SuggestionStore(os.path.join(root, SUGGESTIONS_DB_FILE))
+    skew = Skew(rng)
+    with store._connect() as conn:
+        conn.executemany("""
+            INSERT INTO suggestions (timestamp, course, semester, year, subject, suggestion, completed)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [((start + datetime.timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"), *skew.material()[:4],
+               f"Please upload more material ({i})", int(rng.random() < 0.3)) for i in range(suggestions)])
+        suggestion_ids = [row[0] for row in conn.execute("SELECT id FROM suggestions")]
+    store.rebuild_groups()
+
+    return Corpus(root, materials, paths, filenames, suggestion_ids)
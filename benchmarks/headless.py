@@ -0,0 +1,203 @@
+"""Drive both front ends without a browser or a display.
+
+app.py is a Streamlit script: importing it renders the page. Its helper
+functions are lifted out of the source instead and run against stores
+opened on the benchmark corpus. The Tkinter ``CollegeApp`` is built
+without a window: its combo boxes, tables and task runner are replaced by
+stand-ins that keep the real query, paging and diffing code on the path.
+Both expect to run with the corpus root as the working directory.
+"""
+import ast
+import os
+import types
+
+from virtual_table import MAX_ROWS, PAGE_SIZE, VirtualTable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_HELPERS = ("save_file", "delete_file", "save_suggestion", "update_suggestion_status", "delete_suggestion",
+               "search_results")
+
+
+def load_app_helpers(app_path=os.path.join(ROOT, "app.py"), names=APP_HELPERS):
+    """app.py's helper functions, bound to stores opened in the working directory.
+
+    Returns a namespace holding the helpers, app.py's literal constants
+    and the stores and caches they use (``metadata_store``,
+    ``blob_store``, ``fulltext_index``, ``suggestion_store``,
+    ``search_cache``).
+    """
+    with open(app_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), app_path)
+    imports, functions, constants = [], [], {}
+    for node in tree.body:
+        if isinstance(node, ast.Import) and all(alias.name != "streamlit" for alias in node.names):
+            imports.append(node)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append(node)
+        elif (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)
+              and node.targets[0].id.isupper()):
+            try:
+                constants[node.targets[0].id] = ast.literal_eval(node.value)
+            except ValueError:
+                pass
+        elif isinstance(node, ast.FunctionDef) and node.name in names:
+            functions.append(node)
+    namespace = {"__name__": "app_helpers", **constants}
+    exec(compile(ast.Module(body=imports, type_ignores=[]), app_path, "exec"), namespace)
+    # The helpers are decorated with @metrics.timed().
+    namespace["metrics"] = namespace["get_metrics"]()
+    exec(compile(ast.Module(body=functions, type_ignores=[]), app_path, "exec"), namespace)
+
+    upload_folder = namespace["Path"]("uploads")
+    namespace.update(
+        UPLOAD_FOLDER=upload_folder,
+        metadata_store=namespace["get_store"]("uploads_metadata.csv"),
+        fulltext_index=namespace["get_index"]("search_index.db"),
+        blob_store=namespace["get_blob_store"](upload_folder / "blobs", "blob_refs.db"),
+        suggestion_store=namespace["get_suggestion_store"]("suggestions.db"),
+        search_cache=namespace["get_result_cache"]("search"),
+    )
+    return types.SimpleNamespace(**{k: v for k, v in namespace.items() if not k.startswith("__")})
+
+
+class Entry:
+    """Stands in for a Combobox or Entry."""
+
+    def __init__(self, value=""):
+        self.value = value
+        self.options = {}
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def __setitem__(self, key, value):
+        self.options[key] = value
+
+    def __getitem__(self, key):
+        return self.options.get(key)
+
+
+class Tree:
+    """The subset of ``ttk.Treeview`` that ``VirtualTable`` uses, on a list."""
+
+    def __init__(self):
+        self.order = []
+        self.values = {}
+
+    def get_children(self, item=""):
+        return tuple(self.order)
+
+    def insert(self, parent, index, iid=None, values=()):
+        position = len(self.order) if index == "end" else index
+        self.order.insert(position, iid)
+        self.values[iid] = values
+        return iid
+
+    def delete(self, *items):
+        gone = set(items)
+        self.order = [iid for iid in self.order if iid not in gone]
+        for iid in items:
+            del self.values[iid]
+
+    def item(self, iid, values=None):
+        if values is not None:
+            self.values[iid] = values
+        return {"values": self.values[iid]}
+
+    def index(self, iid):
+        return self.order.index(iid)
+
+    def move(self, iid, parent, index):
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+
+    def yview(self):
+        return 0.0, 1.0
+
+    def yview_moveto(self, fraction):
+        pass
+
+    def selection(self):
+        return ()
+
+
+class HeadlessTable(VirtualTable):
+    def __init__(self, page_size=PAGE_SIZE, max_rows=MAX_ROWS):
+        # Skips ttk.Frame.__init__, which needs a Tk root.
+        self.tasks = None
+        self.page_size = page_size
+        self.max_rows = max(max_rows, 2 * page_size)
+        self.tree = Tree()
+        self._fetch = None
+        self._rows = {}
+        self._anchor = None
+        self._more_after = False
+        self._pending = None
+        self._generation = 0
+        self._loading = False
+
+    def page_forward(self):
+        """Load the page below the window, as scrolling to the bottom edge does."""
+        self._load_page(self._read_after, self._rows[self.tree.get_children()[-1]][0], self._add_after)
+
+    def scroll_to_end(self):
+        """Page forward until the result set is exhausted, as a user dragging the scrollbar would."""
+        while self._more_after:
+            self.page_forward()
+
+
+class ImmediateTasks:
+    """A ``TaskRunner`` that runs each job inline and delivers its outcome at once."""
+
+    def submit(self, work, *args, on_done=None, on_error=None, on_progress=None, channel=None):
+        from task_runner import Task
+
+        task = Task(self, channel)
+        try:
+            result = work(task, *args)
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(e)
+        else:
+            if on_done is not None:
+                on_done(result)
+        return task
+
+    def shutdown(self):
+        pass
+
+
+def make_college_app(db_path="college_materials.db"):
+    """A ``CollegeApp`` with the admin and result tables, but no window."""
+    import college_portal_streamlit as portal
+
+    app = portal.CollegeApp.__new__(portal.CollegeApp)
+    app.db = portal.get_db(db_path)
+    app.tasks = ImmediateTasks()
+    app.admin_logged_in = True
+    app.selected_file_path = None
+    for name in ("search_course_combo", "search_sem_combo", "search_year_combo", "subject_search_combo",
+                 "text_search_entry", "upload_course_combo", "upload_sem_combo", "upload_year_combo",
+                 "upload_sub_combo", "upload_type_combo"):
+        setattr(app, name, Entry())
+    app.filter_type_combo = Entry("All")
+    app.admin_view = HeadlessTable()
+    app.result_view = HeadlessTable()
+    app.admin_result_table = app.admin_view.tree
+    app.result_table = app.result_view.tree
+    return app
+
+
+def set_search(app, course="", semester="", year="", mat_type="All", subject=""):
+    app.search_course_combo.set(course)
+    app.search_sem_combo.set(semester)
+    app.search_year_combo.set(year)
+    app.filter_type_combo.set(mat_type)
+    app.subject_search_combo.set(subject)
@@ -0,0 +1,256 @@
+"""Time the portal's hot paths against synthetic corpora of several sizes.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --out results.json
+    python -m benchmarks.run --sizes 10000 --compare baseline.json
+    python -m benchmarks.run --compare baseline.json results.json
+
+Each size gets a fresh corpus and its own worker process, so peak RSS is
+that of one scale only. Results are written as JSON (latency percentiles
+in milliseconds, peak RSS in MiB); ``--compare`` reports operations whose
+p95 grew by more than ``--threshold`` against a baseline and exits with
+status 1 if there are any.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZES = [1000, 10000, 100000]
+ITERATIONS = 200
+SUGGESTION_BATCH = 50
+THRESHOLD = 0.2
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of nanosecond samples."""
+    values = sorted(samples)
+    summary = {f"p{p}": round(percentile(values, p) / 1e6, 4) for p in PERCENTILES}
+    summary.update(n=len(values), mean=round(sum(values) / len(values) / 1e6, 4))
+    return summary
+
+
+def timed(samples, fn, *args, **kwargs):
+    start = time.perf_counter_ns()
+    result = fn(*args, **kwargs)
+    samples.append(time.perf_counter_ns() - start)
+    return result
+
+
+def peak_rss_mib():
+    """Peak resident set size of this process, or None where ``resource`` is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Upload(io.BytesIO):
+    """What ``st.file_uploader`` hands to ``save_file``."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+def bench_app(corpus, rng, iterations):
+    """app.py: a Search page rerun, suggestion updates, uploads and deletes."""
+    from benchmarks.corpus import Skew, dummy_pdf
+    from benchmarks.headless import load_app_helpers
+    from facet_index import FACET_COLUMNS
+
+    app = load_app_helpers()
+    skew = Skew(rng)
+    samples = {name: [] for name in ("app.search", "app.update_suggestion_status", "app.save_file",
+                                     "app.delete_file")}
+
+    def search_rerun(filters):
+        # What the Search page does on every rerun once filters were submitted.
+        meta_df, facets, generation = app.metadata_store.load_versioned()
+        for column in FACET_COLUMNS:
+            others = tuple((col, value) for col, value in filters.items() if col != column)
+            app.search_cache.get(("facets", column, others), generation,
+                                 lambda: (facets.facet_counts(column, filters), facets.count(dict(others))))
+        return app.search_cache.get(("results", (tuple(filters.items()), "")), generation,
+                                    lambda: app.search_results(meta_df, facets, filters, ""))
+
+    for _ in range(iterations):
+        timed(samples["app.search"], search_rerun, skew.filters())
+
+    for _ in range(iterations):
+        ids = rng.sample(corpus.suggestion_ids, min(SUGGESTION_BATCH, len(corpus.suggestion_ids)))
+        timed(samples["app.update_suggestion_status"], app.update_suggestion_status, ids, rng.random() < 0.5)
+
+    for i in range(iterations):
+        m = skew.material()
+        upload = Upload(dummy_pdf(rng), f"bench_{i}.pdf")
+        timed(samples["app.save_file"], app.save_file, upload, *m, "Benchmark")
+
+    for filename in rng.sample(corpus.filenames, min(iterations, len(corpus.filenames))):
+        timed(samples["app.delete_file"], app.delete_file, filename)
+    return samples
+
+
+def bench_tk(corpus, rng, iterations):
+    """The Tkinter client: student searches, admin table loads and refreshes."""
+    from benchmarks.corpus import Skew
+    from benchmarks.headless import make_college_app, set_search
+
+    app = make_college_app()
+    skew = Skew(rng)
+    samples = {name: [] for name in ("tk.search_materials", "tk.load_admin_materials",
+                                     "tk.refresh_admin_materials", "tk.admin_scroll_page")}
+
+    for _ in range(iterations):
+        filters = skew.filters()
+        set_search(app, *("" if filters[col] == "All" else filters[col]
+                          for col in ("Course", "Semester", "Year")),
+                   filters["Type"], "" if filters["Subject"] == "All" else filters["Subject"])
+        timed(samples["tk.search_materials"], app.search_materials)
+
+    for _ in range(iterations):
+        timed(samples["tk.load_admin_materials"], app.load_admin_materials)
+        timed(samples["tk.refresh_admin_materials"], app.refresh_admin_materials)
+
+    # Scrolling the admin table: one page fetched and the window trimmed each time.
+    view = app.admin_view
+    app.load_admin_materials()
+    for _ in range(iterations):
+        if not view._more_after:
+            app.load_admin_materials()
+        timed(samples["tk.admin_scroll_page"], view.page_forward)
+    return samples
+
+
+def run_worker(root, iterations, seed):
+    """Benchmark the corpus at ``root`` in this process; returns the result for one size."""
+    import pickle
+
+    os.chdir(root)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    with open("corpus.pickle", "rb") as f:
+        corpus = pickle.load(f)
+    rng = random.Random(seed)
+    samples = {}
+    samples.update(bench_tk(corpus, rng, iterations))
+    samples.update(bench_app(corpus, rng, iterations))
+    return {"operations": {name: summarize(values) for name, values in samples.items()},
+            "peak_rss_mib": peak_rss_mib()}
+
+
+def run_size(size, iterations, seed, workdir=None):
+    """Build a corpus of ``size`` materials and benchmark it in a worker process."""
+    import pickle
+
+    from benchmarks.corpus import build
+
+    root = tempfile.mkdtemp(prefix=f"portal-bench-{size}-", dir=workdir)
+    try:
+        start = time.perf_counter()
+        corpus = build(root, size, seed=seed)
+        build_seconds = time.perf_counter() - start
+        with open(os.path.join(root, "corpus.pickle"), "wb") as f:
+            pickle.dump(corpus, f)
+        out = subprocess.run([sys.executable, "-m", "benchmarks.run", "--worker", root,
+                              "--iterations", str(iterations), "--seed", str(seed)],
+                             cwd=ROOT, check=True, stdout=subprocess.PIPE, text=True).stdout
+        result = json.loads(out)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    result.update(size=size, build_seconds=round(build_seconds, 2))
+    return result
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """``(size, operation, baseline p95, current p95)`` for every p95 that grew by more than ``threshold``."""
+    before = {(r["size"], op): stats for r in baseline["results"] for op, stats in r["operations"].items()}
+    regressions = []
+    for result in current["results"]:
+        for op, stats in result["operations"].items():
+            old = before.get((result["size"], op))
+            if old and stats["p95"] > old["p95"] * (1 + threshold):
+                regressions.append((result["size"], op, old["p95"], stats["p95"]))
+    return regressions
+
+
+def print_report(report):
+    for result in report["results"]:
+        print(f"\n{result['size']:,} materials (corpus built in {result['build_seconds']}s, "
+              f"peak RSS {result['peak_rss_mib']} MiB)")
+        print(f"  {'operation':<32}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for op, stats in result["operations"].items():
+            print(f"  {op:<32}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['p99']:>10.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the portal against synthetic corpora.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="corpus sizes, in materials")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS, help="timed calls per operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="where to build the corpora (default: the system temp dir)")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs="+", metavar="JSON",
+                        help="BASELINE [CURRENT]: report p95 regressions; without CURRENT, benchmark now")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="relative p95 growth counted as a regression (default 0.2)")
+    parser.add_argument("--worker", metavar="CORPUS", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.iterations, args.seed)))
+        return 0
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes a baseline and at most one current result file")
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[1], encoding="utf-8") as f:
+            report = json.load(f)
+    else:
+        report = {
+            "meta": {
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "seed": args.seed,
+                "iterations": args.iterations,
+            },
+            "results": [run_size(size, args.iterations, args.seed, args.workdir) for size in args.sizes],
+        }
+        print_report(report)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if not args.compare:
+        return 0
+    with open(args.compare[0], encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, report, args.threshold)
+    for size, op, old, new in regressions:
+        print(f"REGRESSION {size:,} {op}: p95 {old:.3f} ms -> {new:.3f} ms")
+    if not regressions:
+        print("No p95 regressions.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
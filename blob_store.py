@@ -0,0 +1,301 @@
+"""Content-addressed, reference-counted storage for uploaded files.
+
+Every upload is stored once under ``uploads/blobs/<aa>/<sha256><ext>`` no
+matter how many course/semester/year rows point at it. A small SQLite table
+(``blob_refs.db``) counts the metadata rows referencing each blob; deleting
+a row releases one reference and the file goes away with the last one.
+
+Existing uuid-named uploads can be folded into the store with
+
+    python blob_store.py migrate --metadata uploads_metadata.csv --db college_materials.db
+
+which rewrites the paths in both metadata stores and reports the bytes
+reclaimed from duplicate copies. Run it while the portal is stopped.
+"""
+import argparse
+import contextlib
+import os
+import sqlite3
+import threading
+import uuid
+
+from ingest import MAX_UPLOAD_BYTES, hash_file, ingest
+
+BLOB_DIR = os.path.join("uploads", "blobs")
+REFS_DB = "blob_refs.db"
+
+
+class BlobStore:
+    def __init__(self, root=BLOB_DIR, db_path=REFS_DB):
+        self.root = str(root)
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT NOT NULL,
+                    ext TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL,
+                    PRIMARY KEY (sha256, ext)
+                )
+            """)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def blob_path(self, sha256, ext):
+        return os.path.join(self.root, sha256[:2], f"{sha256}{ext.lower()}")
+
+    def is_blob(self, path):
+        root = os.path.abspath(self.root)
+        return os.path.commonpath([os.path.abspath(path), root]) == root
+
+    def _add_ref(self, conn, sha256, ext, size, staged_path):
+        """Take a reference on (sha256, ext), moving ``staged_path`` in if new.
+
+        Must run inside an IMMEDIATE transaction. Returns ``(path, is_new)``.
+        """
+        path = self.blob_path(sha256, ext)
+        row = conn.execute("SELECT refcount FROM blobs WHERE sha256=? AND ext=?", (sha256, ext)).fetchone()
+        if row and os.path.exists(path):
+            conn.execute("UPDATE blobs SET refcount=refcount+1 WHERE sha256=? AND ext=?", (sha256, ext))
+            os.unlink(staged_path)
+            return path, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staged_path, path)
+        conn.execute("INSERT OR REPLACE INTO blobs (sha256, ext, size, refcount) VALUES (?, ?, ?, ?)",
+                     (sha256, ext, size, (row[0] if row else 0) + 1))
+        return path, True
+
+    def put(self, src, ext, max_bytes=MAX_UPLOAD_BYTES, progress=None, cancelled=None):
+        """Store ``src`` (a path or binary file object) and take one reference.
+
+        The bytes are streamed through ``ingest`` into a staging file, so the
+        hash is known before the blob name is. Returns ``(path, sha256, size,
+        is_new)``; ``is_new`` is False when identical content was already
+        stored and only its reference count went up.
+        """
+        ext = ext.lower()
+        staged = ingest(src, os.path.join(self.root, f".staging-{uuid.uuid4().hex}"),
+                        max_bytes=max_bytes, progress=progress, cancelled=cancelled)
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                path, is_new = self._add_ref(conn, staged.sha256, ext, staged.size, staged.path)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                if os.path.exists(staged.path):
+                    os.unlink(staged.path)
+                raise
+        return path, staged.sha256, staged.size, is_new
+
+    def adopt(self, path):
+        """Move an existing file into the store (or drop it as a duplicate).
+
+        Returns ``(blob path, bytes reclaimed)``.
+        """
+        sha256, size = hash_file(path)
+        ext = os.path.splitext(path)[1].lower()
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                blob, is_new = self._add_ref(conn, sha256, ext, size, path)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return blob, 0 if is_new else size
+
+    def retain(self, path):
+        """Take one more reference on the existing blob at ``path``."""
+        name = os.path.basename(path)
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE blobs SET refcount=refcount+1 WHERE sha256=? AND ext=?", (name[:64], name[64:]))
+
+    def release(self, path):
+        """Drop one reference to the blob at ``path``; delete it with the last one.
+
+        Returns True if the file was removed from disk.
+        """
+        name = os.path.basename(path)
+        sha256, ext = name[:64], name[64:]
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("UPDATE blobs SET refcount=refcount-1 WHERE sha256=? AND ext=?", (sha256, ext))
+                row = conn.execute("SELECT refcount FROM blobs WHERE sha256=? AND ext=?", (sha256, ext)).fetchone()
+                freed = row is None or row[0] <= 0
+                if freed:
+                    conn.execute("DELETE FROM blobs WHERE sha256=? AND ext=?", (sha256, ext))
+                    if os.path.exists(path):
+                        os.unlink(path)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if freed:
+            _remove_empty_dirs(os.path.dirname(path), self.root)
+        return freed
+
+    def refcounts(self):
+        """``{blob path: recorded references}`` for every blob in the table."""
+        with self._connect() as conn:
+            return {self.blob_path(sha256, ext): refcount
+                    for sha256, ext, refcount in conn.execute("SELECT sha256, ext, refcount FROM blobs")}
+
+    def set_refcount(self, path, refcount):
+        """Overwrite the recorded references to the blob at ``path``; at zero the record is dropped.
+
+        For repairs (see reconcile.py): the file itself is never touched.
+        """
+        name = os.path.basename(path)
+        sha256, ext = name[:64], name[64:]
+        with self._lock, self._connect() as conn:
+            if refcount <= 0:
+                conn.execute("DELETE FROM blobs WHERE sha256=? AND ext=?", (sha256, ext))
+            else:
+                conn.execute("""
+                    INSERT INTO blobs (sha256, ext, size, refcount) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (sha256, ext) DO UPDATE SET refcount=excluded.refcount
+                """, (sha256, ext, os.path.getsize(path), refcount))
+
+    def stats(self):
+        with self._connect() as conn:
+            blobs, refs, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(refcount), 0), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {"blobs": blobs, "references": refs, "bytes": size}
+
+
+def _remove_empty_dirs(dir_path, stop):
+    stop = os.path.abspath(stop)
+    dir_path = os.path.abspath(dir_path)
+    while dir_path != stop and os.path.isdir(dir_path) and not os.listdir(dir_path):
+        os.rmdir(dir_path)
+        dir_path = os.path.dirname(dir_path)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_blob_store(root=BLOB_DIR, db_path=REFS_DB):
+    """Return the shared BlobStore for ``root``."""
+    key = os.path.abspath(root)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = BlobStore(root, db_path)
+        return store
+
+
+# ----------------------------
+# MIGRATION
+# ----------------------------
+def migrate_paths(store, paths, upload_root):
+    """Fold ``paths`` into ``store``; return ({old: new}, bytes reclaimed).
+
+    Each occurrence of a path in ``paths`` takes one reference, so pass one
+    entry per metadata row. Missing files are left out of the mapping.
+    """
+    mapping = {}
+    reclaimed = 0
+    for path in paths:
+        if store.is_blob(path):
+            continue
+        if path in mapping:
+            # Another row already moved this file; it just needs its own reference.
+            store.retain(mapping[path])
+            continue
+        if not os.path.exists(path):
+            continue
+        blob, saved = store.adopt(path)
+        mapping[path] = blob
+        reclaimed += saved
+        _remove_empty_dirs(os.path.dirname(path), upload_root)
+    return mapping, reclaimed
+
+
+def migrate_csv(store, metadata_file, upload_root):
+    from columnar import write_csv
+    from metadata_store import METADATA_COLUMNS, MetadataStore
+
+    meta = MetadataStore(metadata_file)
+    meta.compact()
+    rows = meta.load().records()
+    mapping, reclaimed = migrate_paths(store, [row["Path"] for row in rows], upload_root)
+    for row in rows:
+        row["Path"] = mapping.get(row["Path"], row["Path"])
+    tmp_path = f"{metadata_file}.tmp"
+    write_csv(tmp_path, METADATA_COLUMNS, rows)
+    os.replace(tmp_path, metadata_file)
+    return mapping, reclaimed
+
+
+def migrate_sqlite(store, db_name, upload_root):
+    conn = sqlite3.connect(db_name)
+    try:
+        rows = conn.execute("SELECT id, file_path FROM materials").fetchall()
+        # Only files inside the uploads folder are ours to move.
+        ours = [(mid, p) for mid, p in rows
+                if os.path.commonpath([os.path.abspath(p), os.path.abspath(upload_root)]) == os.path.abspath(upload_root)]
+        mapping, reclaimed = migrate_paths(store, [p for _, p in ours], upload_root)
+        with conn:
+            conn.executemany("UPDATE materials SET file_path=? WHERE id=?",
+                             [(mapping[p], mid) for mid, p in ours if p in mapping])
+    finally:
+        conn.close()
+    return mapping, reclaimed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fold existing uploads into the content-addressed store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate")
+    migrate.add_argument("--uploads", default="uploads")
+    migrate.add_argument("--metadata", help="uploads_metadata.csv used by app.py")
+    migrate.add_argument("--db", help="college_materials.db used by the Tkinter client")
+    migrate.add_argument("--index", default="search_index.db", help="full-text index to repoint")
+    sub.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    store = get_blob_store(os.path.join(args.uploads, "blobs")) if args.command == "migrate" else get_blob_store()
+    if args.command == "stats":
+        print(store.stats())
+        return
+
+    mapping, reclaimed = {}, 0
+    if args.metadata and os.path.exists(args.metadata):
+        moved, saved = migrate_csv(store, args.metadata, args.uploads)
+        mapping.update(moved)
+        reclaimed += saved
+    if args.db and os.path.exists(args.db):
+        moved, saved = migrate_sqlite(store, args.db, args.uploads)
+        mapping.update(moved)
+        reclaimed += saved
+    if mapping and os.path.exists(args.index):
+        from fulltext_index import FullTextIndex, describe_row
+        from metadata_store import MetadataStore
+
+        index = FullTextIndex(args.index)
+        for old in mapping:
+            index.remove(old)
+        metadata = {}
+        if args.metadata and os.path.exists(args.metadata):
+            metadata = {row["Path"]: describe_row(row)
+                        for row in MetadataStore(args.metadata).load().rows()}
+        index.rebuild(args.uploads, metadata)
+    print(f"Moved {len(mapping)} files into {store.root}; reclaimed {reclaimed} bytes "
+          f"({reclaimed / (1024 * 1024):.1f} MB) from duplicates. Store now holds {store.stats()}.")
+
+
+if __name__ == "__main__":
+    main()
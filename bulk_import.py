@@ -0,0 +1,259 @@
+"""Bulk import of a folder or ZIP of materials, for term-start loads.
+
+    python bulk_import.py term-start.zip --metadata uploads_metadata.csv --db college_materials.db
+
+The source mirrors the old uploads layout, ``<course>/<semester>/<year>/``,
+optionally with a ``<subject>/`` folder below the year. Subject and type
+are read from file names of the form ``<Subject>_<Type>[_anything].<ext>``
+(``Computer_Science_PYQ_2023.pdf``); with a subject folder only the type
+needs to appear in the name, and ``--default-type`` covers files where it
+does not.
+
+Files are hashed and copied into the blob store by a thread pool; then all
+metadata rows go to each target store in one batch: a single journal
+append for app.py's metadata, a single transaction for the Tkinter
+client's database. Every file gets a line in the report: imported,
+duplicate (that material already exists), or failed.
+"""
+import argparse
+import csv
+import datetime
+import os
+import sqlite3
+import sys
+import uuid
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from blob_store import BLOB_DIR, REFS_DB, get_blob_store
+from ingest import MAX_UPLOAD_BYTES
+
+MATERIAL_TYPES = ("Notes", "PYQ", "Books", "Other")
+MAX_WORKERS = 4
+UPLOADER = "Bulk import"
+
+IMPORTED = "imported"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+
+Material = namedtuple("Material", ["course", "semester", "year", "subject", "type"])
+ReportRow = namedtuple("ReportRow", ["source", "status", "detail", "path"])
+
+
+def infer_material(relpath, default_type=None):
+    """Metadata for ``relpath`` inside the import source; raises ValueError if it can't be read."""
+    parts = [p for p in relpath.replace("\\", "/").split("/") if p]
+    if len(parts) not in (4, 5):
+        raise ValueError("expected <course>/<semester>/<year>/[<subject>/]<file>")
+    course, semester, year = parts[:3]
+    words = os.path.splitext(parts[-1])[0].split("_")
+    types = {t.lower(): t for t in MATERIAL_TYPES}
+    position = next((i for i, word in enumerate(words) if word.lower() in types), None)
+    if position is not None:
+        mat_type = types[words[position].lower()]
+        subject = " ".join(words[:position])
+    elif default_type:
+        mat_type = default_type
+        subject = " ".join(words)
+    else:
+        raise ValueError(f"no type ({', '.join(MATERIAL_TYPES)}) in the file name")
+    if len(parts) == 5:
+        subject = parts[3].replace("_", " ")
+    if not subject.strip():
+        raise ValueError("no subject in the file name")
+    return Material(course, semester, year, subject.strip(), mat_type)
+
+
+def list_sources(source):
+    """Relative paths of the files to import from a directory or ZIP, skipping hidden files."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            names = [info.filename for info in zf.infolist() if not info.is_dir()]
+    else:
+        names = []
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            names.extend(os.path.relpath(os.path.join(dirpath, f), source) for f in filenames)
+    return sorted(n for n in names
+                  if not any(part.startswith(".") or part == "__MACOSX" for part in n.replace("\\", "/").split("/")))
+
+
+def _store_one(blobs, source, relpath, max_bytes):
+    """Worker: hash and copy one file into the blob store."""
+    ext = os.path.splitext(relpath)[1]
+    if os.path.isdir(source):
+        return blobs.put(os.path.join(source, relpath), ext, max_bytes=max_bytes)
+    # ZipFile objects are not shared between threads; each worker opens its own.
+    with zipfile.ZipFile(source) as zf, zf.open(relpath) as f:
+        return blobs.put(f, ext, max_bytes=max_bytes)
+
+
+def _commit_metadata(store, items, uploader):
+    """One journal append for every item not already in ``store``; returns their statuses."""
+    df = store.load()
+    existing = set(zip(df["Course"], df["Semester"], df["Year"], df["Subject"], df["Type"], df["Path"]))
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows, statuses = [], []
+    for material, path in items:
+        key = (*material, path)
+        if key in existing:
+            statuses.append(DUPLICATE)
+            continue
+        existing.add(key)
+        rows.append({
+            "Timestamp": timestamp,
+            "Course": material.course,
+            "Semester": material.semester,
+            "Year": material.year,
+            "Subject": material.subject,
+            "Type": material.type,
+            "Filename": f"{material.subject.replace(' ', '_')}_{material.type.replace(' ', '_')}_"
+                        f"{uuid.uuid4().hex}{os.path.splitext(path)[1]}",
+            "Path": path,
+            "Uploader": uploader,
+        })
+        statuses.append(IMPORTED)
+    store.append_many(rows)
+    return statuses
+
+
+def _commit_db(db, items):
+    """Insert every item not already in the Tkinter database in one transaction."""
+    uploaded_on = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    statuses = []
+    with db.transaction() as conn:
+        for material, path in items:
+            cid = db.ensure_course(conn, material.course)
+            if db.material_exists(conn, cid, *material[1:]):
+                statuses.append(DUPLICATE)
+                continue
+            try:
+                db.insert_material(conn, cid, *material[1:], path, uploaded_on)
+            except sqlite3.IntegrityError:
+                statuses.append(DUPLICATE)
+            else:
+                statuses.append(IMPORTED)
+    return statuses
+
+
+def import_materials(source, blobs, metadata_store=None, db=None, index=None, uploader=UPLOADER,
+                     default_type=None, max_workers=MAX_WORKERS, max_bytes=MAX_UPLOAD_BYTES):
+    """Import every file under ``source`` (a directory or ZIP); returns a list of ``ReportRow``.
+
+    ``metadata_store`` (a MetadataStore) and ``db`` (a portal_db.Database)
+    are the targets; give either or both. Each row written takes one
+    reference on its blob, so a file that turns out to be a duplicate
+    everywhere costs nothing.
+    """
+    targets = [(name, target) for name, target in (("metadata", metadata_store), ("db", db)) if target is not None]
+    if not targets:
+        raise ValueError("nothing to import into: pass a metadata store and/or a database")
+
+    report = {}
+    pending = []
+    for relpath in list_sources(source):
+        try:
+            pending.append((relpath, infer_material(relpath, default_type)))
+        except ValueError as e:
+            report[relpath] = ReportRow(relpath, FAILED, str(e), "")
+
+    stored = []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bulk-import") as pool:
+        futures = [(relpath, material, pool.submit(_store_one, blobs, source, relpath, max_bytes))
+                   for relpath, material in pending]
+        for relpath, material, future in futures:
+            try:
+                path, _, _, is_new = future.result()
+            except Exception as e:
+                report[relpath] = ReportRow(relpath, FAILED, str(e), "")
+            else:
+                stored.append((relpath, material, path, is_new))
+
+    items = [(material, path) for _, material, path, _ in stored]
+    outcomes = {}
+    for name, target in targets:
+        try:
+            if name == "metadata":
+                outcomes[name] = _commit_metadata(target, items, uploader)
+            else:
+                outcomes[name] = _commit_db(target, items)
+        except Exception as e:
+            outcomes[name] = [f"{FAILED} ({e})"] * len(items)
+
+    for i, (relpath, material, path, is_new) in enumerate(stored):
+        statuses = {name: outcomes[name][i] for name, _ in targets}
+        references = sum(status == IMPORTED for status in statuses.values())
+        # put() took one reference; make it one per row actually written.
+        for _ in range(references - 1):
+            blobs.retain(path)
+        if references == 0:
+            blobs.release(path)
+        elif is_new and index is not None:
+            try:
+                index.add(path, os.path.basename(relpath), " ".join(material))
+            except sqlite3.Error:
+                pass  # `python fulltext_index.py rebuild` catches it up
+        if references:
+            status = IMPORTED
+        elif all(s == DUPLICATE for s in statuses.values()):
+            status = DUPLICATE
+        else:
+            status = FAILED
+        detail = "; ".join(f"{name}: {s}" for name, s in statuses.items())
+        report[relpath] = ReportRow(relpath, status, detail, path if references else "")
+    return [report[relpath] for relpath in sorted(report)]
+
+
+def summarize(report):
+    counts = {status: 0 for status in (IMPORTED, DUPLICATE, FAILED)}
+    for row in report:
+        counts[row.status] += 1
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a folder or ZIP laid out as <course>/<semester>/<year>/.")
+    parser.add_argument("source", help="directory or .zip to import")
+    parser.add_argument("--metadata", help="uploads_metadata.csv used by app.py")
+    parser.add_argument("--db", help="college_materials.db used by the Tkinter client")
+    parser.add_argument("--uploads", default="uploads")
+    parser.add_argument("--refs", default=REFS_DB, help="blob reference database")
+    parser.add_argument("--index", default="search_index.db", help="full-text index to update")
+    parser.add_argument("--uploader", default=UPLOADER)
+    parser.add_argument("--default-type", choices=MATERIAL_TYPES,
+                        help="type for files whose name doesn't include one")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--report", help="also write the per-file report to this CSV")
+    args = parser.parse_args(argv)
+    if not (args.metadata or args.db):
+        parser.error("give --metadata and/or --db")
+
+    blobs = get_blob_store(os.path.join(args.uploads, os.path.basename(BLOB_DIR)), args.refs)
+    metadata_store = db = None
+    if args.metadata:
+        from metadata_store import get_store
+
+        metadata_store = get_store(args.metadata)
+    if args.db:
+        from portal_db import get_db
+
+        db = get_db(args.db)
+    from fulltext_index import get_index
+
+    report = import_materials(args.source, blobs, metadata_store, db, get_index(args.index),
+                              uploader=args.uploader, default_type=args.default_type, max_workers=args.workers)
+    for row in report:
+        print(f"{row.status:<10} {row.source}  {row.detail}")
+    if args.report:
+        with open(args.report, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(ReportRow._fields)
+            writer.writerows(report)
+    counts = summarize(report)
+    print(f"{counts[IMPORTED]} imported, {counts[DUPLICATE]} duplicate, {counts[FAILED]} failed.")
+    return 1 if counts[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
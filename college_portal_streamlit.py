@@ -3,14 +3,25 @@ from tkinter import ttk, filedialog, messagebox
 import sqlite3
 import os
 import datetime
-import shutil
-import uuid
 import subprocess
 import sys
 
+from blob_store import get_blob_store
+from bulk_import import import_materials, summarize
+from download_stats import get_download_stats, material_title
+from fulltext_index import get_index
+from ingest import UploadTooLarge, ingest
+from portal_db import get_db
+from task_runner import TaskRunner
+from virtual_table import PAGE_SIZE, VirtualTable, list_fetch
+
 
 DB_NAME = "college_materials.db"
 UPLOAD_FOLDER = "uploads"
+SEARCH_INDEX_DB = "search_index.db"
+DOWNLOADS_DB = "downloads.db"
+BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, "blobs")
+FULLTEXT_LIMIT = 500
 
 
 if not os.path.exists(UPLOAD_FOLDER):
@@ -18,45 +29,17 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS courses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            course_name TEXT UNIQUE
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS materials (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            course_id INTEGER,
-            semester TEXT,
-            year TEXT,
-            subject TEXT,
-            type TEXT,
-            file_path TEXT,
-            uploaded_on TEXT,
-            FOREIGN KEY(course_id) REFERENCES courses(id)
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS admins (
-            username TEXT PRIMARY KEY,
-            password TEXT
-        )
-    """)
-    c.execute("INSERT OR IGNORE INTO admins VALUES ('admin', 'admin123')")
-    c.execute("INSERT OR IGNORE INTO courses (course_name) VALUES ('BSc Physical Science with Computer Science')")
-    c.execute("INSERT OR IGNORE INTO courses (course_name) VALUES ('BCA')")
-    c.execute("INSERT OR IGNORE INTO courses (course_name) VALUES ('BCom')")
-    c.execute("INSERT OR IGNORE INTO courses (course_name) VALUES ('BA')")
-    conn.commit()
-    conn.close()
+    # Opening the shared connection applies any pending schema migrations.
+    get_db(DB_NAME)
 
 
 class CollegeApp(tk.Tk):
     def __init__(self):
         super().__init__()
+        self.db = get_db(DB_NAME)
+        # Queries and file copies run here so the window stays responsive.
+        self.tasks = TaskRunner(self)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         self.title("📚 College PYQ & Notes Portal")
         self.geometry("1000x650")
         self.configure(bg="#f8f9fa")
@@ -68,6 +51,23 @@ class CollegeApp(tk.Tk):
         self.create_student_tab()
 
 
+    def on_close(self):
+        self.tasks.shutdown()
+        self.destroy()
+
+
+    def start_progress(self, bar, cancel_button, task, total):
+        bar.configure(maximum=max(total, 1), value=0)
+        bar.grid()
+        cancel_button.configure(command=task.cancel, state="normal")
+        cancel_button.grid()
+
+
+    def stop_progress(self, bar, cancel_button):
+        bar.grid_remove()
+        cancel_button.grid_remove()
+
+
     def create_login_tab(self):
         self.login_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.login_tab, text="🧑‍💻 Admin Login")
@@ -114,15 +114,24 @@ class CollegeApp(tk.Tk):
         btn_frame = ttk.Frame(upload_frame)
         btn_frame.grid(row=3, column=0, columnspan=4, pady=15)
         ttk.Button(btn_frame, text="📂 Select File", command=self.select_file).grid(row=0, column=0, padx=10)
-        ttk.Button(btn_frame, text="⬆️ Upload File", command=self.upload_material).grid(row=0, column=1, padx=10)
+        self.upload_button = ttk.Button(btn_frame, text="⬆️ Upload File", command=self.upload_material)
+        self.upload_button.grid(row=0, column=1, padx=10)
+        ttk.Button(btn_frame, text="📦 Import ZIP", command=lambda: self.bulk_import(zip_file=True)).grid(row=0, column=2, padx=10)
+        ttk.Button(btn_frame, text="📁 Import Folder", command=lambda: self.bulk_import(zip_file=False)).grid(row=0, column=3, padx=10)
         self.file_label = ttk.Label(upload_frame, text="No file selected", foreground="gray")
         self.file_label.grid(row=4, column=0, columnspan=4)
+        self.upload_progress = ttk.Progressbar(upload_frame, length=300)
+        self.upload_progress.grid(row=5, column=0, columnspan=3, pady=5)
+        self.upload_cancel_button = ttk.Button(upload_frame, text="Cancel")
+        self.upload_cancel_button.grid(row=5, column=3)
+        self.stop_progress(self.upload_progress, self.upload_cancel_button)
 
 
         materials_frame = ttk.LabelFrame(self.admin_dashboard, text="Uploaded Materials", padding=15)
         materials_frame.pack(padx=10, pady=10, fill="both", expand=True)
         columns = ("ID","Course","Subject","Type","Semester","Year","Uploaded On","File Path")
-        self.admin_result_table = ttk.Treeview(materials_frame, columns=columns, show="headings")
+        self.admin_view = VirtualTable(materials_frame, columns, tasks=self.tasks)
+        self.admin_result_table = self.admin_view.tree
         self.admin_result_table.heading("ID", text="ID")
         self.admin_result_table.column("ID", width=0, stretch=False)
         for col in columns[1:-1]:
@@ -130,7 +139,7 @@ class CollegeApp(tk.Tk):
             self.admin_result_table.column(col, width=125)
         self.admin_result_table.heading("File Path", text="File Path")
         self.admin_result_table.column("File Path", width=0, stretch=False)
-        self.admin_result_table.pack(fill="both", expand=True, pady=10)
+        self.admin_view.pack(fill="both", expand=True, pady=10)
         ttk.Button(materials_frame, text="🗑️ Delete Selected Material", command=self.admin_delete_selected).pack(pady=5)
         self.admin_result_table.bind("<Double-1>", self.on_double_click_delete)
         self.load_admin_materials()
@@ -149,27 +158,14 @@ class CollegeApp(tk.Tk):
         if not all([course, semester, year]):
             self.upload_sub_combo["values"] = []
             return
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        c.execute("""
-            SELECT DISTINCT subject FROM materials m
-            JOIN courses c ON m.course_id=c.id
-            WHERE c.course_name=? AND m.semester=? AND m.year=?
-        """, (course, semester, year))
-        subjects = [row[0] for row in c.fetchall()]
-        conn.close()
-        self.upload_sub_combo["values"] = subjects
+        # Subjects already uploaded for this course/semester/year; new ones can still be typed in.
+        self.upload_sub_combo["values"] = list(self.db.taxonomy().options(course, semester, year))
 
 
     def verify_admin(self):
         user = self.admin_user_entry.get().strip()
         pwd = self.admin_pass_entry.get().strip()
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        c.execute("SELECT * FROM admins WHERE username=? AND password=?", (user, pwd))
-        result = c.fetchone()
-        conn.close()
-        if result:
+        if self.db.verify_admin(user, pwd):
             messagebox.showinfo("Login Successful ✅", f"Welcome, {user}!")
             self.admin_logged_in = True
             self.create_admin_dashboard()
@@ -211,67 +207,118 @@ class CollegeApp(tk.Tk):
         if not all([course, semester, year, subject, mat_type]):
             messagebox.showerror("Error", "Please fill all fields before uploading.")
             return
+        src = self.selected_file_path
+        self.upload_button.configure(state="disabled")
+        task = self.tasks.submit(self.upload_worker, src, course, semester, year, subject, mat_type,
+                                 on_done=self.upload_finished, on_error=self.upload_failed,
+                                 on_progress=lambda copied: self.upload_progress.configure(value=copied))
+        self.start_progress(self.upload_progress, self.upload_cancel_button, task, os.path.getsize(src))
+
+
+    def upload_worker(self, task, src, course, semester, year, subject, mat_type):
+        """Runs on a worker thread; returns the stored path, or None for a duplicate."""
+        with self.db.transaction() as conn:
+            cid = self.db.ensure_course(conn, course)
+            duplicate = self.db.material_exists(conn, cid, semester, year, subject, mat_type)
+        if duplicate:
+            return None
+        # Copy outside the transaction so the shared connection isn't held during I/O.
+        ext = os.path.splitext(src)[1]
+        blobs = get_blob_store(BLOB_FOLDER)
+        dest_path, _, _, is_new = blobs.put(src, ext, progress=task.progress, cancelled=task.cancelled)
+        uploaded_on = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         try:
-            conn = sqlite3.connect(DB_NAME)
-            c = conn.cursor()
-            c.execute("SELECT id FROM courses WHERE course_name=?", (course,))
-            result = c.fetchone()
-            if not result:
-                c.execute("INSERT INTO courses (course_name) VALUES (?)", (course,))
-                conn.commit()
-                c.execute("SELECT id FROM courses WHERE course_name=?", (course,))
-                result = c.fetchone()
-            cid = result[0]
-            c.execute("""
-                SELECT COUNT(*) FROM materials m JOIN courses c ON m.course_id=c.id
-                WHERE c.course_name=? AND m.semester=? AND m.year=? AND LOWER(m.subject)=? AND m.type=?
-            """, (course, semester, year, subject.lower(), mat_type))
-            count = c.fetchone()[0]
-            if count > 0:
-                messagebox.showerror("Duplicate Entry", "This material already exists.")
-                conn.close()
-                return
-            ext = os.path.splitext(self.selected_file_path)[1]
-            unique_filename = f"{uuid.uuid4()}{ext}"
-            dest_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-            shutil.copy2(self.selected_file_path, dest_path)
-            uploaded_on = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            c.execute("""
-                INSERT INTO materials (course_id, semester, year, subject, type, file_path, uploaded_on)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (cid, semester, year, subject, mat_type, dest_path, uploaded_on))
-            conn.commit()
-            conn.close()
-            messagebox.showinfo("✅ Upload Successful", f"File '{os.path.basename(dest_path)}' uploaded.")
-            self.selected_file_path = None
-            self.file_label.config(text="No file selected", foreground="gray")
-            self.upload_sub_combo.set('')
-            self.upload_type_combo.set('')
-            self.upload_course_combo["values"] = self.get_courses()
-            self.update_subjects_list()
-            self.load_admin_materials()
-            self.search_materials()
-        except Exception as e:
-            messagebox.showerror("Error", f"Something went wrong:\n{e}")
+            with self.db.transaction() as conn:
+                self.db.insert_material(conn, cid, semester, year, subject, mat_type, dest_path, uploaded_on)
+        except sqlite3.IntegrityError:
+            # Someone uploaded the same material while we were copying.
+            blobs.release(dest_path)
+            return None
+        except Exception:
+            blobs.release(dest_path)
+            raise
+        if is_new:
+            try:
+                get_index(SEARCH_INDEX_DB).add(dest_path, os.path.basename(src),
+                                               f"{course} {semester} {year} {subject} {mat_type}")
+            except sqlite3.Error:
+                pass  # the upload stands; `python fulltext_index.py rebuild` catches it up
+        return dest_path
+
+
+    def upload_finished(self, dest_path):
+        self.stop_progress(self.upload_progress, self.upload_cancel_button)
+        self.upload_button.configure(state="normal")
+        if dest_path is None:
+            messagebox.showerror("Duplicate Entry", "This material already exists.")
+            return
+        messagebox.showinfo("✅ Upload Successful", f"File '{os.path.basename(dest_path)}' uploaded.")
+        self.selected_file_path = None
+        self.file_label.config(text="No file selected", foreground="gray")
+        self.upload_sub_combo.set('')
+        self.upload_type_combo.set('')
+        self.upload_course_combo["values"] = self.get_courses()
+        self.update_subjects_list()
+        self.update_search_options()
+        self.refresh_admin_materials()
+        self.refresh_results()
+
+
+    def upload_failed(self, error):
+        self.stop_progress(self.upload_progress, self.upload_cancel_button)
+        self.upload_button.configure(state="normal")
+        if isinstance(error, InterruptedError):
+            messagebox.showinfo("Upload Cancelled", "The upload was cancelled.")
+        elif isinstance(error, UploadTooLarge):
+            messagebox.showerror("Error", str(error))
+        else:
+            messagebox.showerror("Error", f"Something went wrong:\n{error}")
+
+
+    def bulk_import(self, zip_file):
+        # Layout: <course>/<semester>/<year>/<Subject>_<Type>_....<ext>; see bulk_import.py.
+        if zip_file:
+            source = filedialog.askopenfilename(title="Select ZIP", filetypes=[("ZIP archives", "*.zip")])
+        else:
+            source = filedialog.askdirectory(title="Select Folder")
+        if not source:
+            return
+        self.tasks.submit(lambda task: import_materials(source, get_blob_store(BLOB_FOLDER), db=self.db,
+                                                        index=get_index(SEARCH_INDEX_DB)),
+                          on_done=self.bulk_import_finished,
+                          on_error=lambda e: messagebox.showerror("Error", f"Bulk import failed:\n{e}"))
+
+
+    def bulk_import_finished(self, report):
+        counts = summarize(report)
+        problems = [f"{row.status}: {row.source} ({row.detail})" for row in report if row.status != "imported"]
+        details = "\n".join(problems[:15]) + ("\n..." if len(problems) > 15 else "")
+        messagebox.showinfo("Bulk Import", f"{counts['imported']} imported, {counts['duplicate']} duplicate, "
+                                           f"{counts['failed']} failed.\n\n{details}".strip())
+        self.upload_course_combo["values"] = self.get_courses()
+        self.update_search_options()
+        self.refresh_admin_materials()
+        self.refresh_results()
 
 
     def load_admin_materials(self):
-        if not hasattr(self, 'admin_result_table'):
+        if not hasattr(self, 'admin_view'):
             return
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        c.execute("""
-            SELECT m.id, c.course_name, m.subject, m.type, m.semester, m.year, m.uploaded_on, m.file_path
-            FROM materials m
-            JOIN courses c ON m.course_id = c.id
-            ORDER BY m.uploaded_on DESC
-        """)
-        rows = c.fetchall()
-        conn.close()
-        for item in self.admin_result_table.get_children():
-            self.admin_result_table.delete(item)
-        for row in rows:
-            self.admin_result_table.insert("", tk.END, values=row)
+        self.tasks.submit(lambda task: self.fetch_admin_materials(limit=self.admin_view.page_size),
+                          on_done=lambda rows: self.admin_view.load(self.fetch_admin_materials, rows),
+                          channel="admin")
+
+
+    def refresh_admin_materials(self):
+        if not hasattr(self, 'admin_view'):
+            return
+        self.tasks.submit(lambda task: self.admin_view.read_window(), on_done=self.admin_view.refresh,
+                          channel="admin")
+
+
+    def fetch_admin_materials(self, after=None, before=None, limit=PAGE_SIZE):
+        # Keyed by (uploaded_on, id), the admin table's sort order.
+        return [((row[6], row[0]), row) for row in self.db.admin_materials_page(after, before, limit)]
 
 
     def on_double_click_delete(self, event):
@@ -289,32 +336,35 @@ class CollegeApp(tk.Tk):
             messagebox.showerror("Error", "Select a material to delete.")
             return
         material_id = self.admin_result_table.item(selected[0])["values"][0]
-        try:
-            file_path = self.admin_result_table.item(selected[0])["values"][-1]
-            # Only delete from uploads folder, never original user locations
-            if os.path.commonpath([os.path.abspath(file_path), os.path.abspath(UPLOAD_FOLDER)]) == os.path.abspath(UPLOAD_FOLDER):
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            conn = sqlite3.connect(DB_NAME)
-            c = conn.cursor()
-            c.execute("DELETE FROM materials WHERE id=?", (material_id,))
-            conn.commit()
-            conn.close()
-            self.admin_result_table.delete(selected[0])
-            messagebox.showinfo("Deleted", "Material deleted from the application.")
-            self.search_materials()
-            self.load_admin_materials()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to delete: {e}")
+        file_path = self.admin_result_table.item(selected[0])["values"][-1]
+        self.tasks.submit(self.delete_worker, material_id, file_path,
+                          on_done=lambda _: self.delete_finished(selected[0]),
+                          on_error=lambda e: messagebox.showerror("Error", f"Failed to delete: {e}"))
+
+
+    def delete_worker(self, task, material_id, file_path):
+        self.db.delete_material(material_id)
+        blobs = get_blob_store(BLOB_FOLDER)
+        if blobs.is_blob(file_path):
+            # Other materials may share the same content; the blob goes with the last one.
+            if blobs.release(file_path):
+                get_index(SEARCH_INDEX_DB).remove(file_path)
+        # Only delete from uploads folder, never original user locations
+        elif os.path.commonpath([os.path.abspath(file_path), os.path.abspath(UPLOAD_FOLDER)]) == os.path.abspath(UPLOAD_FOLDER):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            get_index(SEARCH_INDEX_DB).remove(file_path)
+
+
+    def delete_finished(self, item):
+        self.admin_view.remove(item)
+        messagebox.showinfo("Deleted", "Material deleted from the application.")
+        self.update_search_options()
+        self.refresh_results()
 
 
     def get_courses(self):
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        c.execute("SELECT course_name FROM courses")
-        courses = [row[0] for row in c.fetchall()]
-        conn.close()
-        return courses
+        return self.db.get_courses()
 
 
     def create_student_tab(self):
@@ -324,13 +374,13 @@ class CollegeApp(tk.Tk):
         filter_frame = ttk.Frame(student_tab)
         filter_frame.pack(pady=5)
         ttk.Label(filter_frame, text="Course:").grid(row=0, column=0, padx=5)
-        self.search_course_combo = ttk.Combobox(filter_frame, values=self.get_courses(), width=25, state="readonly")
+        self.search_course_combo = ttk.Combobox(filter_frame, width=25, state="readonly")
         self.search_course_combo.grid(row=0, column=1)
         ttk.Label(filter_frame, text="Semester:").grid(row=0, column=2, padx=5)
-        self.search_sem_combo = ttk.Combobox(filter_frame, values=["1st","2nd","3rd","4th","5th","6th","7th","8th"], width=10, state="readonly")
+        self.search_sem_combo = ttk.Combobox(filter_frame, width=10, state="readonly")
         self.search_sem_combo.grid(row=0, column=3)
         ttk.Label(filter_frame, text="Year:").grid(row=0, column=4, padx=5)
-        self.search_year_combo = ttk.Combobox(filter_frame, values=["2022","2023","2024","2025","2026"], width=15, state="readonly")
+        self.search_year_combo = ttk.Combobox(filter_frame, width=15, state="readonly")
         self.search_year_combo.grid(row=0, column=5)
         ttk.Label(filter_frame, text="Type:").grid(row=0, column=6, padx=5)
         self.filter_type_combo = ttk.Combobox(filter_frame, values=["All","Notes","PYQ","Other"], width=10, state="readonly")
@@ -340,51 +390,54 @@ class CollegeApp(tk.Tk):
         # Changed from Entry to Combobox, state readonly
         self.subject_search_combo = ttk.Combobox(filter_frame, width=30, state="readonly")
         self.subject_search_combo.grid(row=1, column=1, columnspan=3, padx=5)
+        ttk.Label(filter_frame, text="Search Text:").grid(row=2, column=0, padx=5, pady=5)
+        self.text_search_entry = ttk.Entry(filter_frame, width=33)
+        self.text_search_entry.grid(row=2, column=1, columnspan=3, padx=5)
+        self.text_search_entry.bind("<Return>", lambda event: self.search_materials())
         ttk.Button(filter_frame, text="🔍 Search", command=self.search_materials).grid(row=1, column=4, padx=5)
 
-        # Bind changes to update subjects dynamically
-        self.search_course_combo.bind("<<ComboboxSelected>>", self.update_student_subjects)
-        self.search_sem_combo.bind("<<ComboboxSelected>>", self.update_student_subjects)
-        self.search_year_combo.bind("<<ComboboxSelected>>", self.update_student_subjects)
+        # Each choice narrows the dropdowns below it to combinations that have material
+        self.search_course_combo.bind("<<ComboboxSelected>>", self.update_search_options)
+        self.search_sem_combo.bind("<<ComboboxSelected>>", self.update_search_options)
+        self.search_year_combo.bind("<<ComboboxSelected>>", self.update_search_options)
+        self.update_search_options()
 
         table_frame = ttk.Frame(student_tab)
         table_frame.pack(pady=15, fill="both", expand=True)
         columns = ("Subject","Type","Semester","Year","File Path","Uploaded On")
-        self.result_table = ttk.Treeview(table_frame, columns=columns, show="headings")
+        self.result_view = VirtualTable(table_frame, columns, tasks=self.tasks)
+        self.result_table = self.result_view.tree
         for col in columns:
             self.result_table.heading(col, text=col)
             self.result_table.column(col, width=140)
-        self.result_table.pack(fill="both", expand=True)
+        self.result_view.pack(fill="both", expand=True)
 
         # Buttons frame with Download and View buttons only (Open button removed)
         button_frame = ttk.Frame(student_tab)
         button_frame.pack(pady=10)
         ttk.Button(button_frame, text="⬇️ Download Selected File", command=self.download_selected_file).grid(row=0, column=0, padx=5)
         ttk.Button(button_frame, text="👁️ View Selected File", command=self.view_selected_file).grid(row=0, column=1, padx=5)
+        self.download_progress = ttk.Progressbar(button_frame, length=300)
+        self.download_progress.grid(row=1, column=0, columnspan=2, pady=5)
+        self.download_cancel_button = ttk.Button(button_frame, text="Cancel")
+        self.download_cancel_button.grid(row=1, column=2)
+        self.stop_progress(self.download_progress, self.download_cancel_button)
 
         # Load all materials by default
         self.search_materials()
 
 
-    def update_student_subjects(self, event=None):
-        course = self.search_course_combo.get().strip()
-        semester = self.search_sem_combo.get().strip()
-        year = self.search_year_combo.get().strip()
-        if not all([course, semester, year]):
-            self.subject_search_combo["values"] = []
-            self.subject_search_combo.set('')
-            return
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        c.execute("""
-            SELECT DISTINCT subject FROM materials m
-            JOIN courses c ON m.course_id=c.id
-            WHERE c.course_name=? AND m.semester=? AND m.year=?
-        """, (course, semester, year))
-        subjects = [row[0] for row in c.fetchall()]
-        conn.close()
-        self.subject_search_combo["values"] = subjects
-        self.subject_search_combo.set('')
+    def update_search_options(self, event=None):
+        """Fill the student dropdowns from the taxonomy, clearing choices that no longer have material."""
+        taxonomy = self.db.taxonomy()
+        selected = []
+        for combo in (self.search_course_combo, self.search_sem_combo, self.search_year_combo,
+                      self.subject_search_combo):
+            options = list(taxonomy.options(*selected))
+            combo["values"] = options
+            if combo.get().strip() not in options:
+                combo.set('')
+            selected.append(combo.get().strip())
 
 
     def search_materials(self):
@@ -392,38 +445,42 @@ class CollegeApp(tk.Tk):
         semester = self.search_sem_combo.get().strip()
         year = self.search_year_combo.get().strip()
         mat_type = self.filter_type_combo.get().strip()
-        subject = self.subject_search_combo.get().strip().lower()  # changed here to combobox value
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        query = """
-            SELECT m.subject, m.type, m.semester, m.year, m.file_path, m.uploaded_on
-            FROM materials m
-            JOIN courses c2 ON m.course_id = c2.id
-            WHERE 1=1
-        """
-        params = []
-        if course:
-            query += " AND c2.course_name LIKE ?"
-            params.append(f"%{course}%")
-        if semester:
-            query += " AND m.semester LIKE ?"
-            params.append(f"%{semester}%")
-        if year:
-            query += " AND m.year LIKE ?"
-            params.append(f"%{year}%")
-        if mat_type and mat_type != "All":
-            query += " AND m.type=?"
-            params.append(mat_type)
-        if subject:
-            query += " AND LOWER(m.subject) LIKE ?"
-            params.append(f"%{subject}%")
-        c.execute(query, params)
-        rows = c.fetchall()
-        conn.close()
-        for item in self.result_table.get_children():
-            self.result_table.delete(item)
-        for row in rows:
-            self.result_table.insert("", tk.END, values=row)
+        subject = self.subject_search_combo.get().strip()  # changed here to combobox value
+        text = self.text_search_entry.get().strip()
+        filters = (course, semester, year, mat_type, subject)
+        if text:
+            fetch = list_fetch(lambda: self.ranked_materials(filters, text))
+        else:
+            def fetch(after=None, before=None, limit=PAGE_SIZE):
+                rows = self.db.search_materials_page(*filters, after=after, before=before, limit=limit)
+                return [(row[0], row[1:]) for row in rows]
+        # A newer search on the "results" channel supersedes this one.
+        self.tasks.submit(lambda task: fetch(limit=self.result_view.page_size),
+                          on_done=lambda rows: self.result_view.load(fetch, rows),
+                          on_error=lambda e: messagebox.showerror("Error", f"Search failed:\n{e}"),
+                          channel="results")
+
+
+    def refresh_results(self):
+        self.tasks.submit(lambda task: self.result_view.read_window(), on_done=self.result_view.refresh,
+                          channel="results")
+
+
+    def ranked_materials(self, filters, text):
+        # Restrict to files whose contents match, best BM25 match first.
+        course, semester, year, mat_type, subject = filters
+        if course or semester or year or subject or mat_type not in ("", "All"):
+            # Search only the filtered materials, so the limit can't cut them off first.
+            rows = self.db.search_materials(*filters)
+            hits = get_index(SEARCH_INDEX_DB).search(text, limit=FULLTEXT_LIMIT, paths=[row[5] for row in rows])
+            rank = {path: i for i, (path, _, _) in enumerate(hits)}
+            rows = [row for row in rows if row[5] in rank]
+        else:
+            hits = get_index(SEARCH_INDEX_DB).search(text, limit=FULLTEXT_LIMIT)
+            rank = {path: i for i, (path, _, _) in enumerate(hits)}
+            rows = self.db.search_materials(*filters, paths=list(rank))
+        rows.sort(key=lambda row: rank[row[5]])
+        return [(row[0], row[1:]) for row in rows]
 
 
     def download_selected_file(self):
@@ -435,16 +492,43 @@ class CollegeApp(tk.Tk):
         if not os.path.exists(file_path):
             messagebox.showerror("Error", "File not found on the server.")
             return
+        subject, mat_type, semester, year = self.result_table.item(selected[0])["values"][:4]
+        # Stored files are named by content hash; offer a readable name instead.
+        suggested = f"{subject}_{mat_type}_{semester}_{year}{os.path.splitext(file_path)[1]}".replace(" ", "_")
         dest = filedialog.asksaveasfilename(
-            initialfile=os.path.basename(file_path),
+            initialfile=suggested,
             title="Save File As"
         )
         if dest:
-            try:
-                shutil.copy2(file_path, dest)
-                messagebox.showinfo("Downloaded", f"File saved to: {dest}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to download file:\n{e}")
+            task = self.tasks.submit(self.download_worker, selected[0], file_path, dest,
+                                     on_done=self.download_finished, on_error=self.download_failed,
+                                     on_progress=lambda copied: self.download_progress.configure(value=copied))
+            self.start_progress(self.download_progress, self.download_cancel_button, task, os.path.getsize(file_path))
+
+
+    def download_worker(self, task, material_id, file_path, dest):
+        # Copied through a temporary file, so a cancelled download leaves nothing behind.
+        path = ingest(file_path, dest, max_bytes=None, progress=task.progress, cancelled=task.cancelled).path
+        material = self.db.material(material_id)
+        if material is not None:
+            _, course, subject, mat_type, semester, year = material[:6]
+            # Buffered; written to downloads.db in the background.
+            get_download_stats(DOWNLOADS_DB).record(f"db:{material_id}", course, semester,
+                                                    material_title(subject, mat_type, year))
+        return path
+
+
+    def download_finished(self, dest):
+        self.stop_progress(self.download_progress, self.download_cancel_button)
+        messagebox.showinfo("Downloaded", f"File saved to: {dest}")
+
+
+    def download_failed(self, error):
+        self.stop_progress(self.download_progress, self.download_cancel_button)
+        if isinstance(error, InterruptedError):
+            messagebox.showinfo("Download Cancelled", "The download was cancelled.")
+        else:
+            messagebox.showerror("Error", f"Failed to download file:\n{error}")
 
 
     def view_selected_file(self):
@@ -0,0 +1,281 @@
+"""Compact, pandas-free table for the uploads metadata.
+
+Course, Semester, Year, Subject, Type and Uploader each have a handful of
+distinct values spread over thousands of rows. Those columns are
+dictionary-encoded: every distinct value is stored once, interned, and each
+row holds a 4-byte code in an ``array``. Filename, Path and Timestamp are
+unique per row and stay plain lists of strings.
+
+A ``Frame`` is a read-only view of a ``Table``: an ``array`` of row ids in
+display order, plus any extra columns computed for it (such as full-text
+snippets). Filtering, sorting and slicing return new frames and never copy
+column data. ``Row`` objects (``__slots__``, no per-row dict) are only made
+for the rows that are actually rendered.
+
+The table only grows. Rows are never changed in place, so a frame handed
+to a reader stays valid while new rows are appended behind it.
+"""
+import csv
+import itertools
+import sys
+from array import array
+
+READ_CHUNK = 4096
+
+
+class DictColumn:
+    """A dictionary-encoded string column."""
+
+    __slots__ = ("values", "codes", "_codes_by_value")
+
+    def __init__(self):
+        self.values = []
+        self.codes = array("I")
+        self._codes_by_value = {}
+
+    def append(self, value):
+        code = self._codes_by_value.get(value)
+        if code is None:
+            value = sys.intern(value)
+            code = self._codes_by_value[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def extend(self, values):
+        index = self._codes_by_value
+        for value in set(values).difference(index):
+            value = sys.intern(value)
+            index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.extend(map(index.__getitem__, values))
+
+    def __getitem__(self, row_id):
+        return self.values[self.codes[row_id]]
+
+    def take(self, ids):
+        values, codes = self.values, self.codes
+        return [values[codes[i]] for i in ids]
+
+    def matching(self, ids, predicate):
+        """Ids whose value satisfies ``predicate``, testing each distinct value once."""
+        hits = {code for code, value in enumerate(self.values) if predicate(value)}
+        codes = self.codes
+        return array("I", (i for i in ids if codes[i] in hits))
+
+    def nbytes(self):
+        return (self.codes.itemsize * len(self.codes) + sys.getsizeof(self.values)
+                + sum(sys.getsizeof(v) for v in self.values))
+
+
+class PlainColumn:
+    """A column of mostly unique strings."""
+
+    __slots__ = ("values",)
+
+    def __init__(self):
+        self.values = []
+
+    def append(self, value):
+        self.values.append(value)
+
+    def extend(self, values):
+        self.values.extend(values)
+
+    def __getitem__(self, row_id):
+        return self.values[row_id]
+
+    def take(self, ids):
+        values = self.values
+        return [values[i] for i in ids]
+
+    def matching(self, ids, predicate):
+        values = self.values
+        return array("I", (i for i in ids if predicate(values[i])))
+
+    def nbytes(self):
+        return sys.getsizeof(self.values) + sum(sys.getsizeof(v) for v in self.values)
+
+
+class Table:
+    def __init__(self, columns, encoded=()):
+        self.columns = list(columns)
+        self.data = {col: DictColumn() if col in encoded else PlainColumn() for col in self.columns}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, values):
+        """Add a row given as values in column order; returns its row id."""
+        for col, value in zip(self.columns, values):
+            self.data[col].append(value)
+        self._size += 1
+        return self._size - 1
+
+    def row(self, row_id):
+        return Row(self, row_id)
+
+    def frame(self):
+        """A frame over every row, in insertion order."""
+        return Frame(self, array("I", range(self._size)))
+
+    def nbytes(self):
+        """Approximate memory held by the column data."""
+        return sum(column.nbytes() for column in self.data.values())
+
+
+class Row:
+    """One row, read through to the table; indexable by column name like a dict."""
+
+    __slots__ = ("table", "row_id", "extra")
+
+    def __init__(self, table, row_id, extra=None):
+        self.table = table
+        self.row_id = row_id
+        self.extra = extra
+
+    def __getitem__(self, col):
+        if self.extra and col in self.extra:
+            return self.extra[col]
+        return self.table.data[col][self.row_id]
+
+    def get(self, col, default=None):
+        try:
+            return self[col]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.table.columns + list(self.extra or ())
+
+    def to_dict(self):
+        return {col: self[col] for col in self.keys()}
+
+
+class Frame:
+    """An ordered selection of a table's rows."""
+
+    __slots__ = ("table", "ids", "extra")
+
+    def __init__(self, table, ids, extra=None):
+        self.table = table
+        self.ids = ids
+        self.extra = extra or {}  # column name -> list aligned with ids
+
+    @property
+    def columns(self):
+        return self.table.columns + list(self.extra)
+
+    @property
+    def empty(self):
+        return not self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, col):
+        """The values of ``col``, in frame order, as a list."""
+        if col in self.extra:
+            return list(self.extra[col])
+        return self.table.data[col].take(self.ids)
+
+    def _at(self, positions):
+        positions = list(positions)
+        ids = array("I", (self.ids[p] for p in positions))
+        extra = {col: [values[p] for p in positions] for col, values in self.extra.items()}
+        return Frame(self.table, ids, extra)
+
+    def select(self, row_ids):
+        """The rows with the given table row ids (e.g. from a FacetIndex), in that order."""
+        if self.extra:
+            position = {row_id: p for p, row_id in enumerate(self.ids)}
+            return self._at(position[row_id] for row_id in row_ids)
+        return Frame(self.table, array("I", row_ids))
+
+    def filter(self, col, predicate):
+        """Rows whose ``col`` value satisfies ``predicate``."""
+        if col in self.extra:
+            return self._at(p for p, value in enumerate(self.extra[col]) if predicate(value))
+        ids = self.table.data[col].matching(self.ids, predicate)
+        if not self.extra:
+            return Frame(self.table, ids)
+        keep = set(ids)
+        return self._at(p for p, row_id in enumerate(self.ids) if row_id in keep)
+
+    def sort(self, col, ascending=True, key=None):
+        """A stable sort on ``col`` (optionally through ``key``)."""
+        values = self[col]
+        if key is not None:
+            values = [key(v) for v in values]
+        return self._at(sorted(range(len(values)), key=values.__getitem__, reverse=not ascending))
+
+    def slice(self, start, stop=None):
+        stop = len(self.ids) if stop is None else stop
+        return Frame(self.table, self.ids[start:stop],
+                     {col: values[start:stop] for col, values in self.extra.items()})
+
+    def assign(self, col, values):
+        """A frame with an extra column ``col``, given as values in frame order."""
+        return Frame(self.table, self.ids, {**self.extra, col: list(values)})
+
+    def rows(self):
+        extra_cols = list(self.extra.items())
+        for p, row_id in enumerate(self.ids):
+            yield Row(self.table, row_id, {col: values[p] for col, values in extra_cols} or None)
+
+    def to_dict(self, columns=None):
+        """``{column: values}``, the shape ``st.dataframe`` takes."""
+        return {col: self[col] for col in (columns or self.columns)}
+
+    def records(self):
+        return [row.to_dict() for row in self.rows()]
+
+    def to_table(self):
+        """A new ``Table`` holding only this frame's rows, in frame order; extra columns are dropped."""
+        source = self.table
+        encoded = [col for col in source.columns if isinstance(source.data[col], DictColumn)]
+        table = Table(source.columns, encoded)
+        for col in table.columns:
+            table.data[col].extend(source.data[col].take(self.ids))
+        table._size = len(self.ids)
+        return table
+
+    def nbytes(self):
+        """Memory held by this view itself; the table's columns are shared and not counted."""
+        size = sys.getsizeof(self.ids)
+        for values in self.extra.values():
+            size += sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values)
+        return size
+
+
+def read_csv(path, columns, encoded=()):
+    """Parse a CSV with a header row into a ``Table`` with ``columns``.
+
+    Every value is kept as a string; a column missing from the file is
+    filled with "" and extra columns in the file are ignored.
+    """
+    table = Table(columns, encoded)
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        width = len(header)
+        positions = [(col, header.index(col) if col in header else None) for col in columns]
+        while True:
+            # Filled a column at a time, which lets the encoded ones map values
+            # to codes in bulk; chunks keep the parsed rows from piling up.
+            records = [r if len(r) >= width else r + [""] * (width - len(r))
+                       for r in itertools.islice(reader, READ_CHUNK) if r]
+            if not records:
+                break
+            for col, p in positions:
+                table.data[col].extend([r[p] for r in records] if p is not None else [""] * len(records))
+            table._size += len(records)
+    return table
+
+
+def write_csv(path, columns, rows):
+    """Write ``rows`` (mappings or Rows) as a CSV with a header row."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows([row[col] for col in columns] for row in rows)
@@ -0,0 +1,267 @@
+"""Per-material download counts and a time-decayed "trending" ranking.
+
+The front ends call ``record`` once per download:
+- app.py's download buttons
+- file_server.py for signed links
+- the Tkinter client's Download button
+
+``record`` only adds to an in-memory buffer. A background thread flushes
+the buffer every ``FLUSH_INTERVAL`` seconds, or as soon as ``FLUSH_BATCH``
+downloads are pending, in one transaction. A download therefore never
+waits on a write; a crash loses at most one interval's counts.
+
+Trending scores decay with a half-life of ``HALF_LIFE_DAYS``: a download
+from a week ago counts a quarter as much as one today. A score is stored
+in units of a fixed epoch. A download at time ``t`` adds
+``2 ** ((t - epoch) / half_life)``. Every score decays by the same factor,
+so the ranking only changes when downloads arrive and nothing is
+rewritten as time passes. The current value is the stored one times
+``2 ** (-(now - epoch) / half_life)``. Before the exponent gets large the
+epoch moves forward and all scores are rescaled in a single UPDATE.
+
+The top ``TOP_K`` materials of every (course, semester) group, including
+"All" in either position, are kept in memory. Each flush updates them in
+place. Scores never fall in epoch units, so a material outside a top list
+can only re-enter it through one of its own downloads. ``PRAGMA
+data_version`` tells when another process has flushed; the lists are
+reloaded then.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+DOWNLOADS_DB = "downloads.db"
+FLUSH_INTERVAL = 5.0
+FLUSH_BATCH = 500
+TOP_K = 10
+HALF_LIFE_DAYS = 3.5
+# Scores stay below 2 ** MAX_EXPONENT before the epoch is moved.
+MAX_EXPONENT = 256
+ANY = "All"
+
+Trending = namedtuple("Trending", ["material", "title", "course", "semester", "downloads", "score"])
+
+
+def material_title(subject, mat_type, year):
+    """The title trending lists show for a material, e.g. "Maths PYQ 2023"."""
+    return " ".join(str(v) for v in (subject, mat_type, year) if v)
+
+
+class DownloadStats:
+    def __init__(self, db_path=DOWNLOADS_DB, flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH,
+                 top_k=TOP_K, half_life_days=HALF_LIFE_DAYS):
+        self.db_path = str(db_path)
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.top_k = top_k
+        self.half_life = half_life_days * 86400
+        self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    material TEXT PRIMARY KEY,
+                    course TEXT NOT NULL,
+                    semester TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    score REAL NOT NULL,
+                    last_download REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_downloads_score ON downloads (course, semester, score)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+            self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('epoch', ?)", (time.time(),))
+        self._db_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._pending = {}  # material -> [course, semester, title, count, sum of 2 ** ((t - base) / half_life)]
+        self._pending_count = 0
+        self._base = time.time()
+        self._wake = threading.Event()
+        self._thread = None
+        self._top = None  # (course, semester) -> [(score, material)], best first
+        self._rows = {}  # material -> Trending (stored score) for everything in a top list
+        self._epoch = None
+        self._version = None
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+
+    # ----------------------------
+    # RECORDING
+    # ----------------------------
+    def record(self, material, course, semester, title, now=None):
+        """Count one download of ``material``; returns at once, the write happens later."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._pending.get(material)
+            if entry is None:
+                entry = self._pending[material] = [course, semester, title, 0, 0.0]
+            entry[3] += 1
+            entry[4] += 2 ** ((now - self._base) / self.half_life)
+            self._pending_count += 1
+            self.recorded += 1
+            full = self._pending_count >= self.flush_batch
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="download-stats", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # the counts stay pending and go out with the next flush
+
+    def flush(self):
+        """Write every pending count in one transaction; returns how many downloads went out."""
+        with self._lock:
+            pending, base = self._pending, self._base
+            if not pending:
+                return 0
+            self._pending, self._pending_count, self._base = {}, 0, time.time()
+        try:
+            with self._db_lock:
+                self._write(pending, base)
+        except BaseException:
+            with self._lock:
+                self._merge_back(pending, base)
+            raise
+        count = sum(entry[3] for entry in pending.values())
+        with self._lock:
+            self.flushed += count
+            self.flushes += 1
+        return count
+
+    def _merge_back(self, pending, base):
+        shift = 2 ** ((base - self._base) / self.half_life)
+        for material, (course, semester, title, count, weight) in pending.items():
+            entry = self._pending.get(material)
+            if entry is None:
+                entry = self._pending[material] = [course, semester, title, 0, 0.0]
+            entry[3] += count
+            entry[4] += weight * shift
+            self._pending_count += count
+
+    def _write(self, pending, base):
+        conn = self.conn
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            epoch = self._read_epoch()
+            if (time.time() - epoch) / self.half_life > MAX_EXPONENT:
+                epoch = self._rebase(epoch)
+            if version != self._version or epoch != self._epoch:
+                self._top = None  # another process flushed, or the scale moved: reload on next read
+            shift = 2 ** ((base - epoch) / self.half_life)
+            now = time.time()
+            conn.executemany("""
+                INSERT INTO downloads (material, course, semester, title, total, score, last_download)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (material) DO UPDATE SET
+                    course=excluded.course, semester=excluded.semester, title=excluded.title,
+                    total=total + excluded.total, score=score + excluded.score,
+                    last_download=excluded.last_download
+            """, [(material, course, semester, title, count, weight * shift, now)
+                  for material, (course, semester, title, count, weight) in pending.items()])
+            if self._top is not None:
+                placeholders = ",".join("?" * len(pending))
+                rows = conn.execute(f"""
+                    SELECT material, title, course, semester, total, score FROM downloads
+                    WHERE material IN ({placeholders})
+                """, list(pending)).fetchall()
+                for row in rows:
+                    self._offer(Trending(*row))
+        # Our own commit leaves data_version as it was, so the lists stay valid.
+
+    def _read_epoch(self):
+        return self.conn.execute("SELECT value FROM meta WHERE key='epoch'").fetchone()[0]
+
+    def _rebase(self, epoch):
+        new_epoch = time.time()
+        self.conn.execute("UPDATE downloads SET score = score * ?",
+                          (2 ** ((epoch - new_epoch) / self.half_life),))
+        self.conn.execute("UPDATE meta SET value=? WHERE key='epoch'", (new_epoch,))
+        return new_epoch
+
+    # ----------------------------
+    # TOP-K
+    # ----------------------------
+    def _groups(self, course, semester):
+        return ((course, semester), (course, ANY), (ANY, semester), (ANY, ANY))
+
+    def _offer(self, row):
+        """Put ``row`` (with its new stored score) into the top lists of its groups, if it ranks."""
+        ranked = False
+        for group in self._groups(row.course, row.semester):
+            top = self._top.setdefault(group, [])
+            top[:] = [entry for entry in top if entry[1] != row.material]
+            if len(top) < self.top_k or row.score > top[-1][0]:
+                top.append((row.score, row.material))
+                top.sort(reverse=True)
+                del top[self.top_k:]
+                ranked = True
+        if ranked:
+            self._rows[row.material] = row
+
+    def _load(self):
+        """Rebuild the top lists from the table: the best ``top_k`` of every (course, semester).
+
+        The best of a wider group ("All" semesters, say) are among the best
+        of the groups it is made of, so those are all the rows needed.
+        """
+        self._top, self._rows = {}, {}
+        self._epoch = self._read_epoch()
+        rows = self.conn.execute("""
+            SELECT material, title, course, semester, total, score FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY course, semester ORDER BY score DESC) AS rank
+                FROM downloads
+            ) WHERE rank <= ?
+        """, (self.top_k,)).fetchall()
+        for row in rows:
+            self._offer(Trending(*row))
+        self._version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def trending(self, course=ANY, semester=ANY, k=None, now=None):
+        """The most downloaded materials lately, best first, as ``Trending`` rows.
+
+        ``score`` is the decayed download count as of ``now``. "All" or an
+        empty value matches any course or semester.
+        """
+        course = course or ANY
+        semester = semester or ANY
+        now = time.time() if now is None else now
+        with self._db_lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._top is None or version != self._version:
+                self._load()
+            top = self._top.get((course, semester), [])[:k or self.top_k]
+            decay = 2 ** ((self._epoch - now) / self.half_life)
+            return [self._rows[material]._replace(score=score * decay) for score, material in top]
+
+    def stats(self):
+        with self._lock:
+            return {"recorded": self.recorded, "flushed": self.flushed, "flushes": self.flushes,
+                    "pending": self._pending_count}
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_download_stats(db_path=DOWNLOADS_DB):
+    """Return the process-wide DownloadStats for ``db_path``."""
+    key = os.path.abspath(db_path)
+    with _stats_lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = DownloadStats(db_path)
+        return stats
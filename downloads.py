@@ -0,0 +1,311 @@
+"""On-demand file payloads for Streamlit download buttons.
+
+Handing ``st.download_button`` an open file or bytes makes every rerun read
+and ship every listed file. Passing ``lazy_file(path)`` instead defers all
+I/O until the user actually clicks that one button. Streamlit still holds
+the clicked file in memory while serving it; the signed links of
+file_server.py are the path that streams large files from disk.
+
+``lazy_bundle(entries)`` does the same for a whole result set as one ZIP.
+The archive is produced by ``iter_zip`` one chunk at a time (already-
+compressed formats are stored rather than deflated) and teed into a
+``BundleCache`` on disk, so popular bundles are built only once. Streamlit
+holds the finished archive in memory, so app.py offers it only up to
+``MAX_INLINE_BUNDLE_FILES`` files and ``MAX_INLINE_BUNDLE_BYTES``. With a
+file server, ``BundleCache.build`` writes the archive to disk instead and
+file_server.py streams it from there.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+BUNDLE_DIR = os.path.join("uploads", ".bundles")
+MAX_BUNDLE_CACHE_BYTES = int(os.environ.get("PORTAL_BUNDLE_CACHE_MB", "1024")) * 1024 * 1024
+# Largest bundle handed to st.download_button, which buffers it in the server's memory.
+MAX_INLINE_BUNDLE_BYTES = int(os.environ.get("PORTAL_INLINE_BUNDLE_MB", "200")) * 1024 * 1024
+MAX_INLINE_BUNDLE_FILES = 500
+# Deflating these gains next to nothing and costs CPU on every bundle.
+STORED_EXTENSIONS = {".pdf", ".zip", ".gz", ".rar", ".7z", ".jpg", ".jpeg", ".png", ".gif", ".webp",
+                     ".mp3", ".mp4", ".docx", ".pptx", ".xlsx", ".odt", ".epub"}
+
+
+class ChunkedFileReader(io.RawIOBase):
+    """Read-only raw stream over a file that opens lazily and reads in chunks."""
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._f = None
+        self._eof = False
+        self.name = str(path)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if self._eof:
+            return 0
+        if self._f is None:
+            self._f = open(self.path, "rb", buffering=0)
+        n = self._f.readinto(memoryview(b)[:self.chunk_size])
+        if not n:
+            # Release the descriptor as soon as the file is exhausted.
+            self._eof = True
+            self._f.close()
+            self._f = None
+        return n or 0
+
+    def readall(self):
+        chunks = []
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        super().close()
+
+
+def iter_file_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yield the contents of ``path`` in chunks of at most ``chunk_size`` bytes."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def lazy_file(path, on_open=None):
+    """Return a zero-argument callable for ``st.download_button(data=...)``.
+
+    Nothing is opened or read until Streamlit invokes the callable, which it
+    only does when the user clicks the button; ``on_open()``, if given, is
+    called then too. Streamlit buffers the whole file at that point.
+    """
+    def _open():
+        data = Path(path).read_bytes()
+        if on_open is not None:
+            on_open()
+        return data
+    return _open
+
+
+class _ChunkSink:
+    """Write-only, unseekable target for ZipFile that hands back what was written."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def bundle_size(entries):
+    """``(files, bytes)`` of the files a ZIP of ``entries`` would hold; missing files are left out."""
+    files = size = 0
+    for _, path in entries:
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            continue
+        files += 1
+    return files, size
+
+
+def iter_zip(entries, chunk_size=CHUNK_SIZE):
+    """Yield a ZIP archive of ``entries`` (``(arcname, path)`` pairs) piece by piece.
+
+    Each file is read in chunks, so memory use stays around one chunk no
+    matter how large the archive gets. Missing files are skipped.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w") as zf:
+        for arcname, path in entries:
+            if not os.path.isfile(path):
+                continue
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            stored = os.path.splitext(path)[1].lower() in STORED_EXTENSIONS
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, zf.open(info, "w") as dest:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+class _TeeReader(io.RawIOBase):
+    """Raw stream over ``iter_zip`` that also writes what it yields to the cache.
+
+    The copy is renamed into place only once the archive is complete; a
+    reader closed early leaves nothing behind.
+    """
+
+    def __init__(self, chunks, cache_path, on_complete=None):
+        self._chunks = chunks
+        self._cache_path = cache_path
+        self._on_complete = on_complete
+        self._buffer = b""
+        fd, self._tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), prefix=".", suffix=".part")
+        self._tmp = os.fdopen(fd, "wb")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        while not self._buffer and self._chunks is not None:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._finish()
+            else:
+                self._tmp.write(chunk)
+                self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def readall(self):
+        chunks = [self._buffer]
+        self._buffer = b""
+        if self._chunks is not None:
+            for chunk in self._chunks:
+                self._tmp.write(chunk)
+                chunks.append(chunk)
+            self._finish()
+        return b"".join(chunks)
+
+    def _finish(self):
+        self._chunks = None
+        self._tmp.close()
+        os.chmod(self._tmp_path, 0o644)
+        os.replace(self._tmp_path, self._cache_path)
+        if self._on_complete is not None:
+            self._on_complete()
+
+    def close(self):
+        if self._chunks is not None:
+            self._chunks.close()
+            self._chunks = None
+            self._tmp.close()
+            os.unlink(self._tmp_path)
+        super().close()
+
+
+class BundleCache:
+    """Finished ZIP bundles on disk, evicted least-recently-used past ``max_bytes``.
+
+    A bundle is keyed by its ``(arcname, path)`` entries. Stored files are
+    named by content hash, so the key changes exactly when a metadata change
+    alters what the bundle would contain.
+    """
+
+    def __init__(self, root=BUNDLE_DIR, max_bytes=MAX_BUNDLE_CACHE_BYTES):
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def key(entries):
+        digest = hashlib.sha256()
+        for arcname, path in entries:
+            digest.update(f"{arcname}\0{os.fspath(path)}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def path_for(self, entries):
+        return os.path.join(self.root, f"{self.key(entries)}.zip")
+
+    def open(self, entries, chunk_size=CHUNK_SIZE):
+        """Return a readable raw stream of the bundle for ``entries``."""
+        entries = list(entries)
+        path = self.path_for(entries)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return _TeeReader(iter_zip(entries, chunk_size), path, on_complete=self.evict)
+        self.hits += 1
+        return ChunkedFileReader(path, chunk_size)
+
+    def build(self, entries, chunk_size=CHUNK_SIZE):
+        """Write the bundle for ``entries`` to the cache unless it is there already; returns its path."""
+        entries = list(entries)
+        path = self.path_for(entries)
+        try:
+            os.utime(path)
+            self.hits += 1
+            return path
+        except FileNotFoundError:
+            self.misses += 1
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter_zip(entries, chunk_size):
+                    f.write(chunk)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+        return path
+
+    def evict(self):
+        """Delete the least recently used bundles until the cache fits in ``max_bytes``."""
+        with self._lock:
+            bundles = []
+            for entry in os.scandir(self.root):
+                if entry.name.endswith(".zip") and entry.is_file():
+                    st = entry.stat()
+                    bundles.append((st.st_mtime_ns, st.st_size, entry.path))
+            total = sum(size for _, size, _ in bundles)
+            for _, size, path in sorted(bundles):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self):
+        sizes = [e.stat().st_size for e in os.scandir(self.root) if e.name.endswith(".zip")]
+        return {"bundles": len(sizes), "bytes": sum(sizes), "hits": self.hits, "misses": self.misses}
+
+
+def lazy_bundle(cache, entries, chunk_size=CHUNK_SIZE):
+    """Like ``lazy_file``, for a ZIP of ``entries`` served through ``cache``."""
+    entries = list(entries)
+
+    def _open():
+        return cache.open(entries, chunk_size)
+    return _open
@@ -0,0 +1,153 @@
+"""Bitmap index over the categorical metadata columns.
+
+Every distinct value of every facet column owns one bitset, stored as a
+Python int whose bit ``i`` is set when row ``i`` has that value. A filter
+combination is then answered by AND-ing a handful of ints, and the live
+count for a dropdown option is a single popcount, instead of a boolean mask
+scan over the whole table per filter per rerun.
+
+Indexes are copy-on-write: ``with_changes`` returns a new index sharing the
+untouched bitsets, so a reader holding an older index never sees it change.
+"""
+import sys
+from array import array
+
+FACET_COLUMNS = ["Course", "Semester", "Year", "Subject", "Type"]
+ANY = "All"
+
+
+class FacetIndex:
+    def __init__(self, columns=FACET_COLUMNS):
+        self.columns = list(columns)
+        self.bitmaps = {col: {} for col in self.columns}
+        self.all = 0
+
+    @classmethod
+    def build(cls, rows, columns=FACET_COLUMNS):
+        """Build an index from ``(row_id, row)`` pairs.
+
+        Bits are set in byte buffers and converted to ints once per value,
+        which keeps a full build linear in the number of rows.
+        """
+        index = cls(columns)
+        buffers = {col: {} for col in index.columns}
+        all_ids = []
+        for row_id, row in rows:
+            all_ids.append(row_id)
+            for col in index.columns:
+                buffers[col].setdefault(row[col], []).append(row_id)
+        size = (max(all_ids) // 8 + 1) if all_ids else 0
+        index.all = _ids_to_bits(all_ids, size)
+        for col, values in buffers.items():
+            index.bitmaps[col] = {value: _ids_to_bits(ids, size) for value, ids in values.items()}
+        return index
+
+    @classmethod
+    def build_encoded(cls, size, columns):
+        """Build an index over rows ``0..size-1`` of dictionary-encoded columns.
+
+        ``columns`` maps each facet column to ``(codes, values)``, row ``i``
+        holding ``values[codes[i]]``. Row ids are grouped by code, so no
+        per-row mapping is built.
+        """
+        index = cls(list(columns))
+        nbytes = (size - 1) // 8 + 1 if size else 0
+        index.all = _ids_to_bits(range(size), nbytes)
+        for col, (codes, values) in columns.items():
+            buckets = [[] for _ in values]
+            for row_id, code in enumerate(codes):
+                buckets[code].append(row_id)
+            index.bitmaps[col] = {values[code]: _ids_to_bits(ids, nbytes) for code, ids in enumerate(buckets) if ids}
+        return index
+
+    def with_changes(self, added=(), removed=()):
+        """Return a new index with ``(row_id, row)`` pairs added and removed."""
+        index = FacetIndex.__new__(FacetIndex)
+        index.columns = self.columns
+        index.bitmaps = {col: dict(values) for col, values in self.bitmaps.items()}
+        index.all = self.all
+        index._remove(removed)
+        index._add(added)
+        return index
+
+    def _add(self, rows):
+        for row_id, row in rows:
+            bit = 1 << row_id
+            self.all |= bit
+            for col in self.columns:
+                values = self.bitmaps[col]
+                value = row[col]
+                values[value] = values.get(value, 0) | bit
+
+    def _remove(self, rows):
+        for row_id, row in rows:
+            bit = 1 << row_id
+            self.all &= ~bit
+            for col in self.columns:
+                values = self.bitmaps[col]
+                value = row[col]
+                remaining = values.get(value, 0) & ~bit
+                if remaining:
+                    values[value] = remaining
+                else:
+                    values.pop(value, None)
+
+    def mask(self, filters, skip=None):
+        """Return the bitset of rows matching ``filters`` ({column: value}).
+
+        Columns whose value is ``"All"``/empty, and the column ``skip``, do
+        not constrain the result.
+        """
+        result = self.all
+        for col, value in filters.items():
+            if col == skip or value in (None, "", ANY):
+                continue
+            result &= self.bitmaps[col].get(value, 0)
+            if not result:
+                break
+        return result
+
+    def query(self, filters):
+        """Return the ids of rows matching ``filters`` in ascending order."""
+        return bits_to_ids(self.mask(filters))
+
+    def count(self, filters):
+        return self.mask(filters).bit_count()
+
+    def facet_counts(self, column, filters):
+        """Return {value: matches} for ``column`` given the other filters.
+
+        The column's own selection is ignored, so every option shows how many
+        rows it would return if picked next to the current selection.
+        """
+        others = self.mask(filters, skip=column)
+        return {value: (bits & others).bit_count() for value, bits in self.bitmaps[column].items()}
+
+    def values(self, column):
+        return list(self.bitmaps[column])
+
+
+def _ids_to_bits(ids, size):
+    buf = bytearray(size)
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def bits_to_ids(bits):
+    """Return the positions of the set bits in ``bits`` in ascending order."""
+    if not bits:
+        return []
+    nwords = (bits.bit_length() + 63) // 64
+    # Little-endian bytes put the low word first; swap each word into native order where that differs.
+    words = array("Q", bits.to_bytes(nwords * 8, "little"))
+    if sys.byteorder == "big":
+        words.byteswap()
+    ids = []
+    for i, word in enumerate(words):
+        base = i * 64
+        while word:
+            low = word & -word
+            ids.append(base + low.bit_length() - 1)
+            word ^= low
+    return ids
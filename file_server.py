@@ -0,0 +1,284 @@
+"""Companion HTTP server for uploaded files.
+
+``st.download_button`` pushes every byte through the Streamlit websocket
+and Python memory. With this server running, app.py links downloads to it
+instead:
+
+    python file_server.py --root uploads --port 8502
+    PORTAL_FILE_SERVER_URL=http://localhost:8502 streamlit run app.py
+
+Files are sent with ``socket.sendfile`` (zero-copy ``os.sendfile`` where
+the platform has it). The server sends ETag and Last-Modified and answers
+conditional requests with 304. Single byte ranges get 206, so interrupted
+downloads resume. Only URLs signed by the portal are served: the path,
+expiry time and download name are covered by an HMAC under a secret the
+two processes share, taken from ``PORTAL_FILE_SECRET`` or generated once
+into ``.file_server_secret``.
+
+Completed downloads of uploaded materials are counted in ``downloads.db``
+(see download_stats.py), like the ones app.py serves itself. Only
+responses carrying the whole file count, so range probes and resumed
+transfers don't add to the total.
+"""
+import argparse
+import email.utils
+import hashlib
+import hmac
+import mimetypes
+import os
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HOST = "127.0.0.1"
+PORT = 8502
+SECRET_FILE = ".file_server_secret"
+URL_TTL = 3600
+SHA256_HEX_LEN = 64
+
+
+def load_secret(path=SECRET_FILE):
+    """The signing key: ``PORTAL_FILE_SECRET``, else the key file (created on first use)."""
+    env = os.environ.get("PORTAL_FILE_SECRET")
+    if env:
+        return env.encode("utf-8")
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, "rb") as f:
+            return f.read().strip()
+    key = os.urandom(32).hex().encode("ascii")
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+_secrets = {}
+_secrets_lock = threading.Lock()
+
+
+def get_secret(path=SECRET_FILE):
+    """The signing key, read once per process."""
+    key = os.path.abspath(path)
+    with _secrets_lock:
+        secret = _secrets.get(key)
+        if secret is None:
+            secret = _secrets[key] = load_secret(path)
+        return secret
+
+
+def sign(secret, relpath, expires, name=""):
+    message = f"{relpath}\n{expires}\n{name}".encode("utf-8")
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()
+
+
+def signed_url(base_url, root, path, filename=None, ttl=URL_TTL, secret=None):
+    """Link to ``path`` (inside ``root``) on the file server, valid for at least ``ttl`` seconds.
+
+    The expiry is rounded up to a multiple of ``ttl`` so the URL stays the
+    same across reruns and browsers can reuse their cached copy.
+    """
+    secret = secret if secret is not None else get_secret()
+    relpath = os.path.relpath(path, root).replace(os.sep, "/")
+    expires = (int(time.time()) // ttl + 2) * ttl
+    name = filename or ""
+    query = {"expires": expires, "sig": sign(secret, relpath, expires, name)}
+    if name:
+        query["name"] = name
+    return f"{base_url.rstrip('/')}/{urllib.parse.quote(relpath)}?{urllib.parse.urlencode(query)}"
+
+
+def parse_range(header, size):
+    """``(start, end)`` (inclusive) for a single-range ``Range`` header.
+
+    Returns None when the header should be ignored (absent, malformed or
+    multi-range, which are answered with the whole file) and raises
+    ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, sep, last = header[len("bytes="):].strip().partition("-")
+    if not sep or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def etag_for(path, st):
+    """Blobs are named by their SHA-256, which makes a strong ETag; other files use size and mtime."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if len(stem) == SHA256_HEX_LEN and all(c in "0123456789abcdef" for c in stem):
+        return f'"{stem}"'
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+class FileRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "PortalFiles/1.0"
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _serve(self, send_body):
+        url = urllib.parse.urlsplit(self.path)
+        relpath = urllib.parse.unquote(url.path).lstrip("/")
+        query = dict(urllib.parse.parse_qsl(url.query))
+        expires = query.get("expires", "")
+        name = query.get("name", "")
+        expected = sign(self.server.secret, relpath, expires, name)
+        if not hmac.compare_digest(query.get("sig", ""), expected):
+            self.send_error(403, "Invalid signature")
+            return
+        if not expires.isdigit() or int(expires) < time.time():
+            self.send_error(403, "Link expired")
+            return
+        path = self._resolve(relpath)
+        if path is None:
+            self.send_error(404, "File not found")
+            return
+
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            etag = etag_for(path, st)
+            last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+            if self._not_modified(etag, st):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                return
+
+            byte_range = None
+            if_range = self.headers.get("If-Range")
+            if if_range is None or if_range.strip() in (etag, last_modified):
+                try:
+                    byte_range = parse_range(self.headers.get("Range"), st.st_size)
+                except ValueError:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{st.st_size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+            start, end = byte_range if byte_range else (0, st.st_size - 1)
+            length = end - start + 1
+
+            self.send_response(206 if byte_range else 200)
+            self.send_header("Content-Type", mimetypes.guess_type(name or path)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Cache-Control", "private, max-age=3600")
+            if byte_range:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{st.st_size}")
+            if name:
+                self.send_header("Content-Disposition",
+                                 f"attachment; filename*=UTF-8''{urllib.parse.quote(name)}")
+            self.end_headers()
+            if send_body and length > 0:
+                try:
+                    self.connection.sendfile(f, start, length)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                    return
+            # Only a response carrying the whole file is a download; range probes and resumes are not.
+            if send_body and length == st.st_size and name and self.server.on_download is not None:
+                self.server.on_download(name)
+
+    def _resolve(self, relpath):
+        """Absolute path of ``relpath`` if it is a regular file inside the root."""
+        root = self.server.root
+        path = os.path.realpath(os.path.join(root, relpath))
+        if os.path.commonpath([path, root]) != root or not os.path.isfile(path):
+            return None
+        return path
+
+    def _not_modified(self, etag, st):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(st.st_mtime) <= since
+        return False
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(root="uploads", host=HOST, port=PORT, secret=None, quiet=False, on_download=None):
+    """A ready-to-run server for ``root``; call ``serve_forever()`` on it.
+
+    ``on_download(name)`` is called after a file has been sent from its
+    first byte under the download name ``name``.
+    """
+    server = ThreadingHTTPServer((host, port), FileRequestHandler)
+    server.daemon_threads = True
+    server.root = os.path.realpath(root)
+    server.secret = secret if secret is not None else load_secret()
+    server.quiet = quiet
+    server.on_download = on_download
+    return server
+
+
+def download_counter(metadata_path, downloads_path):
+    """An ``on_download`` that counts uploaded materials, looked up by file name, in ``downloads_path``."""
+    from download_stats import get_download_stats, material_title
+    from metadata_store import get_store
+
+    store = get_store(metadata_path)
+    stats = get_download_stats(downloads_path)
+
+    def on_download(name):
+        row = store.find(name)
+        if row is not None:  # bundles and files not in the metadata aren't materials
+            stats.record(row["Filename"], row["Course"], row["Semester"],
+                         material_title(row["Subject"], row["Type"], row["Year"]))
+    return on_download
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve uploads/ to holders of signed links from the portal.")
+    parser.add_argument("--root", default="uploads")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--quiet", action="store_true", help="don't log requests")
+    parser.add_argument("--sign", metavar="PATH", help="print a signed URL for PATH and exit")
+    parser.add_argument("--metadata", default="uploads_metadata.csv", help="app.py's metadata, to name counted downloads")
+    parser.add_argument("--downloads", default="downloads.db", help="where download counts are kept")
+    args = parser.parse_args(argv)
+
+    if args.sign:
+        print(signed_url(f"http://{args.host}:{args.port}", args.root, args.sign))
+        return
+    on_download = download_counter(args.metadata, args.downloads) if os.path.exists(args.metadata) else None
+    server = make_server(args.root, args.host, args.port, quiet=args.quiet, on_download=on_download)
+    print(f"Serving {server.root} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Full-text index over the contents of uploaded files.
+
+Text is extracted from each upload and stored in an SQLite FTS5 table, so
+students can search for what is *inside* a paper ("laplace transform 2023")
+rather than only by the course/semester/year/subject dropdowns. Results are
+ranked with FTS5's BM25 and a trailing ``*`` on a word makes it a prefix
+query (``lapl*``).
+
+Both front ends keep the index up to date on upload and delete. To index an
+existing tree in one go:
+
+    python fulltext_index.py rebuild --root uploads --metadata uploads_metadata.csv
+    python fulltext_index.py search "laplace transform"
+"""
+import argparse
+import contextlib
+import os
+import re
+import sqlite3
+import threading
+import zipfile
+import zlib
+
+INDEX_DB = "search_index.db"
+MAX_TEXT_CHARS = 2_000_000
+TEXT_EXTENSIONS = {".txt", ".md", ".csv", ".tex", ".html", ".htm"}
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+
+# ----------------------------
+# TEXT EXTRACTION
+# ----------------------------
+_PDF_STREAM = re.compile(rb"<<(.*?)>>\s*stream\r?\n(.*?)\r?\nendstream", re.S)
+_PDF_TEXT_OP = re.compile(rb"\[(.*?)\]\s*TJ|\((.*?)(?<!\\)\)\s*Tj", re.S)
+_PDF_ARRAY_ITEM = re.compile(rb"\((.*?)(?<!\\)\)|(-?\d+(?:\.\d+)?)", re.S)
+
+
+def _pdf_text_fallback(data):
+    """Pull literal strings out of a PDF's text operators without pypdf.
+
+    Only handles FlateDecode/uncompressed content streams with plain string
+    operands, which covers most generated PDFs; scanned pages have no text.
+    """
+    parts = []
+    for header, stream in _PDF_STREAM.findall(data):
+        if b"FlateDecode" in header:
+            try:
+                stream = zlib.decompress(stream)
+            except zlib.error:
+                continue
+        elif b"Filter" in header:
+            continue
+        for array_op, string_op in _PDF_TEXT_OP.findall(stream):
+            if not array_op:
+                parts.append(string_op.decode("latin-1"))
+                continue
+            # In a TJ array a large negative kerning adjustment is a word gap.
+            text = b""
+            for string, kerning in _PDF_ARRAY_ITEM.findall(array_op):
+                text += b" " if kerning and float(kerning) <= -200 else string
+            parts.append(text.decode("latin-1"))
+    return " ".join(parts)
+
+
+def extract_text(path):
+    """Return the searchable text of ``path``, or "" if it has none we can read."""
+    ext = os.path.splitext(str(path))[1].lower()
+    try:
+        if ext in TEXT_EXTENSIONS:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                return f.read(MAX_TEXT_CHARS)
+        if ext == ".pdf":
+            if PdfReader is not None:
+                reader = PdfReader(path)
+                return "\n".join(page.extract_text() or "" for page in reader.pages)[:MAX_TEXT_CHARS]
+            with open(path, "rb") as f:
+                return _pdf_text_fallback(f.read())[:MAX_TEXT_CHARS]
+        if ext in (".docx", ".pptx"):
+            with zipfile.ZipFile(path) as z:
+                xml = " ".join(z.read(name).decode("utf-8", "ignore") for name in z.namelist()
+                               if name.endswith(".xml") and ("word/document" in name or "ppt/slides/slide" in name))
+            return re.sub(r"<[^>]+>", " ", xml)[:MAX_TEXT_CHARS]
+    except Exception:
+        return ""
+    return ""
+
+
+def _describe(path):
+    """Fallback metadata text derived from the upload's folder layout."""
+    return " ".join(part.replace("_", " ") for part in os.path.normpath(str(path)).split(os.sep)[1:-1])
+
+
+# ----------------------------
+# INDEX
+# ----------------------------
+def to_match_query(text):
+    """Turn free text into an FTS5 MATCH expression.
+
+    Every word must match; ``word*`` becomes a prefix query. Anything that
+    is not a word character is dropped so user input can't break the query.
+    """
+    terms = []
+    for word, star in re.findall(r"(\w+)(\*?)", text):
+        terms.append(f'"{word}"{star}')
+    return " ".join(terms)
+
+
+class FullTextIndex:
+    def __init__(self, db_path=INDEX_DB):
+        self.db_path = str(db_path)
+        self._write_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE,
+                    size INTEGER,
+                    mtime_ns INTEGER
+                )
+            """)
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                    title, meta, body, tokenize='porter unicode61'
+                )
+            """)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, path, title=None, meta=None, force=False):
+        """Index (or re-index) one file. Returns False if it was already current.
+
+        Text is extracted before the write lock is taken, so a slow PDF does
+        not hold up other writers; if the file changes meanwhile it is read
+        again.
+        """
+        path = str(path)
+        title = title if title is not None else os.path.basename(path)
+        meta = meta if meta is not None else _describe(path)
+        while True:
+            st = os.stat(path)
+            stamp = (st.st_size, st.st_mtime_ns)
+            if not force:
+                with self._connect() as conn:
+                    row = conn.execute("SELECT size, mtime_ns FROM documents WHERE path=?", (path,)).fetchone()
+                if row == stamp:
+                    return False
+            body = extract_text(path)
+            with self._write_lock, self._connect() as conn:
+                st = os.stat(path)
+                if (st.st_size, st.st_mtime_ns) != stamp:
+                    continue
+                row = conn.execute("SELECT id, size, mtime_ns FROM documents WHERE path=?", (path,)).fetchone()
+                if row and not force and row[1:] == stamp:
+                    return False  # indexed by someone else while we extracted
+                if row:
+                    doc_id = row[0]
+                    conn.execute("UPDATE documents SET size=?, mtime_ns=? WHERE id=?", (*stamp, doc_id))
+                    conn.execute("DELETE FROM documents_fts WHERE rowid=?", (doc_id,))
+                else:
+                    doc_id = conn.execute("INSERT INTO documents (path, size, mtime_ns) VALUES (?, ?, ?)",
+                                          (path, *stamp)).lastrowid
+                conn.execute("INSERT INTO documents_fts (rowid, title, meta, body) VALUES (?, ?, ?, ?)",
+                             (doc_id, title, meta, body))
+                return True
+
+    def remove(self, path):
+        with self._write_lock, self._connect() as conn:
+            row = conn.execute("SELECT id FROM documents WHERE path=?", (str(path),)).fetchone()
+            if row:
+                conn.execute("DELETE FROM documents_fts WHERE rowid=?", (row[0],))
+                conn.execute("DELETE FROM documents WHERE id=?", (row[0],))
+
+    def search(self, text, limit=100, paths=None):
+        """Return ``[(path, score, snippet)]`` best match first (lower score is better).
+
+        ``paths``, if given, restricts the search to those files before the
+        ``limit`` is applied, so a narrow filter still gets its best matches.
+        """
+        match = to_match_query(text)
+        if not match:
+            return []
+        restrict = ""
+        with self._connect() as conn:
+            if paths is not None:
+                conn.execute("CREATE TEMP TABLE search_paths (path TEXT PRIMARY KEY)")
+                conn.executemany("INSERT OR IGNORE INTO search_paths VALUES (?)", ((p,) for p in paths))
+                restrict = "AND d.path IN (SELECT path FROM temp.search_paths)"
+            return conn.execute(f"""
+                SELECT d.path, bm25(documents_fts, 5.0, 2.0, 1.0) AS score,
+                       snippet(documents_fts, 2, '**', '**', ' … ', 12)
+                FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid
+                WHERE documents_fts MATCH ? {restrict}
+                ORDER BY score
+                LIMIT ?
+            """, (match, limit)).fetchall()
+
+    def rebuild(self, root, metadata=None):
+        """Bring the index in line with every file under ``root``.
+
+        Unchanged files are skipped, changed ones re-extracted, and entries
+        for files that no longer exist removed. ``metadata`` optionally maps
+        a path to its ``(title, meta)`` text.
+        """
+        metadata = metadata or {}
+        stats = {"indexed": 0, "unchanged": 0, "removed": 0, "failed": 0}
+        seen = set()
+        for dirpath, dirnames, filenames in os.walk(root):
+            # Skip cached bundles (.bundles) and set-aside files (.orphaned).
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if name.startswith("."):
+                    continue  # in-flight uploads
+                path = os.path.join(dirpath, name)
+                seen.add(path)
+                title, meta = metadata.get(path, (None, None))
+                try:
+                    stats["indexed" if self.add(path, title, meta) else "unchanged"] += 1
+                except OSError:
+                    stats["failed"] += 1
+        with self._connect() as conn:
+            known = [row[0] for row in conn.execute("SELECT path FROM documents")]
+        for path in known:
+            if path not in seen and not os.path.exists(path):
+                self.remove(path)
+                stats["removed"] += 1
+        return stats
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(db_path=INDEX_DB):
+    """Return the shared FullTextIndex for ``db_path``."""
+    key = os.path.abspath(db_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = FullTextIndex(db_path)
+        return index
+
+
+def describe_row(row):
+    """``(title, meta)`` text for an uploads_metadata.csv row."""
+    return row["Filename"], " ".join(row[col] for col in ("Course", "Semester", "Year", "Subject", "Type"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the full-text index of uploaded files.")
+    parser.add_argument("--db", default=INDEX_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="index every file under --root")
+    rebuild.add_argument("--root", default="uploads")
+    rebuild.add_argument("--metadata", help="uploads_metadata.csv to take titles and facets from")
+    search = sub.add_parser("search", help="run a query against the index")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    index = FullTextIndex(args.db)
+    if args.command == "rebuild":
+        metadata = {}
+        if args.metadata:
+            # Through the store, so rows still in the journal are included.
+            from metadata_store import get_store
+            metadata = {row["Path"]: describe_row(row) for row in get_store(args.metadata).load().rows()}
+        print(index.rebuild(args.root, metadata))
+    else:
+        for path, score, snippet in index.search(args.query, args.limit):
+            print(f"{score:8.3f}  {path}\n          {snippet}")
+
+
+if __name__ == "__main__":
+    main()
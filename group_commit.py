@@ -0,0 +1,126 @@
+"""Single-writer group commit for the portal's shared files.
+
+Every Streamlit session runs in its own thread, so concurrent uploads,
+deletes, suggestions and subject additions used to race each other through
+unlocked read-modify-write cycles. A ``GroupCommitWriter`` owns one writer
+thread per process: callers put their mutation on a queue and block, the
+writer drains whatever has queued up, applies the whole batch under an
+exclusive file lock (which also serializes other processes) with a single
+flush/fsync or transaction, and then wakes every caller in the batch.
+
+Under load the batches grow on their own, so the per-write cost of the
+lock and fsync is shared by everyone waiting instead of paid N times.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MAX_BATCH = 256
+
+
+class FileLock:
+    """Exclusive advisory lock on ``path`` that also works across processes."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        else:
+            self._f.seek(0)
+            msvcrt.locking(self._f.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+            else:
+                self._f.seek(0)
+                msvcrt.locking(self._f.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._f.close()
+            self._f = None
+
+
+class GroupCommitWriter:
+    """Applies queued mutations in batches on one background thread.
+
+    ``apply_batch(payloads)`` is called on the writer thread with the file
+    lock held and must return one result per payload; its return means the
+    batch is durable. If it raises, every caller in the batch gets the
+    exception. ``after_batch()``, if given, runs after callers are woken and
+    outside the lock, for housekeeping such as compaction.
+    """
+
+    def __init__(self, apply_batch, lock_path, name="group-commit", max_batch=MAX_BATCH, after_batch=None):
+        self.apply_batch = apply_batch
+        self.lock_path = lock_path
+        self.max_batch = max_batch
+        self.after_batch = after_batch
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit_async(self, payload):
+        """Queue ``payload`` and return a Future resolved once it is durable."""
+        future = Future()
+        self._queue.put((payload, future))
+        return future
+
+    def submit(self, payload, timeout=None):
+        """Queue ``payload`` and block until its batch is durable."""
+        return self.submit_async(payload).result(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            payloads = [payload for payload, _ in batch]
+            try:
+                with FileLock(self.lock_path):
+                    results = self.apply_batch(payloads)
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            if self.after_batch is not None:
+                try:
+                    self.after_batch()
+                except Exception:
+                    pass  # housekeeping is retried after the next batch
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+
+def lock_path_for(path):
+    """Lock file used to serialize writers of ``path`` across processes."""
+    return f"{os.fspath(path)}.lock"
@@ -0,0 +1,95 @@
+"""Shared upload ingestion for both front ends.
+
+Uploads are copied in fixed-size chunks into a temporary file next to their
+destination while the SHA-256 and byte count are computed on the fly, then
+renamed into place atomically. Peak memory per upload is one chunk however
+large the file is, a half-written file is never visible under its final
+name, and anything over the size limit is rejected before it fills the disk.
+"""
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("PORTAL_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+# A bulk-import ZIP holds many materials, so it gets a larger cap of its own.
+BULK_MAX_BYTES = int(os.environ.get("PORTAL_MAX_BULK_MB", "2048")) * 1024 * 1024
+
+IngestResult = namedtuple("IngestResult", ["path", "sha256", "size"])
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, max_bytes):
+        super().__init__(f"File is larger than the {max_bytes // (1024 * 1024)} MB upload limit.")
+        self.max_bytes = max_bytes
+
+
+def _open_source(src):
+    """Return ``(file object, should_close)`` for a path or a binary file object."""
+    if hasattr(src, "read"):
+        if hasattr(src, "seek"):
+            src.seek(0)
+        return src, False
+    return open(src, "rb"), True
+
+
+def ingest(src, dest_path, max_bytes=MAX_UPLOAD_BYTES, chunk_size=CHUNK_SIZE, progress=None, cancelled=None):
+    """Copy ``src`` (a path or binary file object) to ``dest_path``.
+
+    ``progress(bytes_copied)`` is called after every chunk; if ``cancelled()``
+    returns true the copy stops and ``InterruptedError`` is raised. Raises
+    ``UploadTooLarge`` once more than ``max_bytes`` have been read. On any
+    error the temporary file is removed and ``dest_path`` is left untouched.
+    """
+    dest_path = os.fspath(dest_path)
+    dest_dir = os.path.dirname(dest_path) or "."
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix=".", suffix=".part")
+    digest = hashlib.sha256()
+    size = 0
+    f_in, should_close = _open_source(src)
+    try:
+        with os.fdopen(fd, "wb") as f_out:
+            while True:
+                chunk = f_in.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                if cancelled is not None and cancelled():
+                    raise InterruptedError("Upload cancelled.")
+                digest.update(chunk)
+                f_out.write(chunk)
+                if progress is not None:
+                    progress(size)
+            f_out.flush()
+            os.fsync(f_out.fileno())
+        # mkstemp creates the file owner-only; give it normal upload permissions.
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    finally:
+        if should_close:
+            f_in.close()
+    return IngestResult(dest_path, digest.hexdigest(), size)
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    """Return ``(sha256 hex digest, size)`` of the file at ``path``."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            digest.update(chunk)
+    return digest.hexdigest(), size
@@ -0,0 +1,340 @@
+"""Process-wide store for the uploads metadata CSV used by app.py.
+
+Streamlit re-executes app.py on every widget interaction, but imported
+modules stay loaded, so anything kept here is shared by every session
+served by the same process.
+
+Writes never rewrite the CSV. Each insert or delete is appended as one line
+to a journal next to it (``uploads_metadata.journal``); readers fold the
+journal over the CSV snapshot. Appends go through a ``GroupCommitWriter``,
+so concurrent sessions share one locked write and fsync per batch, and once
+the journal grows past ``COMPACT_THRESHOLD`` records the writer thread folds
+it into a fresh snapshot and truncates it.
+
+The rows live in a dictionary-encoded ``columnar.Table`` rather than a
+DataFrame, so neither importing the store nor holding the metadata needs
+pandas. Readers get a ``columnar.Frame`` of the live rows. Alongside it the
+store keeps a ``FacetIndex`` whose row ids are the table's row ids and a
+``Taxonomy`` of the course/semester/year/subject combinations, both updated
+on every folded insert and delete.
+"""
+import csv
+import io
+import os
+import threading
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from columnar import Frame, Table, read_csv, write_csv
+from facet_index import FACET_COLUMNS, FacetIndex
+from group_commit import FileLock, GroupCommitWriter, lock_path_for
+from taxonomy import TAXONOMY_LEVELS, Taxonomy
+
+METADATA_COLUMNS = ["Timestamp", "Course", "Semester", "Year", "Subject", "Type", "Filename", "Path", "Uploader"]
+KEY_COLUMN = "Filename"
+# Small vocabularies, stored once per distinct value.
+ENCODED_COLUMNS = ["Course", "Semester", "Year", "Subject", "Type", "Uploader"]
+
+OP_INSERT = "+"
+OP_DELETE = "-"
+COMPACT_THRESHOLD = 500
+
+
+def _encode(record):
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow(record)
+    return buf.getvalue().encode("utf-8")
+
+
+def _taxonomy_of(table):
+    """The ``Taxonomy`` of every row in ``table``, counted on the encoded columns' codes."""
+    columns = [table.data[col] for col in TAXONOMY_LEVELS]
+    counts = Counter(zip(*(column.codes for column in columns)))
+    return Taxonomy.build((tuple(column.values[code] for column, code in zip(columns, codes)), n)
+                          for codes, n in counts.items())
+
+
+def _taxonomy_path(row):
+    return tuple(row[col] for col in TAXONOMY_LEVELS)
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class MetadataStore:
+    """Caches the folded metadata and re-reads only what changed on disk.
+
+    The snapshot CSV is re-parsed only when its (mtime, size) changes; when
+    only the journal grew, just the new journal lines are read and folded
+    into the cached table. The returned frames are read-only views shared
+    across sessions.
+    """
+
+    def __init__(self, path, compact_threshold=COMPACT_THRESHOLD):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix(".journal")
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._table = None
+        self._frame = None
+        self._facets = None
+        self._taxonomy = None
+        self._row_ids = {}  # Filename -> table row id, for live rows
+        self._snapshot_stamp = None
+        self._journal_stamp = None
+        self._journal_offset = 0
+        self._journal_records = 0
+        self._writer = GroupCommitWriter(self._append_lines, lock_path_for(self.journal_path),
+                                         name="metadata-writer", after_batch=self._maybe_compact)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.compactions = 0
+
+    # ----------------------------
+    # READING
+    # ----------------------------
+    def load(self):
+        """Return the metadata as a ``Frame``, re-reading only what changed."""
+        with self._lock:
+            return self._refresh()
+
+    def load_indexed(self):
+        """Return ``(frame, facets)`` taken from the same generation.
+
+        The facet index's row ids select rows with ``frame.select()``.
+        """
+        with self._lock:
+            frame = self._refresh()
+            return frame, self._facets
+
+    def load_versioned(self):
+        """Return ``(frame, facets, generation)``, all from the same refresh.
+
+        The generation changes whenever the returned data would; results
+        derived from the frame can be cached under it.
+        """
+        with self._lock:
+            frame = self._refresh()
+            return frame, self._facets, self.generation
+
+    def taxonomy(self):
+        """Return the ``Taxonomy`` of the live rows, re-reading only what changed."""
+        with self._lock:
+            self._refresh()
+            return self._taxonomy
+
+    def _refresh(self, count=True):
+        snapshot_stamp = _file_stamp(self.path)
+        journal_stamp = _file_stamp(self.journal_path)
+        if self._frame is not None and snapshot_stamp == self._snapshot_stamp:
+            if journal_stamp == self._journal_stamp:
+                self.hits += count
+                return self._frame
+            if journal_stamp is not None and journal_stamp[1] >= self._journal_offset:
+                # Only the journal grew: fold the new tail into the cache.
+                self.misses += count
+                self._fold_journal_tail()
+                self._journal_stamp = journal_stamp
+                self.generation += 1
+                return self._frame
+
+        self.misses += count
+        if snapshot_stamp is None:
+            table = Table(METADATA_COLUMNS, ENCODED_COLUMNS)
+        else:
+            table = read_csv(self.path, METADATA_COLUMNS, ENCODED_COLUMNS)
+        if self._frame is not None:
+            # Someone else changed the files behind our back.
+            self.generation += 1
+        self._use_table(table)
+        self._snapshot_stamp = snapshot_stamp
+        self._journal_offset = 0
+        self._journal_records = 0
+        self._fold_journal_tail()
+        self._journal_stamp = journal_stamp
+        return self._frame
+
+    def _use_table(self, table):
+        """Make ``table`` (every row live) the cached table, with its frame and indexes."""
+        self._table = table
+        self._frame = table.frame()
+        self._row_ids = {key: row_id for row_id, key in enumerate(table.data[KEY_COLUMN].values)}
+        self._facets = FacetIndex.build_encoded(
+            len(table), {col: (table.data[col].codes, table.data[col].values) for col in FACET_COLUMNS})
+        self._taxonomy = _taxonomy_of(table)
+
+    def _fold_journal_tail(self):
+        """Read journal records past the current offset and apply them."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(self._journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Ignore a trailing partial line from a writer that is mid-append.
+        end = data.rfind(b"\n") + 1
+        if not end:
+            return
+        records = list(csv.reader(io.StringIO(data[:end].decode("utf-8"))))
+        self._journal_offset += end
+        self._journal_records += len(records)
+        self._apply(records)
+
+    def _apply(self, records):
+        """Fold journal records into the cached table.
+
+        Rows are keyed by their unique ``Filename`` (several rows may share a
+        ``Path`` once files are deduplicated). Folding is idempotent (inserts
+        of a known key and deletes of an unknown one are no-ops) so a reader
+        that races a compaction and sees a record both in the snapshot and
+        the journal still ends up right.
+
+        Inserts are appended to the table under fresh row ids; a delete
+        only drops the id from the live frame. The dead row stays in the
+        table until the next compaction or snapshot re-read.
+        """
+        table = self._table
+        row_ids = self._row_ids
+        added, removed = [], []
+        for record in records:
+            if not record:
+                continue
+            op, values = record[0], record[1:]
+            values = (values + [""] * len(METADATA_COLUMNS))[:len(METADATA_COLUMNS)]
+            key = values[METADATA_COLUMNS.index(KEY_COLUMN)]
+            if op == OP_INSERT:
+                if key in row_ids:
+                    continue
+                row_id = row_ids[key] = table.append(values)
+                added.append((row_id, table.row(row_id)))
+            elif op == OP_DELETE:
+                row_id = row_ids.pop(key, None)
+                if row_id is not None:
+                    removed.append((row_id, table.row(row_id)))
+        if not (added or removed):
+            return
+        # Rows both inserted and deleted within this batch were never visible.
+        gone = {row_id for row_id, _ in removed}
+        new = {row_id for row_id, _ in added}
+        added = [(row_id, row) for row_id, row in added if row_id not in gone]
+        removed = [(row_id, row) for row_id, row in removed if row_id not in new]
+        ids = array("I", (i for i in self._frame.ids if i not in gone)) if removed else array("I", self._frame.ids)
+        ids.extend(row_id for row_id, _ in added)
+        # A new frame, so readers holding the previous one never see it change.
+        self._frame = Frame(table, ids)
+        self._facets = self._facets.with_changes(added=added, removed=removed)
+        self._taxonomy = self._taxonomy.with_changes(added=[_taxonomy_path(row) for _, row in added],
+                                                     removed=[_taxonomy_path(row) for _, row in removed])
+
+    # ----------------------------
+    # WRITING
+    # ----------------------------
+    def append(self, row):
+        """Record a new metadata row with a single journal append."""
+        self._write([OP_INSERT] + [str(row.get(col, "")) for col in METADATA_COLUMNS])
+
+    def append_many(self, rows):
+        """Record several new rows with one journal append and fsync."""
+        records = [[OP_INSERT] + [str(row.get(col, "")) for col in METADATA_COLUMNS] for row in rows]
+        if records:
+            self._writer.submit(b"".join(_encode(record) for record in records))
+
+    def remove(self, filename):
+        """Record the deletion of the row whose Filename is ``filename``."""
+        values = {col: "" for col in METADATA_COLUMNS}
+        values[KEY_COLUMN] = str(filename)
+        self._write([OP_DELETE] + [values[col] for col in METADATA_COLUMNS])
+
+    def find(self, filename):
+        """Return the row for ``filename`` as a dict, or None."""
+        with self._lock:
+            self._refresh()
+            row_id = self._row_ids.get(filename)
+            return None if row_id is None else self._table.row(row_id).to_dict()
+
+    def _write(self, record):
+        self._writer.submit(_encode(record))
+
+    def _append_lines(self, lines):
+        """Writer-thread side: append a whole batch with one write and fsync."""
+        with self._lock:
+            # Bring the cache up to date first so the tail we fold below is
+            # exactly the batch written here.
+            self._refresh(count=False)
+            with open(self.journal_path, "ab") as f:
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self._fold_journal_tail()
+            self._journal_stamp = _file_stamp(self.journal_path)
+            self.generation += 1
+        return [None] * len(lines)
+
+    def _maybe_compact(self):
+        if self._journal_records >= self.compact_threshold:
+            self.compact()
+
+    def invalidate(self):
+        """Drop the cached frame and bump the generation after an external write."""
+        with self._lock:
+            self._table = None
+            self._frame = None
+            self._facets = None
+            self._taxonomy = None
+            self._snapshot_stamp = None
+            self._journal_stamp = None
+            self.generation += 1
+
+    def compact(self):
+        """Rewrite the snapshot with the journal folded in and truncate the journal."""
+        with FileLock(lock_path_for(self.journal_path)), self._lock:
+            frame = self._refresh(count=False)
+            tmp_path = self.path.with_suffix(".csv.tmp")
+            write_csv(tmp_path, METADATA_COLUMNS, frame.rows())
+            os.replace(tmp_path, self.path)
+            open(self.journal_path, "wb").close()
+            if len(self._table) > len(frame):
+                # Drop deleted rows from memory too; the live ones get new row ids.
+                self._use_table(frame.to_table())
+                self.generation += 1
+            self._snapshot_stamp = _file_stamp(self.path)
+            self._journal_stamp = _file_stamp(self.journal_path)
+            self._journal_offset = 0
+            self._journal_records = 0
+            self.compactions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "generation": self.generation,
+                "rows": 0 if self._frame is None else len(self._frame),
+                "table_bytes": 0 if self._table is None else self._table.nbytes(),
+                "journal_records": self._journal_records,
+                "compactions": self.compactions,
+                **self._writer.stats(),
+            }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path):
+    """Return the shared MetadataStore for ``path``, creating it on first use."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = MetadataStore(path)
+        return store
@@ -0,0 +1,291 @@
+"""Timing spans and rolling latency histograms for app.py.
+
+Every Streamlit rerun is timed as a whole and in named spans: the helper
+functions (``@metrics.timed()``) and page sections
+(``with metrics.span("filter"):``). Samples are grouped by the page being
+rendered. For each (page, span) the registry keeps a window of recent
+samples, which the Admin Dashboard panel shows as percentiles and a
+histogram, and cumulative bucket counts for a Prometheus histogram:
+
+    PORTAL_METRICS_FILE=/var/lib/node_exporter/portal.prom   # textfile collector
+    PORTAL_METRICS_PORT=9464                                  # or scrape http://host:9464/metrics
+
+One rerun can also run under cProfile: ``begin_rerun(page, profile=True)``
+keeps the stats of that rerun as ``last_profile``.
+
+Like the stores, the registry is module state, shared by every session the
+process serves.
+"""
+import bisect
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import marshal
+import os
+import pstats
+import tempfile
+import threading
+import time
+from collections import deque, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+WINDOW = 1000
+RERUN_SPAN = "rerun"
+WRITE_INTERVAL = 15
+PROFILE_LINES = 40
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Profile = namedtuple("Profile", ["page", "finished", "seconds", "text", "data"])
+
+_current_page = contextvars.ContextVar("page", default="")
+
+
+class Histogram:
+    def __init__(self, window=WINDOW):
+        self.recent = deque(maxlen=window)
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)  # the last one is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, ms):
+        self.recent.append(ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+
+    def percentiles(self, *ps):
+        values = sorted(self.recent)
+        if not values:
+            return [0.0] * len(ps)
+        return [values[min(len(values) - 1, int(len(values) * p / 100))] for p in ps]
+
+    def recent_buckets(self):
+        """``{upper bound label: count}`` over the rolling window."""
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for ms in self.recent:
+            counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        labels = [f"≤{b:g} ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]:g} ms"]
+        return dict(zip(labels, counts))
+
+
+class Rerun:
+    """One script run in progress; ``finish()`` records it."""
+
+    def __init__(self, metrics, page, profile):
+        self.metrics = metrics
+        self.page = page
+        self.profiler = None
+        self._token = _current_page.set(page)
+        self._start = time.perf_counter()
+        if profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profiler(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def finish(self):
+        elapsed = time.perf_counter() - self._start
+        self.stop_profiler()
+        self.metrics.observe(self.page, RERUN_SPAN, elapsed * 1000)
+        if self.profiler is not None:
+            self.metrics.last_profile = _profile_of(self.profiler, self.page, elapsed)
+        _current_page.reset(self._token)
+        self.metrics._end_rerun(self)
+
+
+def _profile_of(profiler, page, seconds):
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_LINES)
+    profiler.create_stats()
+    # The same bytes Profile.dump_stats writes, loadable with pstats or snakeviz.
+    return Profile(page, time.strftime("%Y-%m-%d %H:%M:%S"), seconds, out.getvalue(), marshal.dumps(profiler.stats))
+
+
+class Metrics:
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.last_profile = None
+        self._histograms = {}  # (page, span) -> Histogram
+        self._lock = threading.Lock()
+        self._active = threading.local()
+        self._export_path = None
+        self._export_interval = WRITE_INTERVAL
+        self._last_export = 0.0
+        self._server = None
+
+    # ----------------------------
+    # RECORDING
+    # ----------------------------
+    def observe(self, page, span, ms):
+        with self._lock:
+            histogram = self._histograms.get((page, span))
+            if histogram is None:
+                histogram = self._histograms[(page, span)] = Histogram(self.window)
+            histogram.observe(ms)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Time the enclosed block under ``name`` for the page being rendered."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(_current_page.get(), name, (time.perf_counter() - start) * 1000)
+
+    def timed(self, name=None):
+        """Decorator: time every call of the function as a span (its own name by default)."""
+        def decorate(fn):
+            label = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(label):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def begin_rerun(self, page, profile=False):
+        """Start timing a script run of ``page``; call ``finish()`` on the result at the end.
+
+        ``st.rerun()`` and ``st.stop()`` end a script run early by raising,
+        so its ``finish()`` never comes. Such a run is dropped here, when
+        the next one on the thread begins, and a capture it was profiling
+        carries over to the new run.
+        """
+        interrupted = getattr(self._active, "rerun", None)
+        if interrupted is not None:
+            interrupted.stop_profiler()
+            profile = profile or interrupted.profiler is not None
+        rerun = Rerun(self, page, profile)
+        self._active.rerun = rerun
+        return rerun
+
+    def _end_rerun(self, rerun):
+        if getattr(self._active, "rerun", None) is rerun:
+            self._active.rerun = None
+        if not self._export_path:
+            return
+        # Claim the export under the lock so concurrent sessions don't all write.
+        with self._lock:
+            now = time.monotonic()
+            due = now - self._last_export >= self._export_interval
+            if due:
+                self._last_export = now
+        if due:
+            self.write_prometheus(self._export_path)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+        self.last_profile = None
+
+    # ----------------------------
+    # READING
+    # ----------------------------
+    def summary(self):
+        """One dict per (page, span): call count and rolling percentiles in ms, slowest total first."""
+        with self._lock:
+            items = [(key, h.count, h.total, *h.percentiles(50, 95, 99), max(h.recent, default=0.0))
+                     for key, h in self._histograms.items()]
+        rows = [{"Page": page, "Span": span, "Calls": count, "p50 ms": round(p50, 2),
+                 "p95 ms": round(p95, 2), "p99 ms": round(p99, 2), "Max ms": round(worst, 2),
+                 "Total s": round(total / 1000, 3)}
+                for (page, span), count, total, p50, p95, p99, worst in items]
+        return sorted(rows, key=lambda row: (row["Page"], -row["Total s"]))
+
+    def histogram(self, page, span):
+        with self._lock:
+            histogram = self._histograms.get((page, span))
+            return histogram.recent_buckets() if histogram else {}
+
+    def to_prometheus(self):
+        """All histograms in the Prometheus text exposition format."""
+        lines = ["# HELP portal_span_seconds Time spent in app.py reruns and their instrumented sections.",
+                 "# TYPE portal_span_seconds histogram"]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            for (page, span), h in items:
+                labels = f'page="{_escape(page)}",span="{_escape(span)}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS_MS, h.buckets):
+                    cumulative += count
+                    lines.append(f'portal_span_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'portal_span_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"portal_span_seconds_sum{{{labels}}} {h.total / 1000:.6f}")
+                lines.append(f"portal_span_seconds_count{{{labels}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    # ----------------------------
+    # EXPORT
+    # ----------------------------
+    def export_to(self, path, interval=WRITE_INTERVAL):
+        """Rewrite ``path`` with the Prometheus text after a rerun, at most every ``interval`` seconds."""
+        self._export_path = str(path)
+        self._export_interval = interval
+
+    def write_prometheus(self, path):
+        # Written aside and renamed, so a scraper never reads half a file; the
+        # temporary name is unique, so two writers never rename each other's.
+        text = self.to_prometheus()
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp)
+            raise
+        with self._lock:
+            self._last_export = time.monotonic()
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve ``/metrics`` on ``host:port`` from a daemon thread; later calls are no-ops."""
+        with self._lock:
+            if self._server is not None:
+                return self._server
+            metrics = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = metrics.to_prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", CONTENT_TYPE)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((host, port), Handler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+            return self._server
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return the process-wide Metrics registry, creating it on first use."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
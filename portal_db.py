@@ -0,0 +1,374 @@
+"""SQLite access layer for the Tkinter client (college_portal_streamlit.py).
+
+``CollegeApp`` used to open a fresh ``sqlite3.connect`` in every method. A
+``Database`` keeps one long-lived connection per database file with WAL
+mode and tuned pragmas; every query below is a fixed SQL string, so
+sqlite3's per-connection statement cache compiles each one only once.
+
+The schema is brought up to date by numbered migrations recorded in
+``PRAGMA user_version``, so existing databases pick up new indexes the
+next time they are opened.
+
+The course/semester/year/subject ``Taxonomy`` behind the client's dropdowns
+is built with one grouped query and then follows this connection's own
+inserts and deletes as their transactions commit. ``PRAGMA data_version``
+changes only when another connection commits, and the tree is rebuilt
+then.
+"""
+import contextlib
+import os
+import re
+import sqlite3
+import threading
+
+from taxonomy import Taxonomy
+
+DB_NAME = "college_materials.db"
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+]
+
+def _create_material_key_index(conn):
+    """Index materials on their normalized identity.
+
+    Unique when the existing rows allow it, so the database itself rejects
+    duplicate uploads; databases that already contain duplicates get the
+    same index without the constraint rather than losing rows.
+    """
+    duplicates = conn.execute("""
+        SELECT 1 FROM materials
+        GROUP BY course_id, semester, year, lower(trim(subject)), type HAVING COUNT(*) > 1 LIMIT 1
+    """).fetchone()
+    unique = "" if duplicates else "UNIQUE"
+    conn.execute(f"""
+        CREATE {unique} INDEX IF NOT EXISTS idx_materials_key
+        ON materials (course_id, semester, year, lower(trim(subject)), type)
+    """)
+
+
+# (version, steps). A step is an SQL string or a callable taking the
+# connection. Append new entries; never edit an applied one.
+MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS courses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            course_name TEXT UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS materials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            course_id INTEGER,
+            semester TEXT,
+            year TEXT,
+            subject TEXT,
+            type TEXT,
+            file_path TEXT,
+            uploaded_on TEXT,
+            FOREIGN KEY(course_id) REFERENCES courses(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS admins (
+            username TEXT PRIMARY KEY,
+            password TEXT
+        )
+        """,
+        "INSERT OR IGNORE INTO admins VALUES ('admin', 'admin123')",
+        "INSERT OR IGNORE INTO courses (course_name) VALUES ('BSc Physical Science with Computer Science')",
+        "INSERT OR IGNORE INTO courses (course_name) VALUES ('BCA')",
+        "INSERT OR IGNORE INTO courses (course_name) VALUES ('BCom')",
+        "INSERT OR IGNORE INTO courses (course_name) VALUES ('BA')",
+    ]),
+    (2, [
+        # Covers the course/semester/year(/subject/type) lookups and the
+        # subject dropdown's DISTINCT without touching the table.
+        "CREATE INDEX IF NOT EXISTS idx_materials_lookup ON materials (course_id, semester, year, subject, type)",
+        "CREATE INDEX IF NOT EXISTS idx_materials_uploaded_on ON materials (uploaded_on)",
+    ]),
+    (3, [
+        # Full-text shadow of subject and course name, kept in sync by triggers.
+        "CREATE VIRTUAL TABLE IF NOT EXISTS materials_fts USING fts5(subject, course, tokenize='unicode61 remove_diacritics 2')",
+        """
+        CREATE TRIGGER IF NOT EXISTS materials_fts_insert AFTER INSERT ON materials BEGIN
+            INSERT INTO materials_fts (rowid, subject, course)
+            VALUES (new.id, new.subject, (SELECT course_name FROM courses WHERE id = new.course_id));
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS materials_fts_delete AFTER DELETE ON materials BEGIN
+            DELETE FROM materials_fts WHERE rowid = old.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS materials_fts_update AFTER UPDATE OF subject, course_id ON materials BEGIN
+            DELETE FROM materials_fts WHERE rowid = old.id;
+            INSERT INTO materials_fts (rowid, subject, course)
+            VALUES (new.id, new.subject, (SELECT course_name FROM courses WHERE id = new.course_id));
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS courses_fts_update AFTER UPDATE OF course_name ON courses BEGIN
+            UPDATE materials_fts SET course = new.course_name
+            WHERE rowid IN (SELECT id FROM materials WHERE course_id = new.id);
+        END
+        """,
+        """
+        INSERT INTO materials_fts (rowid, subject, course)
+        SELECT m.id, m.subject, c.course_name FROM materials m LEFT JOIN courses c ON m.course_id = c.id
+        """,
+        _create_material_key_index,
+    ]),
+]
+
+SQL_COURSES = "SELECT course_name FROM courses"
+SQL_COURSE_ID = "SELECT id FROM courses WHERE course_name=?"
+SQL_INSERT_COURSE = "INSERT INTO courses (course_name) VALUES (?)"
+SQL_VERIFY_ADMIN = "SELECT * FROM admins WHERE username=? AND password=?"
+SQL_MATERIAL_EXISTS = """
+    SELECT 1 FROM materials
+    WHERE course_id=? AND semester=? AND year=? AND lower(trim(subject))=? AND type=?
+    LIMIT 1
+"""
+SQL_INSERT_MATERIAL = """
+    INSERT INTO materials (course_id, semester, year, subject, type, file_path, uploaded_on)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_DELETE_MATERIAL = "DELETE FROM materials WHERE id=?"
+SQL_MATERIAL_PATHS = "SELECT id, file_path FROM materials"
+SQL_TAXONOMY = """
+    SELECT c.course_name, m.semester, m.year, m.subject, COUNT(*) FROM materials m
+    JOIN courses c ON m.course_id = c.id
+    GROUP BY c.course_name, m.semester, m.year, m.subject
+"""
+SQL_TAXONOMY_PATH = """
+    SELECT c.course_name, m.semester, m.year, m.subject FROM materials m
+    JOIN courses c ON m.course_id = c.id
+    WHERE m.id=?
+"""
+SQL_ADMIN_MATERIALS = """
+    SELECT m.id, c.course_name, m.subject, m.type, m.semester, m.year, m.uploaded_on, m.file_path
+    FROM materials m
+    JOIN courses c ON m.course_id = c.id
+"""
+SQL_SEARCH = """
+    SELECT m.id, m.subject, m.type, m.semester, m.year, m.file_path, m.uploaded_on
+    FROM materials m
+    JOIN courses c2 ON m.course_id = c2.id
+    WHERE 1=1
+"""
+
+
+class Database:
+    """One shared connection, safe to use from worker threads via ``self.lock``."""
+
+    def __init__(self, path=DB_NAME):
+        self.path = str(path)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.migrate()
+        self._taxonomy = None
+        self._taxonomy_version = None
+        self._uncommitted = ([], [])  # taxonomy paths added and removed by the open transaction
+
+    def migrate(self):
+        """Apply every migration newer than the database's user_version."""
+        with self.lock:
+            current = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                with self.conn:
+                    for step in statements:
+                        if callable(step):
+                            step(self.conn)
+                        else:
+                            self.conn.execute(step)
+                    self.conn.execute(f"PRAGMA user_version = {version}")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.lock:
+            try:
+                with self.conn:
+                    yield self.conn
+            except BaseException:
+                for paths in self._uncommitted:
+                    paths.clear()
+                raise
+            added, removed = self._uncommitted
+            if (added or removed) and self._taxonomy is not None:
+                self._taxonomy = self._taxonomy.with_changes(added, removed)
+            added.clear()
+            removed.clear()
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # ----------------------------
+    # QUERIES USED BY CollegeApp
+    # ----------------------------
+    def get_courses(self):
+        return [row[0] for row in self.query(SQL_COURSES)]
+
+    def verify_admin(self, username, password):
+        return self.query_one(SQL_VERIFY_ADMIN, (username, password)) is not None
+
+    def taxonomy(self):
+        """Return the ``Taxonomy`` of the materials, rebuilding it only after another connection wrote."""
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._taxonomy is None or version != self._taxonomy_version:
+                self._taxonomy = Taxonomy.build((row[:4], row[4]) for row in self.conn.execute(SQL_TAXONOMY))
+                self._taxonomy_version = version
+                # The query saw them already.
+                for paths in self._uncommitted:
+                    paths.clear()
+            return self._taxonomy
+
+    def _note_change(self, conn, material_id, paths):
+        if self._taxonomy is not None:
+            row = conn.execute(SQL_TAXONOMY_PATH, (material_id,)).fetchone()
+            if row is not None:
+                paths.append(tuple(row))
+
+    def ensure_course(self, conn, course):
+        """Return the id of ``course``, creating it if needed (inside a transaction)."""
+        row = conn.execute(SQL_COURSE_ID, (course,)).fetchone()
+        if row:
+            return row[0]
+        return conn.execute(SQL_INSERT_COURSE, (course,)).lastrowid
+
+    def material_exists(self, conn, course_id, semester, year, subject, mat_type):
+        """Probe ``idx_materials_key`` for an existing row with the same identity."""
+        key = (course_id, semester, year, subject.strip().lower(), mat_type)
+        return conn.execute(SQL_MATERIAL_EXISTS, key).fetchone() is not None
+
+    def insert_material(self, conn, course_id, semester, year, subject, mat_type, file_path, uploaded_on):
+        """Insert a material; raises ``sqlite3.IntegrityError`` if it already exists."""
+        material_id = conn.execute(SQL_INSERT_MATERIAL,
+                                   (course_id, semester, year, subject, mat_type, file_path, uploaded_on)).lastrowid
+        self._note_change(conn, material_id, self._uncommitted[0])
+        return material_id
+
+    def delete_material(self, material_id):
+        with self.transaction() as conn:
+            self._note_change(conn, material_id, self._uncommitted[1])
+            conn.execute(SQL_DELETE_MATERIAL, (material_id,))
+
+    def material_paths(self):
+        """``(id, file_path)`` for every material."""
+        return self.query(SQL_MATERIAL_PATHS)
+
+    def material(self, material_id):
+        """``(id, course, subject, type, semester, year, uploaded_on, file_path)``, or None."""
+        return self.query_one(SQL_ADMIN_MATERIALS + " WHERE m.id=?", (material_id,))
+
+    def admin_materials(self):
+        return self.query(SQL_ADMIN_MATERIALS + " ORDER BY m.uploaded_on DESC, m.id DESC")
+
+    def admin_materials_page(self, after=None, before=None, limit=200):
+        """One keyset page of ``admin_materials``, newest first.
+
+        ``after`` and ``before`` are ``(uploaded_on, id)`` keys; the page is
+        returned in display order either way.
+        """
+        if after is not None:
+            return self.query(SQL_ADMIN_MATERIALS + """
+                WHERE (m.uploaded_on, m.id) < (?, ?)
+                ORDER BY m.uploaded_on DESC, m.id DESC LIMIT ?""", (*after, limit))
+        if before is not None:
+            return self.query(SQL_ADMIN_MATERIALS + """
+                WHERE (m.uploaded_on, m.id) > (?, ?)
+                ORDER BY m.uploaded_on, m.id LIMIT ?""", (*before, limit))[::-1]
+        return self.query(SQL_ADMIN_MATERIALS + " ORDER BY m.uploaded_on DESC, m.id DESC LIMIT ?", (limit,))
+
+    def search_materials(self, course="", semester="", year="", mat_type="", subject="", paths=None):
+        """Rows for the student results table, id first; ``paths`` restricts to those files."""
+        query, params = self._search_filters(course, semester, year, mat_type, subject)
+        if paths is not None:
+            query += f" AND m.file_path IN ({','.join('?' * len(paths)) or 'NULL'})"
+            params.extend(paths)
+        return self.query(query, params)
+
+    def search_materials_page(self, course="", semester="", year="", mat_type="", subject="",
+                              after=None, before=None, limit=200):
+        """One keyset page of ``search_materials`` in id order; ``after``/``before`` are ids."""
+        query, params = self._search_filters(course, semester, year, mat_type, subject)
+        if before is not None:
+            query += " AND m.id < ? ORDER BY m.id DESC LIMIT ?"
+            return self.query(query, params + [before, limit])[::-1]
+        if after is not None:
+            query += " AND m.id > ?"
+            params.append(after)
+        return self.query(query + " ORDER BY m.id LIMIT ?", params + [limit])
+
+    @staticmethod
+    def _search_filters(course, semester, year, mat_type, subject):
+        """SQL_SEARCH narrowed by the student filters.
+
+        Course, semester, year and type come from fixed dropdown values and
+        are matched exactly so the lookup index applies. ``subject`` is
+        matched as word prefixes through ``materials_fts``.
+        """
+        query = SQL_SEARCH
+        params = []
+        if course:
+            query += " AND c2.course_name = ?"
+            params.append(course)
+        if semester:
+            query += " AND m.semester = ?"
+            params.append(semester)
+        if year:
+            query += " AND m.year = ?"
+            params.append(year)
+        if mat_type and mat_type != "All":
+            query += " AND m.type = ?"
+            params.append(mat_type)
+        match = subject_match_query(subject)
+        if match:
+            query += " AND m.id IN (SELECT rowid FROM materials_fts WHERE materials_fts MATCH ?)"
+            params.append(match)
+        return query, params
+
+
+def subject_match_query(text):
+    """FTS5 expression matching every word of ``text`` as a prefix of the subject."""
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return ""
+    return "subject : (" + " AND ".join(f'"{word}"*' for word in words) + ")"
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_db(path=DB_NAME):
+    """Return the process-wide Database for ``path``, opening it on first use."""
+    key = os.path.abspath(path)
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = Database(path)
+        return db
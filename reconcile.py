@@ -0,0 +1,358 @@
+"""Reconcile the uploads folder with the metadata that points into it.
+
+Files under ``uploads/`` and the rows referencing them drift apart. The
+rows live in uploads_metadata.csv for app.py, the ``materials`` table for
+the Tkinter client, and the blob reference counts. An upload that fails
+after storing its file leaves an orphan. A manual cleanup leaves rows
+whose file is gone. Older trees also carry per-course folders nobody
+references any more.
+
+    python reconcile.py             # report
+    python reconcile.py --repair
+
+Both front ends share the uploads folder and the blob reference counts,
+so rows are read from both of their stores (whichever exist); leaving one
+out would make its files look orphaned.
+
+A manifest (``uploads_manifest.db``) keeps the size, mtime and inode of
+every file and the mtime of every directory. Adding, removing or renaming
+an entry changes its directory's mtime, so a later scan stats each
+directory but lists only those whose mtime moved.
+
+``--repair`` works as follows:
+
+- Dangling rows are deleted through the stores' normal write paths.
+- Orphans older than ``--grace`` are moved to ``uploads/.orphaned/`` rather
+  than deleted.
+- Blob reference counts are set to the number of rows that point at each
+  blob.
+
+Run repairs while no uploads are in progress.
+"""
+import argparse
+import contextlib
+import csv
+import os
+import sqlite3
+import stat
+import sys
+import time
+from collections import Counter, namedtuple
+
+from blob_store import BLOB_DIR, REFS_DB, get_blob_store
+
+MANIFEST_DB = "uploads_manifest.db"
+QUARANTINE_DIR = ".orphaned"
+GRACE_SECONDS = 15 * 60
+# A directory changed this recently may change again within the same mtime tick.
+RACY_SECONDS = 2
+
+ORPHAN = "orphan"
+DANGLING = "dangling"
+REFCOUNT = "refcount"
+
+# ``key`` is the row's Filename (metadata) or id (db); for a refcount
+# finding it is the number of rows that actually reference the blob.
+Finding = namedtuple("Finding", ["kind", "source", "key", "path", "detail"])
+ScanStats = namedtuple("ScanStats", ["dirs", "listed", "files", "added", "changed", "removed"])
+
+
+class Manifest:
+    """``(size, mtime_ns, inode)`` of every file under ``root``, kept in SQLite between scans.
+
+    Directories whose name starts with a dot (the bundle cache, the
+    quarantine) are not scanned.
+    """
+
+    def __init__(self, root="uploads", db_path=MANIFEST_DB):
+        self.root = os.path.abspath(root)
+        self.db_path = str(db_path)
+        self._relative_dirs = {}
+        with self._connect() as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    dir TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    PRIMARY KEY (dir, name)
+                )
+            """)
+            row = conn.execute("SELECT value FROM meta WHERE key='root'").fetchone()
+            if row is None or row[0] != self.root:
+                # Written for another tree: start over.
+                conn.execute("DELETE FROM dirs")
+                conn.execute("DELETE FROM files")
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('root', ?)", (self.root,))
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def relative(self, path):
+        """``path`` relative to the root, or None if it lies outside."""
+        # Resolved once per directory: rows share a few hundred blob folders.
+        head, tail = os.path.split(str(path))
+        if tail in ("", ".", ".."):
+            return self._relative_dir(str(path))
+        rel_dir = self._relative_dirs.get(head)
+        if rel_dir is None:
+            rel_dir = self._relative_dirs[head] = self._relative_dir(head) or ""
+        if not rel_dir:
+            return self._relative_dir(str(path))  # outside, or the root itself
+        return tail if rel_dir == "." else rel_dir + os.sep + tail
+
+    def _relative_dir(self, path):
+        path = os.path.abspath(path)
+        if path == self.root:
+            return "."
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path[len(self.root) + 1:]
+
+    def scan(self):
+        """Bring the manifest in line with the tree; returns ``ScanStats``."""
+        racy = time.time_ns() - RACY_SECONDS * 1_000_000_000
+        dirs = listed = added = changed = removed = 0
+        with self._connect() as conn, conn:
+            known, children = {}, {}
+            for path, parent, mtime_ns, inode in conn.execute("SELECT path, parent, mtime_ns, inode FROM dirs"):
+                known[path] = (mtime_ns, inode)
+                children.setdefault(parent, []).append(path)
+            seen = set()
+            stack = [""]
+            while stack:
+                rel = stack.pop()
+                try:
+                    st = os.stat(os.path.join(self.root, rel))
+                except OSError:
+                    continue
+                if not stat.S_ISDIR(st.st_mode):
+                    continue
+                seen.add(rel)
+                dirs += 1
+                if known.get(rel) == (st.st_mtime_ns, st.st_ino):
+                    # Same entries as last time; only its subdirectories need a look.
+                    stack.extend(children.get(rel, ()))
+                    continue
+                listed += 1
+                subdirs, entries = self._list(rel)
+                old = {name: tuple(stamp) for name, *stamp in
+                       conn.execute("SELECT name, size, mtime_ns, inode FROM files WHERE dir=?", (rel,))}
+                for name, stamp in entries.items():
+                    before = old.pop(name, None)
+                    if before is None:
+                        added += 1
+                    elif before != stamp:
+                        changed += 1
+                removed += len(old)
+                conn.execute("DELETE FROM files WHERE dir=?", (rel,))
+                conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                                 [(rel, name, *stamp) for name, stamp in entries.items()])
+                # Not trusted until it is older than the timestamp granularity: it gets listed again.
+                mtime_ns = st.st_mtime_ns if st.st_mtime_ns < racy else -1
+                parent = None if rel == "" else os.path.dirname(rel)
+                conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)", (rel, parent, mtime_ns, st.st_ino))
+                stack.extend(subdirs)
+            for path in known.keys() - seen:
+                removed += conn.execute("DELETE FROM files WHERE dir=?", (path,)).rowcount
+                conn.execute("DELETE FROM dirs WHERE path=?", (path,))
+            files = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return ScanStats(dirs, listed, files, added, changed, removed)
+
+    def _list(self, rel):
+        subdirs, files = [], {}
+        with os.scandir(os.path.join(self.root, rel)) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith("."):
+                        subdirs.append(os.path.join(rel, entry.name))
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    files[entry.name] = (st.st_size, st.st_mtime_ns, st.st_ino)
+        return subdirs, files
+
+    def files(self):
+        """``{path relative to the root: (size, mtime_ns, inode)}`` as of the last scan."""
+        with self._connect() as conn:
+            return {d + os.sep + name if d else name: (size, mtime_ns, inode)
+                    for d, name, size, mtime_ns, inode in conn.execute("SELECT * FROM files")}
+
+
+def _rows(metadata_store, db):
+    """``(source, key, path)`` for every row that references a file."""
+    if metadata_store is not None:
+        frame = metadata_store.load()
+        for filename, path in zip(frame["Filename"], frame["Path"]):
+            yield "metadata", filename, path
+    if db is not None:
+        for material_id, path in db.material_paths():
+            yield "db", material_id, path or ""
+
+
+def find_problems(manifest, metadata_store=None, db=None, blobs=None, grace=GRACE_SECONDS):
+    """Compare the manifest's last scan with the rows; returns a list of ``Finding``.
+
+    Files modified within the last ``grace`` seconds are never reported as
+    orphans: their row may simply not be written yet.
+    """
+    files = manifest.files()
+    references = Counter()
+    findings = []
+    for source, key, path in _rows(metadata_store, db):
+        rel = manifest.relative(path)
+        if rel is None:
+            # Outside the uploads folder, like the Tkinter client's oldest rows.
+            exists = os.path.exists(path)
+        else:
+            exists = rel in files
+            references[rel] += exists
+            # Not in the manifest: inside a skipped dot-directory, or written since the scan.
+            exists = exists or os.path.exists(path)
+        if not exists:
+            findings.append(Finding(DANGLING, source, key, path, "file is missing"))
+
+    cutoff = time.time_ns() - int(grace * 1_000_000_000)
+    for rel, (size, mtime_ns, _) in sorted(files.items()):
+        if not references[rel] and mtime_ns < cutoff:
+            findings.append(Finding(ORPHAN, "uploads", "", os.path.join(manifest.root, rel),
+                                    f"{size} bytes, no row references it"))
+
+    if blobs is not None:
+        recorded = {}
+        for path, count in blobs.refcounts().items():
+            rel = manifest.relative(path)
+            if rel is not None:
+                recorded[rel] = count
+        blob_root = manifest.relative(blobs.root)
+        # Staging files of in-flight uploads start with a dot and have no record yet.
+        on_disk = {rel for rel in files if blob_root is not None and rel.startswith(blob_root + os.sep)
+                   and not os.path.basename(rel).startswith(".")}
+        for rel in sorted(on_disk | recorded.keys()):
+            actual = references[rel]
+            if recorded.get(rel, 0) != actual:
+                findings.append(Finding(REFCOUNT, "blobs", actual, os.path.join(manifest.root, rel),
+                                        f"recorded {recorded.get(rel, 0)}, referenced by {actual}"))
+    return findings
+
+
+def repair(findings, manifest, metadata_store=None, db=None, blobs=None, index=None):
+    """Fix ``findings`` as described in the module docstring; returns those that were fixed."""
+    fixed = []
+    for finding in findings:
+        try:
+            if finding.kind == DANGLING:
+                if finding.source == "metadata" and metadata_store is not None:
+                    metadata_store.remove(finding.key)
+                elif finding.source == "db" and db is not None:
+                    db.delete_material(finding.key)
+                else:
+                    continue
+                if index is not None:
+                    index.remove(finding.path)
+            elif finding.kind == ORPHAN:
+                rel = manifest.relative(finding.path)
+                target = os.path.join(manifest.root, QUARANTINE_DIR, rel)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(finding.path, target)
+                _remove_empty_dirs(os.path.dirname(finding.path), manifest.root)
+                if index is not None:
+                    index.remove(finding.path)
+            elif finding.kind == REFCOUNT and blobs is not None:
+                blobs.set_refcount(finding.path, finding.key)
+            else:
+                continue
+        except FileNotFoundError:
+            continue  # gone since the scan
+        fixed.append(finding)
+    return fixed
+
+
+def _remove_empty_dirs(dir_path, stop):
+    while dir_path != stop and os.path.isdir(dir_path) and not os.listdir(dir_path):
+        os.rmdir(dir_path)
+        dir_path = os.path.dirname(dir_path)
+
+
+def summarize(findings):
+    counts = {kind: 0 for kind in (ORPHAN, DANGLING, REFCOUNT)}
+    for finding in findings:
+        counts[finding.kind] += 1
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find (and repair) orphaned files and rows with missing files.")
+    parser.add_argument("--uploads", default="uploads")
+    parser.add_argument("--metadata", default="uploads_metadata.csv", help="metadata CSV used by app.py")
+    parser.add_argument("--db", default="college_materials.db", help="database used by the Tkinter client")
+    parser.add_argument("--refs", default=REFS_DB, help="blob reference database")
+    parser.add_argument("--index", default="search_index.db", help="full-text index to drop removed files from")
+    parser.add_argument("--manifest", default=MANIFEST_DB)
+    parser.add_argument("--grace", type=float, default=GRACE_SECONDS,
+                        help="seconds a file must be unchanged before it counts as an orphan")
+    parser.add_argument("--repair", action="store_true", help="fix what was found instead of only reporting it")
+    parser.add_argument("--report", help="also write the findings to this CSV")
+    args = parser.parse_args(argv)
+    if not (os.path.exists(args.metadata) or os.path.exists(args.db)):
+        parser.error(f"neither {args.metadata} nor {args.db} exists: with no rows to compare, every file is an orphan")
+
+    metadata_store = db = index = None
+    if os.path.exists(args.metadata):
+        from metadata_store import get_store
+
+        metadata_store = get_store(args.metadata)
+    if os.path.exists(args.db):
+        from portal_db import get_db
+
+        db = get_db(args.db)
+    blob_root = os.path.join(args.uploads, os.path.basename(BLOB_DIR))
+    blobs = get_blob_store(blob_root, args.refs) if os.path.exists(args.refs) else None
+    if args.repair and os.path.exists(args.index):
+        from fulltext_index import get_index
+
+        index = get_index(args.index)
+
+    manifest = Manifest(args.uploads, args.manifest)
+    start = time.perf_counter()
+    scan = manifest.scan()
+    findings = find_problems(manifest, metadata_store, db, blobs, args.grace)
+    print(f"Scanned {scan.files} files in {scan.dirs} directories ({scan.listed} listed; "
+          f"{scan.added} new, {scan.changed} changed, {scan.removed} gone) in {time.perf_counter() - start:.2f}s.")
+    for finding in findings:
+        key = f" {finding.key}" if finding.kind == DANGLING else ""
+        print(f"{finding.kind:<9} {finding.source}{key}: {finding.path}  ({finding.detail})")
+    if args.report:
+        with open(args.report, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(Finding._fields)
+            writer.writerows(findings)
+    counts = summarize(findings)
+    print(f"{counts[ORPHAN]} orphaned files, {counts[DANGLING]} rows with missing files, "
+          f"{counts[REFCOUNT]} wrong blob reference counts.")
+    if not args.repair:
+        return 1 if findings else 0
+
+    fixed = repair(findings, manifest, metadata_store, db, blobs, index)
+    print(f"Repaired {len(fixed)} of {len(findings)}; orphans are in "
+          f"{os.path.join(args.uploads, QUARANTINE_DIR)}.")
+    return 0 if len(fixed) == len(findings) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Process-wide LRU cache for results computed from the uploads metadata.
+
+The Search Materials page recomputes its result set, facet counts and sort
+order on every rerun, including reruns caused by typing in an unrelated
+widget. Results are pure functions of the request and of the metadata
+generation, so app.py memoizes them here under keys that include the
+request; the generation is passed alongside. Every write
+(``save_file``/``delete_file``, a bulk import, a compaction folding in
+another process's rows) bumps the generation. The first lookup that
+sees the new generation drops everything cached for the old one, so
+nothing stale is ever served and nothing stale lingers.
+
+The cache is bounded by entry count and by an estimate of the bytes held.
+The least recently used entries are evicted first. Like the stores it is
+module state, shared by every session the process serves.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+MAX_ENTRIES = 256
+MAX_BYTES = int(os.environ.get("PORTAL_RESULT_CACHE_MB", "64")) * 1024 * 1024
+
+
+def approx_size(value):
+    """Rough bytes held by ``value``; objects with an ``nbytes()`` method report their own."""
+    nbytes = getattr(value, "nbytes", None)
+    if callable(nbytes):
+        return nbytes()
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation = None
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, generation, compute, size_of=approx_size):
+        """The cached value for ``key`` at ``generation``, else ``compute()`` (cached if it fits).
+
+        ``compute`` runs outside the lock, so a slow miss never blocks hits
+        from other sessions. Two sessions missing on the same key at once
+        both compute it, and the later result replaces the earlier one.
+        """
+        with self._lock:
+            if generation != self.generation:
+                if self.generation is not None and generation < self.generation:
+                    # A reader still holding older data: answer it, but don't cache.
+                    self.misses += 1
+                    return compute()
+                self._clear()
+                self.generation = generation
+                self.invalidations += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        value = compute()
+        size = size_of(value)
+        with self._lock:
+            if generation == self.generation and size <= self.max_bytes:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old[1]
+                self._entries[key] = (value, size)
+                self._bytes += size
+                self._evict()
+        return value
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "generation": self.generation,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_result_cache(name, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+    """Return the shared ResultCache called ``name``, creating it on first use."""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = ResultCache(max_entries, max_bytes)
+        return cache
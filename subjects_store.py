@@ -0,0 +1,84 @@
+"""The admin-managed subject list (subjects.csv) used by app.py.
+
+Reads are cached on the file's (mtime, size). Additions go through a
+``GroupCommitWriter`` so that admins adding subjects at the same time
+cannot overwrite each other's additions, and a burst of additions costs
+one rewrite.
+"""
+import csv
+import os
+import threading
+
+from group_commit import GroupCommitWriter, lock_path_for
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class SubjectStore:
+    def __init__(self, path, defaults=()):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._subjects = None
+        self._stamp = None
+        if not os.path.exists(self.path):
+            self._write(sorted(defaults))
+        self._writer = GroupCommitWriter(self._add_batch, lock_path_for(self.path), name="subjects-writer")
+
+    def _read(self):
+        with open(self.path, newline="", encoding="utf-8") as f:
+            return [row["Subject"] for row in csv.DictReader(f) if row.get("Subject")]
+
+    def _write(self, subjects):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Subject"])
+            writer.writerows([s] for s in subjects)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """Return the sorted subject list, re-reading the file only if it changed."""
+        with self._lock:
+            stamp = _file_stamp(self.path)
+            if self._subjects is None or stamp != self._stamp:
+                self._subjects = sorted(self._read())
+                self._stamp = stamp
+            return list(self._subjects)
+
+    def add(self, subject):
+        """Add ``subject``; returns False if it was already in the list."""
+        return self._writer.submit(subject)
+
+    def _add_batch(self, names):
+        # Re-read under the writer's file lock so other processes' additions survive.
+        subjects = self._read()
+        known = set(subjects)
+        added = []
+        for name in names:
+            added.append(name not in known)
+            known.add(name)
+        if any(added):
+            self._write(sorted(known))
+        return added
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_subject_store(path, defaults=()):
+    """Return the shared SubjectStore for ``path``."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SubjectStore(path, defaults)
+        return store
@@ -0,0 +1,309 @@
+"""SQLite-backed storage for student suggestions.
+
+Suggestions used to live in suggestions.csv and every status toggle or
+delete rewrote the whole file, keyed by a DataFrame position that shifted
+after each delete. Here every suggestion has a stable integer id, status
+filters run as indexed SQL queries, and bulk updates and deletes happen in
+a single transaction. New suggestions from concurrent sessions are
+group-committed: one writer thread inserts whatever has queued up in one
+transaction.
+
+An existing suggestions.csv is imported once, the first time the database
+is opened, and renamed to ``suggestions.csv.migrated``.
+
+``suggestion_groups`` holds one row per course/semester/year/subject with
+its pending and completed counts and its median pending suggestion (the
+lower one for an even count). Every insert, status change and delete
+updates it in the same transaction, so the admin summary reads a row per
+group instead of aggregating the suggestions. The median moves at most
+one place per change, and its neighbour is one seek in
+``idx_suggestions_group`` away.
+"""
+import contextlib
+import csv
+import datetime
+import os
+import sqlite3
+import threading
+
+from group_commit import GroupCommitWriter, lock_path_for
+
+SUGGESTIONS_DB = "suggestions.db"
+SCHEMA_VERSION = 2
+
+PENDING = "pending"
+COMPLETED = "completed"
+
+_COLUMNS = "id, timestamp, course, semester, year, subject, suggestion, completed"
+GROUP_COLUMNS = ("course", "semester", "year", "subject")
+_GROUP_WHERE = "course=? AND semester=? AND year=? AND subject=?"
+
+
+def _as_bool(value):
+    return str(value).strip().lower() in ("true", "1", "yes")
+
+
+class SuggestionStore:
+    def __init__(self, db_path=SUGGESTIONS_DB, legacy_csv=None):
+        self.db_path = str(db_path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS suggestions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    course TEXT,
+                    semester TEXT,
+                    year TEXT,
+                    subject TEXT,
+                    suggestion TEXT NOT NULL,
+                    completed INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_suggestions_completed ON suggestions (completed, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_suggestions_timestamp ON suggestions (timestamp)")
+            conn.execute("DROP INDEX IF EXISTS idx_suggestions_course")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_suggestions_group
+                ON suggestions (course, semester, year, subject, completed, timestamp, id)
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS suggestion_groups (
+                    course TEXT NOT NULL,
+                    semester TEXT NOT NULL,
+                    year TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    pending INTEGER NOT NULL,
+                    completed INTEGER NOT NULL,
+                    median_timestamp TEXT,
+                    median_id INTEGER,
+                    PRIMARY KEY (course, semester, year, subject)
+                )
+            """)
+            imported = False
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                if version < 1 and legacy_csv and os.path.exists(legacy_csv):
+                    self._import_csv(conn, legacy_csv)
+                    imported = True
+                self._rebuild_groups(conn)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        if imported:
+            os.replace(legacy_csv, f"{legacy_csv}.migrated")
+        self._writer = GroupCommitWriter(self._insert_batch, lock_path_for(self.db_path), name="suggestions-writer")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _import_csv(conn, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = [(r["Timestamp"], r["Course"] or "", r["Semester"] or "", r["Year"] or "", r["Subject"] or "",
+                     r["Suggestion"], int(_as_bool(r.get("Completed", False)))) for r in csv.DictReader(f)]
+        conn.executemany("""
+            INSERT INTO suggestions (timestamp, course, semester, year, subject, suggestion, completed)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+    @staticmethod
+    def _where(status):
+        if status == PENDING:
+            return " WHERE completed = 0", ()
+        if status == COMPLETED:
+            return " WHERE completed = 1", ()
+        return "", ()
+
+    # ----------------------------
+    # GROUP AGGREGATES
+    # ----------------------------
+    def rebuild_groups(self):
+        """Recompute ``suggestion_groups`` from scratch, after writing to the table directly."""
+        with self._connect() as conn:
+            self._rebuild_groups(conn)
+
+    @staticmethod
+    def _rebuild_groups(conn):
+        # Groups are looked up by equality, which never matches NULL.
+        conn.execute("""
+            UPDATE suggestions SET course=IFNULL(course, ''), semester=IFNULL(semester, ''),
+                                   year=IFNULL(year, ''), subject=IFNULL(subject, '')
+            WHERE course IS NULL OR semester IS NULL OR year IS NULL OR subject IS NULL
+        """)
+        conn.execute("DELETE FROM suggestion_groups")
+        conn.execute("""
+            INSERT INTO suggestion_groups (course, semester, year, subject, pending, completed)
+            SELECT course, semester, year, subject, SUM(completed = 0), SUM(completed = 1)
+            FROM suggestions GROUP BY course, semester, year, subject
+        """)
+        conn.execute("""
+            UPDATE suggestion_groups SET (median_timestamp, median_id) = (m.timestamp, m.id)
+            FROM (
+                SELECT course, semester, year, subject, timestamp, id,
+                       ROW_NUMBER() OVER (PARTITION BY course, semester, year, subject ORDER BY timestamp, id) AS n,
+                       COUNT(*) OVER (PARTITION BY course, semester, year, subject) AS total
+                FROM suggestions WHERE completed = 0
+            ) AS m
+            WHERE m.n = (m.total + 1) / 2 AND suggestion_groups.course = m.course
+              AND suggestion_groups.semester = m.semester AND suggestion_groups.year = m.year
+              AND suggestion_groups.subject = m.subject
+        """)
+
+    @staticmethod
+    def _neighbour(conn, group, key, after):
+        """The pending suggestion just after (or before) ``key`` = (timestamp, id) in ``group``."""
+        op, order = (">", "") if after else ("<", " DESC")
+        return conn.execute(f"""
+            SELECT timestamp, id FROM suggestions
+            WHERE {_GROUP_WHERE} AND completed = 0 AND (timestamp, id) {op} (?, ?)
+            ORDER BY timestamp{order}, id{order} LIMIT 1
+        """, (*group, *key)).fetchone()
+
+    def _adjust(self, conn, group, key, completed, delta):
+        """Account for one suggestion (``key`` = (timestamp, id)) entering (+1) or leaving (-1) ``group``.
+
+        Runs after the suggestion itself was written, so the index already
+        reflects the change when the median moves to a neighbour.
+        """
+        row = conn.execute(f"SELECT pending, completed, median_timestamp, median_id FROM suggestion_groups "
+                           f"WHERE {_GROUP_WHERE}", group).fetchone()
+        pending, done, median = (0, 0, None) if row is None else (row[0], row[1], row[2:])
+        if completed:
+            done += delta
+        else:
+            # With n pending sorted, the median is the one at (n - 1) // 2.
+            if pending + delta == 0:
+                median = None
+            elif median is None or median[0] is None:
+                median = key
+            else:
+                key, median = tuple(key), tuple(median)
+                odd = pending % 2 == 1
+                if delta > 0:
+                    if key < median and odd:
+                        median = self._neighbour(conn, group, median, after=False)
+                    elif key > median and not odd:
+                        median = self._neighbour(conn, group, median, after=True)
+                elif key == median:
+                    median = self._neighbour(conn, group, median, after=not odd)
+                elif key < median and not odd:
+                    median = self._neighbour(conn, group, median, after=True)
+                elif key > median and odd:
+                    median = self._neighbour(conn, group, median, after=False)
+            pending += delta
+        if pending + done == 0:
+            conn.execute(f"DELETE FROM suggestion_groups WHERE {_GROUP_WHERE}", group)
+            return
+        conn.execute("""
+            INSERT OR REPLACE INTO suggestion_groups
+            (course, semester, year, subject, pending, completed, median_timestamp, median_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (*group, pending, done, *(median or (None, None))))
+
+    @staticmethod
+    def _group_of(row):
+        return tuple("" if row[col] is None else row[col] for col in GROUP_COLUMNS)
+
+    def groups(self, status=None):
+        """Per course/semester/year/subject counts, most pending first, as dicts.
+
+        Each has ``pending``, ``completed`` and ``median_pending_since``
+        (the timestamp of the median pending suggestion, or None).
+        ``status`` PENDING or COMPLETED keeps only groups with suggestions
+        in that state.
+        """
+        where = {PENDING: " WHERE pending > 0", COMPLETED: " WHERE completed > 0"}.get(status, "")
+        with self._connect() as conn:
+            rows = conn.execute(f"""
+                SELECT course, semester, year, subject, pending, completed, median_timestamp
+                FROM suggestion_groups{where}
+                ORDER BY pending DESC, completed DESC, course, semester, year, subject
+            """).fetchall()
+        return [dict(zip((*GROUP_COLUMNS, "pending", "completed", "median_pending_since"), row)) for row in rows]
+
+    # ----------------------------
+    # SUGGESTIONS
+    # ----------------------------
+    def add(self, course, semester, year, subject, suggestion):
+        """Store a new pending suggestion and return its id once committed."""
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return self._writer.submit((timestamp, course or "", semester or "", year or "", subject or "", suggestion))
+
+    def _insert_batch(self, rows):
+        with self._connect() as conn:
+            ids = []
+            for row in rows:
+                suggestion_id = conn.execute("""
+                    INSERT INTO suggestions (timestamp, course, semester, year, subject, suggestion, completed)
+                    VALUES (?, ?, ?, ?, ?, ?, 0)
+                """, row).lastrowid
+                self._adjust(conn, row[1:5], (row[0], suggestion_id), completed=False, delta=1)
+                ids.append(suggestion_id)
+            return ids
+
+    def list(self, status=None, limit=-1, offset=0, group=None):
+        """Return suggestions as dicts, oldest first; ``status`` is PENDING, COMPLETED or None.
+
+        ``group`` narrows them to one (course, semester, year, subject).
+        """
+        where, params = self._where(status)
+        if group is not None:
+            where = f"{where} AND {_GROUP_WHERE}" if where else f" WHERE {_GROUP_WHERE}"
+            params += tuple(group)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {_COLUMNS} FROM suggestions{where} ORDER BY timestamp, id LIMIT ? OFFSET ?",
+                                params + (limit, offset)).fetchall()
+        return [dict(row, completed=bool(row["completed"])) for row in rows]
+
+    def count(self, status=None):
+        column = {PENDING: "pending", COMPLETED: "completed"}.get(status, "pending + completed")
+        with self._connect() as conn:
+            return conn.execute(f"SELECT IFNULL(SUM({column}), 0) FROM suggestion_groups").fetchone()[0]
+
+    def _rows(self, conn, ids):
+        # Takes the write lock before reading, so a concurrent change to the
+        # same ids can't be counted twice in suggestion_groups.
+        conn.execute("BEGIN IMMEDIATE")
+        return [row for i in ids for row in conn.execute(f"SELECT {_COLUMNS} FROM suggestions WHERE id=?", (int(i),))]
+
+    def set_completed(self, ids, completed):
+        """Set the status of every suggestion in ``ids`` in one transaction."""
+        completed = int(bool(completed))
+        with self._connect() as conn:
+            for row in self._rows(conn, ids):
+                changed = conn.execute("UPDATE suggestions SET completed=? WHERE id=? AND completed=?",
+                                       (completed, row["id"], 1 - completed)).rowcount
+                if changed != 1:
+                    continue
+                group, key = self._group_of(row), (row["timestamp"], row["id"])
+                self._adjust(conn, group, key, completed=not completed, delta=-1)
+                self._adjust(conn, group, key, completed=completed, delta=1)
+
+    def delete(self, ids):
+        """Delete every suggestion in ``ids`` in one transaction."""
+        with self._connect() as conn:
+            for row in self._rows(conn, ids):
+                if conn.execute("DELETE FROM suggestions WHERE id=?", (row["id"],)).rowcount != 1:
+                    continue
+                self._adjust(conn, self._group_of(row), (row["timestamp"], row["id"]),
+                             completed=row["completed"], delta=-1)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_suggestion_store(db_path=SUGGESTIONS_DB, legacy_csv=None):
+    """Return the shared SuggestionStore for ``db_path``."""
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SuggestionStore(db_path, legacy_csv)
+        return store
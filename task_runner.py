@@ -0,0 +1,120 @@
+"""Run slow work off the Tk main thread.
+
+Uploads, downloads and searches used to run inside button callbacks, so a
+200 MB copy or a slow query froze the whole window. A ``TaskRunner`` runs
+them on a small thread pool. Workers never touch widgets: results, errors
+and progress reports go onto a queue that the main thread drains with
+``after()`` polling, and the callbacks run there.
+
+Tasks submitted on the same ``channel`` supersede each other. Starting a
+new search cancels the previous one, and anything the stale task still
+reports is dropped, so only the latest result set is rendered.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 4
+POLL_MS = 50
+
+
+class Task:
+    """Handle for one submitted job, also passed to the job itself."""
+
+    def __init__(self, runner, channel=None):
+        self.channel = channel
+        self.future = None
+        self._runner = runner
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Ask the job to stop; it is skipped entirely if it has not started."""
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def cancelled(self):
+        """Polled by the job, e.g. as ``ingest(..., cancelled=task.cancelled)``."""
+        return self._cancelled.is_set()
+
+    def progress(self, *args):
+        """Report progress from the worker; delivered to ``on_progress`` on the UI thread."""
+        self._runner._events.put((self, "progress", args))
+
+
+class TaskRunner:
+    def __init__(self, widget, max_workers=MAX_WORKERS, poll_ms=POLL_MS):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tk-worker")
+        self._events = queue.Queue()
+        self._callbacks = {}  # task -> (on_done, on_error, on_progress) until its outcome is delivered
+        self._latest = {}  # channel -> the task whose outcome will be rendered
+        self._poll_id = None
+
+    def submit(self, work, *args, on_done=None, on_error=None, on_progress=None, channel=None):
+        """Run ``work(task, *args)`` on a worker thread and return the ``Task``.
+
+        ``on_done(result)``, ``on_error(exception)`` and ``on_progress(*args)``
+        run on the UI thread. A job that stops because it was cancelled
+        should raise ``InterruptedError``, which reaches ``on_error`` like
+        any other failure; superseded tasks report nothing at all.
+        """
+        task = Task(self, channel)
+        if channel is not None:
+            previous = self._latest.get(channel)
+            if previous is not None:
+                previous.cancel()
+            self._latest[channel] = task
+        self._callbacks[task] = (on_done, on_error, on_progress)
+        task.future = self._pool.submit(work, task, *args)
+        task.future.add_done_callback(lambda future: self._events.put((task, "done", future)))
+        if self._poll_id is None:
+            self._poll_id = self.widget.after(self.poll_ms, self._poll)
+        return task
+
+    def shutdown(self):
+        """Cancel queued jobs and stop polling; running jobs finish in the background."""
+        for task in list(self._callbacks):
+            task.cancel()
+        self._callbacks.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._poll_id is not None:
+            self.widget.after_cancel(self._poll_id)
+            self._poll_id = None
+
+    def _poll(self):
+        self._poll_id = None
+        while True:
+            try:
+                task, kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            self._dispatch(task, kind, payload)
+        if self._callbacks:
+            self._poll_id = self.widget.after(self.poll_ms, self._poll)
+
+    def _dispatch(self, task, kind, payload):
+        callbacks = self._callbacks.get(task)
+        if callbacks is None:
+            return
+        on_done, on_error, on_progress = callbacks
+        superseded = task.channel is not None and self._latest.get(task.channel) is not task
+        if kind == "progress":
+            if on_progress is not None and not superseded:
+                on_progress(*payload)
+            return
+        del self._callbacks[task]
+        if superseded:
+            return
+        if task.channel is not None:
+            del self._latest[task.channel]
+        future = payload
+        error = InterruptedError("Cancelled.") if future.cancelled() else future.exception()
+        if error is None:
+            if on_done is not None:
+                on_done(future.result())
+        elif on_error is not None:
+            on_error(error)
+        else:
+            self.widget.report_callback_exception(type(error), error, error.__traceback__)
@@ -0,0 +1,103 @@
+"""Course → semester → year → subject tree with material counts.
+
+Both front ends fill their cascading dropdowns from it: picking a course
+narrows the semesters to those with material for it, and so on down to
+the subjects. The tree is built once from the store and then kept current
+as materials are uploaded and deleted, so a dropdown change reads a few
+dicts instead of running a query. Only combinations that have at least
+one material appear.
+
+Like ``FacetIndex`` the tree is copy-on-write: ``with_changes`` copies
+just the branches on the changed paths and shares the rest, so a reader
+holding an older tree never sees it change.
+"""
+TAXONOMY_LEVELS = ["Course", "Semester", "Year", "Subject"]
+ANY = "All"
+
+
+class Taxonomy:
+    def __init__(self):
+        # Every node is [materials below it, {value: child node}].
+        self.root = [0, {}]
+
+    @classmethod
+    def build(cls, counts):
+        """Build a tree from ``((course, semester, year, subject), materials)`` pairs."""
+        taxonomy = cls()
+        for path, count in counts:
+            node = taxonomy.root
+            node[0] += count
+            for value in path:
+                node = node[1].setdefault(value, [0, {}])
+                node[0] += count
+        return taxonomy
+
+    def with_changes(self, added=(), removed=()):
+        """Return a new tree with one material per path in ``added`` and one fewer per path in ``removed``.
+
+        Paths are ``(course, semester, year, subject)`` tuples. Branches
+        left without material are pruned.
+        """
+        taxonomy = Taxonomy.__new__(Taxonomy)
+        taxonomy.root = [self.root[0], dict(self.root[1])]
+        copied = {id(taxonomy.root)}
+
+        def walk(path, delta):
+            if delta < 0 and not taxonomy._contains(path):
+                return
+            node = taxonomy.root
+            node[0] += delta
+            for value in path:
+                child = node[1].get(value)
+                if child is None:
+                    child = [0, {}]
+                elif id(child) not in copied:
+                    child = [child[0], dict(child[1])]
+                copied.add(id(child))
+                node[1][value] = child
+                child[0] += delta
+                if child[0] <= 0:
+                    del node[1][value]
+                    return
+                node = child
+
+        for path in removed:
+            walk(path, -1)
+        for path in added:
+            walk(path, 1)
+        return taxonomy
+
+    def _contains(self, path):
+        node = self.root
+        for value in path:
+            node = node[1].get(value)
+            if node is None:
+                return False
+        return True
+
+    def _nodes(self, selected):
+        nodes = [self.root]
+        for value in selected:
+            if value in (None, "", ANY):
+                nodes = [child for node in nodes for child in node[1].values()]
+            else:
+                nodes = [node[1][value] for node in nodes if value in node[1]]
+        return nodes
+
+    def options(self, *selected):
+        """``{value: materials}``, sorted by value, for the level below ``selected``.
+
+        ``selected`` holds values for the levels above, outermost first;
+        "All" or an empty value stands for any of them. ``options()`` gives
+        the courses, ``options("BCA", "All")`` the years with BCA material
+        in any semester.
+        """
+        counts = {}
+        for node in self._nodes(selected):
+            for value, child in node[1].items():
+                counts[value] = counts.get(value, 0) + child[0]
+        return dict(sorted(counts.items()))
+
+    def count(self, *selected):
+        """Materials under ``selected`` (same conventions as ``options``)."""
+        return sum(node[0] for node in self._nodes(selected))
@@ -0,0 +1,235 @@
+"""Virtualized, keyset-paginated Treeview for the Tkinter client.
+
+The result and admin tables used to delete every item and re-insert every
+row on each refresh, which froze the window once the materials table grew
+into the tens of thousands. A ``VirtualTable`` keeps only a window of at
+most ``max_rows`` rows in its Treeview. Scrolling near either end of the
+window fetches the next page and drops rows from the far end, so the cost
+of a refresh depends on the window, not on the size of the result set.
+``refresh()`` re-reads the current window and applies only the difference,
+which keeps the selection and scroll position after an upload or delete.
+
+Rows come from a ``fetch(after=None, before=None, limit=...)`` callable
+that returns ``(key, values)`` pairs in display order: the rows following
+``after`` or preceding ``before`` (both exclusive), or the first rows when
+neither is given. Keys must be unique within a result set; ``str(key)``
+becomes the Treeview item id.
+
+Given a ``TaskRunner``, the pages fetched while scrolling are read on a
+worker thread and added once they arrive. A page that comes back after
+the table was reloaded or refreshed is dropped.
+"""
+import tkinter as tk
+from tkinter import ttk
+
+PAGE_SIZE = 200
+MAX_ROWS = 1000
+EDGE = 0.1  # fetch more once the view is within this fraction of either end
+
+
+class VirtualTable(ttk.Frame):
+    def __init__(self, parent, columns, page_size=PAGE_SIZE, max_rows=MAX_ROWS, tasks=None, **tree_options):
+        super().__init__(parent)
+        self.tasks = tasks
+        self.page_size = page_size
+        self.max_rows = max(max_rows, 2 * page_size)
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", **tree_options)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        self._fetch = None
+        self._rows = {}  # item id -> (key, values) for every row in the window
+        self._anchor = None  # key of the row just above the window; None at the top
+        self._more_after = False
+        self._pending = None
+        self._generation = 0  # bumped whenever the window is rebuilt, to drop late pages
+        self._loading = False
+
+    def load(self, fetch, rows=None):
+        """Show the first page of a new result set.
+
+        ``rows`` is that page if it was already fetched, e.g. on a worker
+        thread; otherwise it is fetched here.
+        """
+        self._fetch = fetch
+        self._anchor = None
+        self._generation += 1
+        self._loading = False
+        if rows is None:
+            rows = fetch(limit=self.page_size)
+        self._more_after = len(rows) == self.page_size
+        self._rows.clear()
+        self.tree.delete(*self.tree.get_children())
+        for key, values in rows:
+            self._insert(tk.END, key, values)
+        self.tree.yview_moveto(0)
+
+    def read_window(self):
+        """Fetch the current window's rows; safe to call off the UI thread."""
+        if self._fetch is None:
+            return []
+        return self._fetch(after=self._anchor, limit=max(len(self._rows), self.page_size))
+
+    def refresh(self, rows=None):
+        """Re-read the current window and apply only what changed.
+
+        ``rows`` is a result of ``read_window()`` taken elsewhere, if any.
+        """
+        if self._fetch is None:
+            return
+        limit = max(len(self._rows), self.page_size)
+        if rows is None:
+            rows = self.read_window()
+        if not rows and self._anchor is not None:
+            # Everything below the anchor is gone; start over from the top.
+            self.load(self._fetch)
+            return
+        self._generation += 1
+        self._loading = False
+        self._more_after = len(rows) >= limit
+        fresh = {str(key) for key, _ in rows}
+        self._drop([iid for iid in self.tree.get_children() if iid not in fresh])
+        for index, (key, values) in enumerate(rows):
+            iid = str(key)
+            current = self._rows.get(iid)
+            if current is None:
+                self._insert(index, key, values)
+                continue
+            if tuple(current[1]) != tuple(values):
+                self.tree.item(iid, values=values)
+                self._rows[iid] = (key, values)
+            if self.tree.index(iid) != index:
+                self.tree.move(iid, "", index)
+
+    def remove(self, iid):
+        """Drop one row, e.g. after deleting it, without re-reading the window."""
+        if iid in self._rows:
+            self._drop([iid])
+
+    def _insert(self, index, key, values):
+        iid = str(key)
+        self.tree.insert("", index, iid=iid, values=values)
+        self._rows[iid] = (key, values)
+
+    def _drop(self, iids):
+        if iids:
+            self.tree.delete(*iids)
+            for iid in iids:
+                del self._rows[iid]
+
+    # ----------------------------
+    # SCROLLING
+    # ----------------------------
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._pending is None and self._fetch is not None:
+            # Treeview calls this while it is being modified; look at the edges once it settles.
+            self._pending = self.after_idle(self._check_edges)
+
+    def _check_edges(self):
+        self._pending = None
+        children = self.tree.get_children()
+        if not children or self._loading:
+            return
+        first, last = self.tree.yview()
+        if last >= 1 - EDGE and self._more_after:
+            self._load_page(self._read_after, self._rows[children[-1]][0], self._add_after)
+        elif first <= EDGE and self._anchor is not None:
+            self._load_page(self._read_before, self._rows[children[0]][0], self._add_before)
+
+    def _load_page(self, read, key, add):
+        fetch, generation = self._fetch, self._generation
+        if self.tasks is None:
+            add(read(fetch, key))
+            return
+
+        def done(page):
+            self._loading = False
+            if generation == self._generation:
+                add(page)
+
+        def failed(error):
+            self._loading = False
+
+        self._loading = True
+        self.tasks.submit(lambda task: read(fetch, key), on_done=done, on_error=failed)
+
+    def _read_after(self, fetch, key):
+        return fetch(after=key, limit=self.page_size)
+
+    def _read_before(self, fetch, key):
+        rows = fetch(before=key, limit=self.page_size)
+        above = fetch(before=rows[0][0], limit=1) if rows else []
+        return rows, above
+
+    def _add_after(self, rows):
+        children = self.tree.get_children()
+        self._more_after = len(rows) == self.page_size
+        if not rows or not children:
+            return
+        top = self._top_item(children)
+        for key, values in rows:
+            self._insert(tk.END, key, values)
+        overflow = len(children) + len(rows) - self.max_rows
+        if overflow > 0:
+            dropped = list(children[:overflow])
+            self._anchor = self._rows[dropped[-1]][0]
+            if top in dropped:
+                top = children[overflow]
+            self._drop(dropped)
+        self._scroll_to(top)
+
+    def _add_before(self, page):
+        rows, above = page
+        children = self.tree.get_children()
+        if not rows:
+            self._anchor = None
+            return
+        if not children:
+            return
+        top = self._top_item(children)
+        for index, (key, values) in enumerate(rows):
+            self._insert(index, key, values)
+        self._anchor = above[0][0] if above else None
+        overflow = len(children) + len(rows) - self.max_rows
+        if overflow > 0:
+            dropped = list(children[-overflow:])
+            if top in dropped:
+                top = children[-overflow - 1]
+            self._drop(dropped)
+            self._more_after = True
+        self._scroll_to(top)
+
+    def _top_item(self, children):
+        index = int(self.tree.yview()[0] * len(children))
+        return children[min(index, len(children) - 1)]
+
+    def _scroll_to(self, iid):
+        """Keep ``iid`` at the top of the view after rows were added or dropped around it."""
+        self.tree.yview_moveto(self.tree.index(iid) / len(self._rows))
+
+
+def list_fetch(load):
+    """Adapt ``load() -> [(key, values), ...]`` to the ``fetch`` protocol.
+
+    For result sets that are already bounded and ordered in memory, such as
+    full-text hits in rank order. ``load`` runs again whenever the table
+    reads from the top, so ``refresh()`` picks up changes.
+    """
+    rows = []
+    position = {}
+
+    def fetch(after=None, before=None, limit=PAGE_SIZE):
+        if after is None and before is None:
+            rows[:] = load()
+            position.clear()
+            position.update((key, i) for i, (key, _) in enumerate(rows))
+            return rows[:limit]
+        if after is not None:
+            start = position[after] + 1
+            return rows[start:start + limit]
+        end = position[before]
+        return rows[max(0, end - limit):end]
+
+    return fetch